@@ -0,0 +1,121 @@
+# app/agents/assistant.py
+
+import time
+import random
+import asyncio
+import logging
+
+logger = logging.getLogger("mcp")
+
+# requires_action stops the stream but leaves the run open (and its thread locked) upstream
+TERMINAL_STATUSES = ("completed", "failed", "cancelled", "expired", "incomplete", "requires_action")
+TERMINAL_EVENTS = tuple(f"thread.run.{status}" for status in TERMINAL_STATUSES)
+
+# Adaptive polling, used when run streaming is unavailable
+POLL_INITIAL_DELAY = 0.5
+POLL_MAX_DELAY = 8.0
+POLL_BACKOFF = 1.6
+
+
+def _message_texts(message):
+    return [c.text.value for c in message.content if c.type == "text"]
+
+
+async def _wait_streaming(client, thread_id, assistant_id, instructions, state):
+    """Create the run with stream=True and consume events until it reaches a terminal status."""
+    stream = await client.beta.threads.runs.create(
+        thread_id=thread_id,
+        assistant_id=assistant_id,
+        instructions=instructions,
+        stream=True,
+    )
+    async for event in stream:
+        if event.event == "thread.run.created":
+            state["run_id"] = event.data.id
+        elif event.event == "thread.message.completed" and event.data.role == "assistant":
+            state["messages"].extend(_message_texts(event.data))
+        elif event.event in TERMINAL_EVENTS:
+            state["run_id"] = event.data.id
+            return event.data.status
+    raise RuntimeError("OpenAI run stream ended without a terminal event")
+
+
+async def _wait_polling(client, thread_id, assistant_id, instructions, state):
+    """Create the run and poll it with jittered exponential backoff."""
+    run = await client.beta.threads.runs.create(
+        thread_id=thread_id,
+        assistant_id=assistant_id,
+        instructions=instructions,
+    )
+    state["run_id"] = run.id
+    delay = POLL_INITIAL_DELAY
+    while run.status not in TERMINAL_STATUSES:
+        await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+        delay = min(delay * POLL_BACKOFF, POLL_MAX_DELAY)
+        run = await client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run.id)
+        state["polls"] += 1
+    return run.status
+
+
+async def _wait_for_run(client, thread_id, assistant_id, instructions, state, stream):
+    if stream:
+        try:
+            return await _wait_streaming(client, thread_id, assistant_id, instructions, state)
+        except Exception as e:
+            if state["run_id"]:
+                raise
+            logger.warning(f"Run streaming unavailable, falling back to polling: {e}")
+    return await _wait_polling(client, thread_id, assistant_id, instructions, state)
+
+
+async def _cancel_run(client, thread_id, run_id):
+    try:
+        await client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+        logger.warning(f"Cancelled OpenAI run {run_id}")
+    except Exception as e:
+        logger.warning(f"Failed to cancel OpenAI run {run_id}: {e}")
+
+
+async def run_assistant(client, assistant_id, prompt, instructions, timeout=120, stream=True):
+    """
+    Run an OpenAI Assistant on a fresh thread without blocking a thread while waiting.
+
+    Returns a dict with the run id, final status, the assistant's text messages in
+    order, the number of status polls and the run latency in seconds. Runs that
+    exceed timeout (or whose caller is cancelled) are cancelled upstream, as are
+    runs that stop for tool outputs (requires_action), which this agent never submits.
+    """
+    start = time.monotonic()
+    thread = await client.beta.threads.create()
+    await client.beta.threads.messages.create(thread_id=thread.id, role="user", content=prompt)
+
+    state = {"run_id": None, "messages": [], "polls": 0}
+    try:
+        status = await asyncio.wait_for(
+            _wait_for_run(client, thread.id, assistant_id, instructions, state, stream), timeout=timeout
+        )
+    except asyncio.TimeoutError:
+        if state["run_id"]:
+            await _cancel_run(client, thread.id, state["run_id"])
+        raise RuntimeError(f"OpenAI run timed out after {timeout}s")
+    except asyncio.CancelledError:
+        if state["run_id"]:
+            await _cancel_run(client, thread.id, state["run_id"])
+        raise
+    if status == "requires_action":
+        await _cancel_run(client, thread.id, state["run_id"])
+        raise RuntimeError(f"OpenAI run {state['run_id']} requires tool outputs and was cancelled")
+
+    if status == "completed" and not state["messages"]:
+        page = await client.beta.threads.messages.list(thread_id=thread.id, order="asc")
+        for msg in page.data:
+            if msg.role == "assistant":
+                state["messages"].extend(_message_texts(msg))
+
+    return {
+        "run_id": state["run_id"],
+        "status": status,
+        "messages": state["messages"],
+        "polls": state["polls"],
+        "latency": time.monotonic() - start,
+    }
@@ -1,7 +1,7 @@
-def rewrite_safe(prompt, client, brand="Ethical AI Insider", pillar="AI Risk", platform="LinkedIn"):
-    """
-    Rewrite the content to remove risky claims, add disclaimers, and ensure alignment with brand, pillar, and platform.
-    """
+from app.agents import llm
+
+
+def _build_messages(prompt, brand, pillar, platform):
     system_content = (
         f"You are an expert compliance editor for {brand}. "
         "Your job is to rewrite any content to remove risky claims, minimize legal/ethical liability, "
@@ -10,8 +10,32 @@ def rewrite_safe(prompt, client, brand="Ethical AI Insider", pillar="AI Risk", p
         "Be especially mindful of compliance, ethical language, and actionable clarity for tech leaders and founders."
     )
 
-    messages = [
+    return [
         {"role": "system", "content": system_content},
         {"role": "user", "content": prompt}
     ]
-    return client.chat.completions.create(model="gpt-4", messages=messages).choices[0].message.content
+
+
+def rewrite_safe(prompt, client, brand="Ethical AI Insider", pillar="AI Risk", platform="LinkedIn", model="gpt-4"):
+    """
+    Rewrite the content to remove risky claims, add disclaimers, and ensure alignment with brand, pillar, and platform.
+    """
+    messages = _build_messages(prompt, brand, pillar, platform)
+    return llm.chat(client, messages, model, brand, platform)
+
+
+async def rewrite_safe_async(prompt, client, brand="Ethical AI Insider", pillar="AI Risk", platform="LinkedIn", model="gpt-4"):
+    """
+    Async variant of rewrite_safe for use with an AsyncOpenAI client.
+    """
+    messages = _build_messages(prompt, brand, pillar, platform)
+    return await llm.chat_async(client, messages, model, brand, platform)
+
+
+async def rewrite_safe_stream(prompt, client, brand="Ethical AI Insider", pillar="AI Risk", platform="LinkedIn", model="gpt-4"):
+    """
+    Streaming variant of rewrite_safe: yields content deltas as the model produces them.
+    """
+    messages = _build_messages(prompt, brand, pillar, platform)
+    async for delta in llm.chat_stream(client, messages, model, brand, platform):
+        yield delta
@@ -1,33 +1,232 @@
 # app/agents/formatter.py
 
-def format_post(content: str, platform: str) -> str:
+import re
+import html
+
+# Longest partial line held back while waiting for a newline; longer lines are
+# rendered in pieces so memory stays bounded on long-form drafts.
+MAX_LINE_BUFFER = 4096
+
+RENDERERS = {}
+
+
+def register(*platforms):
+    """Class decorator registering a Renderer for one or more platform names."""
+    def decorator(cls):
+        for name in platforms:
+            RENDERERS[name.lower()] = cls
+        return cls
+    return decorator
+
+
+def metric_platform(platform) -> str:
+    """Platform as a metrics label: a registered platform's name, or "other" for free text."""
+    name = platform.lower() if isinstance(platform, str) else ""
+    return name if name in RENDERERS else "other"
+
+
+def create_renderer(platform: str):
+    """Return a fresh renderer for platform; unknown platforms pass text through unchanged."""
+    return RENDERERS.get(platform.lower(), Renderer)()
+
+
+class Renderer:
     """
-    Format processed content for a specific platform using best practices.
+    Base renderer: a small state machine fed text chunks as they arrive.
+    feed() returns whatever output is final so far and close() flushes the rest.
+    The default passes text through unchanged.
+    """
+
+    def feed(self, chunk: str) -> str:
+        return chunk
+
+    def close(self) -> str:
+        return ""
+
+
+@register("medium")
+class MediumRenderer(Renderer):
+    """Medium: raw text, supports markdown and paragraphs, long-form welcome."""
+
+
+class LengthLimitedRenderer(Renderer):
+    """Plain text truncated to `limit` characters as it arrives."""
+
+    limit = None
+
+    def __init__(self):
+        self._emitted = 0
+
+    def feed(self, chunk: str) -> str:
+        out = chunk[:max(0, self.limit - self._emitted)]
+        self._emitted += len(out)
+        return out
+
+
+@register("linkedin")
+class LinkedInRenderer(LengthLimitedRenderer):
+    """LinkedIn best practices: plain text, ≤3000 chars, emoji ok, simple paragraphs."""
+
+    limit = 3000
+
+
+# ---- Markdown to HTML ----
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*?)(?:\s+#+)?$")
+BULLET_RE = re.compile(r"^[-*+]\s+(.*)$")
+ORDERED_RE = re.compile(r"^(\d{1,9})[.)]\s+(.*)$")
+LINK_RE = re.compile(r"\[([^\]]+)\]\(((?:https?://|mailto:)[^)\s]+)\)")
+STRONG_RE = re.compile(r"\*\*(?!\s)(.+?)(?<!\s)\*\*|__(?!\s)(.+?)(?<!\s)__")
+EM_RE = re.compile(r"(?<![*\w])\*(?![\s*])(.+?)(?<![\s*])\*(?![*\w])|(?<!\w)_(?![\s_])(.+?)(?<![\s_])_(?!\w)")
+
+
+def _emphasis(text: str) -> str:
+    text = LINK_RE.sub(lambda m: f'<a href="{m.group(2).replace(chr(34), "&quot;")}">{m.group(1)}</a>', text)
+    text = STRONG_RE.sub(lambda m: f"<strong>{m.group(1) or m.group(2)}</strong>", text)
+    return EM_RE.sub(lambda m: f"<em>{m.group(1) or m.group(2)}</em>", text)
+
+
+def render_inline(text: str) -> str:
+    """HTML-escape text and render `code`, **strong**, *em* and [links](https://...)."""
+    segments = text.split("`")
+    if len(segments) % 2 == 0:
+        # Unbalanced backtick: keep the last one literal
+        tail = segments.pop()
+        segments[-1] += "`" + tail
+    out = []
+    for i, segment in enumerate(segments):
+        if i % 2:
+            out.append(f"<code>{html.escape(segment, quote=False)}</code>")
+        else:
+            out.append(_emphasis(html.escape(segment, quote=False)))
+    return "".join(out)
+
+
+class MarkdownRenderer(Renderer):
+    """
+    Streaming Markdown-to-HTML renderer.
+
+    Input is consumed line by line in a single pass: `#` headings, `-`/`*`/`+`
+    bullets, numbered lists and paragraphs (single newlines become <br>, blank
+    lines end the block). Only the current line is buffered.
     """
 
-    html_body = content.replace("\n", "<br>")
+    # Markdown heading levels are shifted down so `#` never competes with the page title
+    heading_offset = 1
+    # Render the first plain line as a title heading when the text has no heading of its own
+    title_first_line = False
+
+    def __init__(self):
+        self._pending = ""
+        self._block = None  # None, "p", "ul" or "ol"
+        self._titled = False
+        self._line_suffix = None  # closing markup of a line that was flushed in pieces
 
-    if platform.lower() == "linkedin":
-        # LinkedIn best practices: plain text, ≤3000 chars, emoji ok, simple paragraphs.
-        return content[:3000]
+    def feed(self, chunk: str) -> str:
+        self._pending += chunk
+        *lines, self._pending = self._pending.split("\n")
+        out = [self._line(line) for line in lines]
+        while len(self._pending) > MAX_LINE_BUFFER:
+            out.append(self._flush_partial())
+        return "".join(out)
 
-    elif platform.lower() == "convertkit":
-        # ConvertKit: HTML, short readable blocks.
-        return f"<p>{html_body}</p>"
+    def close(self) -> str:
+        out = self._line(self._pending)
+        self._pending = ""
+        return out + self._close_block()
 
-    elif platform.lower() == "medium":
-        # Medium: raw text, supports markdown and paragraphs, long-form welcome.
-        return content
+    def _close_block(self) -> str:
+        block, self._block = self._block, None
+        return f"</{block}>" if block else ""
 
-    elif platform.lower() == "wordpress":
-        # WordPress: HTML with headings and paragraphs, 1-2 <h2> for structure.
-        # Simple heuristic: bold the first line as a title, wrap paragraphs.
-        lines = [line.strip() for line in content.split("\n") if line.strip()]
-        if not lines:
+    def _open_block(self, block: str, attrs: str = "") -> str:
+        if self._block == block:
             return ""
-        title = f"<h2>{lines[0]}</h2>"
-        body = "<br>".join(lines[1:])
-        return f"{title}<p>{body}</p>"
+        out = self._close_block()
+        self._block = block
+        return f"{out}<{block}{attrs}>"
+
+    def _start_line(self, line: str):
+        """Split a non-blank line into (opening markup, text, closing markup)."""
+        m = HEADING_RE.match(line)
+        if m:
+            level = min(6, len(m.group(1)) + self.heading_offset)
+            self._titled = True
+            return f"{self._close_block()}<h{level}>", m.group(2), f"</h{level}>"
+        m = BULLET_RE.match(line)
+        if m:
+            return self._open_block("ul") + "<li>", m.group(1), "</li>"
+        m = ORDERED_RE.match(line)
+        if m:
+            start = int(m.group(1))
+            attrs = f' start="{start}"' if start != 1 else ""
+            return self._open_block("ol", attrs) + "<li>", m.group(2), "</li>"
+        if self.title_first_line and not self._titled:
+            self._titled = True
+            level = 1 + self.heading_offset
+            return f"{self._close_block()}<h{level}>", line, f"</h{level}>"
+        if self._block == "p":
+            return "<br>", line, ""
+        return self._open_block("p"), line, ""
+
+    def _line(self, line: str) -> str:
+        if self._line_suffix is not None:
+            suffix, self._line_suffix = self._line_suffix, None
+            return render_inline(line.rstrip()) + suffix
+        line = line.strip()
+        if not line:
+            return self._close_block()
+        opening, text, closing = self._start_line(line)
+        return opening + render_inline(text) + closing
+
+    def _flush_partial(self) -> str:
+        """Render the buffered part of an over-long line, cutting at the last space."""
+        cut = self._pending.rfind(" ", 0, MAX_LINE_BUFFER) + 1 or MAX_LINE_BUFFER
+        head, self._pending = self._pending[:cut], self._pending[cut:]
+        if self._line_suffix is not None:
+            return render_inline(head)
+        head = head.lstrip()
+        if not head:
+            return ""
+        opening, text, self._line_suffix = self._start_line(head)
+        return opening + render_inline(text)
+
+
+@register("wordpress")
+class WordPressRenderer(MarkdownRenderer):
+    """WordPress: HTML with headings and paragraphs; the first line becomes the <h2> title."""
+
+    title_first_line = True
 
-    # Default: return as-is for unknown platforms
-    return content
+
+@register("convertkit")
+class ConvertKitRenderer(MarkdownRenderer):
+    """ConvertKit: HTML, short readable blocks."""
+
+
+class StreamFormatter:
+    """
+    Incremental platform formatter.
+    Call feed() with content chunks as they arrive and close() once at the end.
+    The concatenated output matches format_post() on the full content, except that
+    a line longer than MAX_LINE_BUFFER may be cut at different points, so inline
+    markup spanning a cut can render differently.
+    """
+
+    def __init__(self, platform: str):
+        self.platform = platform.lower()
+        self.renderer = create_renderer(platform)
+
+    def feed(self, chunk: str) -> str:
+        return self.renderer.feed(chunk)
+
+    def close(self) -> str:
+        return self.renderer.close()
+
+
+def format_post(content: str, platform: str) -> str:
+    """
+    Format processed content for a specific platform using best practices.
+    """
+    stream = StreamFormatter(platform)
+    return stream.feed(content) + stream.close()
@@ -0,0 +1,94 @@
+# app/agents/fused.py
+
+import json
+from typing import List
+
+from pydantic import BaseModel, ValidationError
+
+from app.agents import llm, headline
+
+HEADLINE_COUNT = 5
+
+POST_TOOL = {
+    "type": "function",
+    "function": {
+        "name": "publish_post",
+        "description": "Return the compliance-safe post, its headlines and the brand compliance verdict.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "content": {"type": "string", "description": "The rewritten, compliance-safe post."},
+                "headlines": {
+                    "type": "array",
+                    "items": {"type": "string"},
+                    "minItems": 1,
+                    "maxItems": 10,
+                    "description": f"{HEADLINE_COUNT} headline variations, without numbering.",
+                },
+                "brandCompliance": {"type": "boolean"},
+                "brandComplianceRationale": {"type": "string", "description": "One sentence."},
+            },
+            "required": ["content", "headlines", "brandCompliance", "brandComplianceRationale"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+
+class FusedPost(BaseModel):
+    content: str
+    headlines: List[str]
+    brandCompliance: bool
+    brandComplianceRationale: str = ""
+
+
+class FusedOutputError(ValueError):
+    """The model's structured response was missing, not JSON or failed validation."""
+
+
+def _build_messages(prompt, brand, pillar, platform, max_len):
+    system_content = (
+        f"You are an expert compliance editor and headline expert for {brand}. "
+        "Rewrite the content to remove risky claims, minimize legal/ethical liability, "
+        "add practical disclaimers where appropriate, and make sure it fits the audience and best practices for the specified pillar and platform. "
+        f"For this content, the pillar is: '{pillar}', and the platform is: '{platform}'. "
+        "Be especially mindful of compliance, ethical language, and actionable clarity for tech leaders and founders. "
+        f"Then write {HEADLINE_COUNT} high-engagement, platform-optimized headline/title variations for the rewritten content. "
+        "For LinkedIn: strong hook, curiosity, or controversy. For Medium: SEO/curiosity and clear value. "
+        "For WordPress: include keywords and clarity. For ConvertKit: email subject style. "
+        f"ALL HEADLINES must be actionable, on-brand, NEVER generic, and MUST NOT EXCEED {max_len} CHARACTERS. "
+        "Return everything by calling publish_post."
+    )
+    return [
+        {"role": "system", "content": system_content},
+        {"role": "user", "content": prompt}
+    ]
+
+
+def parse_post(arguments: str, platform: str) -> dict:
+    """Validate the publish_post arguments and return the cleaned result."""
+    try:
+        post = FusedPost(**json.loads(arguments))
+    except (TypeError, ValueError, ValidationError) as e:
+        raise FusedOutputError(f"Invalid fused response: {e}")
+    headlines = headline.fit_headlines(post.headlines, platform)
+    if not post.content.strip() or not headlines:
+        raise FusedOutputError("Fused response has empty content or headlines")
+    return {
+        "safe": post.content,
+        "headlines": headlines,
+        "brandVerdict": {"compliant": post.brandCompliance, "rationale": post.brandComplianceRationale},
+    }
+
+
+async def generate_post_async(prompt, client, brand="Ethical AI Insider", pillar="AI Risk", platform="LinkedIn", model="gpt-4"):
+    """
+    Rewrite the content and generate headlines in a single structured function call.
+    Raises FusedOutputError if the response does not match the schema.
+    """
+    messages = _build_messages(prompt, brand, pillar, platform, headline._max_len(platform))
+    try:
+        arguments = await llm.chat_tool_async(client, messages, POST_TOOL, model, brand, platform)
+    except ValueError as e:
+        raise FusedOutputError(str(e))
+    return parse_post(arguments, platform)
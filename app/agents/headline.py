@@ -1,18 +1,19 @@
-def generate_variants(prompt, client, brand="Ethical AI Insider", pillar="AI Risk", platform="LinkedIn"):
-    """
-    Generate 5 platform-optimized, brand-aligned, high-engagement headline variations,
-    enforcing per-platform length limits.
-    """
-    # Length limits (in characters) per platform
-    limits = {
-        "linkedin": 70,
-        "medium": 80,
-        "wordpress": 70,
-        "convertkit": 45,
-    }
-    platform_key = platform.lower()
-    max_len = limits.get(platform_key, 70)  # Default to 70 if unknown
+from app.agents import llm
+
+# Length limits (in characters) per platform
+HEADLINE_LIMITS = {
+    "linkedin": 70,
+    "medium": 80,
+    "wordpress": 70,
+    "convertkit": 45,
+}
+
+
+def _max_len(platform):
+    return HEADLINE_LIMITS.get(platform.lower(), 70)  # Default to 70 if unknown
+
 
+def _build_messages(prompt, brand, pillar, platform, max_len):
     system_msg = (
         f"You are a headline expert for {brand}. "
         "Generate 5 high-engagement, platform-optimized headline/title variations for the following content. "
@@ -22,18 +23,76 @@ def generate_variants(prompt, client, brand="Ethical AI Insider", pillar="AI Ris
         "For WordPress: include keywords and clarity. For ConvertKit: email subject style. "
         f"ALL HEADLINES must be actionable, on-brand, NEVER generic, and MUST NOT EXCEED {max_len} CHARACTERS."
     )
-    messages = [
+    return [
         {"role": "system", "content": system_msg},
         {"role": "user", "content": prompt}
     ]
-    response = client.chat.completions.create(model="gpt-4", messages=messages)
-    raw_lines = response.choices[0].message.content.strip().split("\n")
+
+
+def _fit(headline, max_len):
+    if len(headline) <= max_len:
+        return headline
+    # Truncate (optional: append ellipsis if cut)
+    return headline[:max_len].rstrip() + "…"
+
+
+def _parse_headline(line, max_len):
+    cleaned = line.lstrip("0123456789.●- ").strip()
+    if not cleaned:
+        return None
+    return _fit(cleaned, max_len)
+
+
+def fit_headlines(headlines, platform):
+    """Enforce the platform length limit on already-structured headlines, dropping blanks."""
+    max_len = _max_len(platform)
+    return [_fit(h.strip(), max_len) for h in headlines if h.strip()]
+
+
+def _parse_headlines(content, max_len):
     headlines = []
-    for line in raw_lines:
-        cleaned = line.lstrip("0123456789.●- ").strip()
-        if cleaned and len(cleaned) <= max_len:
-            headlines.append(cleaned)
-        elif cleaned:
-            # Truncate (optional: append ellipsis if cut)
-            headlines.append(cleaned[:max_len].rstrip() + "…")
+    for line in content.strip().split("\n"):
+        parsed = _parse_headline(line, max_len)
+        if parsed:
+            headlines.append(parsed)
     return headlines
+
+
+def generate_variants(prompt, client, brand="Ethical AI Insider", pillar="AI Risk", platform="LinkedIn", model="gpt-4"):
+    """
+    Generate 5 platform-optimized, brand-aligned, high-engagement headline variations,
+    enforcing per-platform length limits.
+    """
+    max_len = _max_len(platform)
+    messages = _build_messages(prompt, brand, pillar, platform, max_len)
+    content = llm.chat(client, messages, model, brand, platform)
+    return _parse_headlines(content, max_len)
+
+
+async def generate_variants_async(prompt, client, brand="Ethical AI Insider", pillar="AI Risk", platform="LinkedIn", model="gpt-4"):
+    """
+    Async variant of generate_variants for use with an AsyncOpenAI client.
+    """
+    max_len = _max_len(platform)
+    messages = _build_messages(prompt, brand, pillar, platform, max_len)
+    content = await llm.chat_async(client, messages, model, brand, platform)
+    return _parse_headlines(content, max_len)
+
+
+async def generate_variants_stream(prompt, client, brand="Ethical AI Insider", pillar="AI Risk", platform="LinkedIn", model="gpt-4"):
+    """
+    Streaming variant of generate_variants: yields each headline as soon as its line is complete.
+    """
+    max_len = _max_len(platform)
+    messages = _build_messages(prompt, brand, pillar, platform, max_len)
+    pending = ""
+    async for delta in llm.chat_stream(client, messages, model, brand, platform):
+        pending += delta
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            parsed = _parse_headline(line, max_len)
+            if parsed:
+                yield parsed
+    parsed = _parse_headline(pending, max_len)
+    if parsed:
+        yield parsed
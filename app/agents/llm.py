@@ -0,0 +1,117 @@
+# app/agents/llm.py
+
+import time
+import asyncio
+
+from app.agents import routing
+from app.agents.formatter import metric_platform
+from app.utils import metrics
+from app.utils.brand_scan import metric_brand
+
+
+def _labels(brand, platform):
+    """Bounded metrics label values for the request's brand and platform."""
+    return metric_brand(brand), metric_platform(platform)
+
+
+def chat(client, messages, model, brand, platform):
+    """Run a chat completion on a sync client and return the message content."""
+    brand, platform = _labels(brand, platform)
+    started = time.perf_counter()
+    try:
+        response = client.chat.completions.create(model=model, messages=messages, timeout=routing.LLM_BUDGET)
+    except Exception:
+        metrics.OPENAI_ERRORS.labels(brand, platform, model).inc()
+        raise
+    metrics.OPENAI_REQUEST_DURATION.labels(model, "sync").observe_since(started)
+    metrics.record_usage(getattr(response, "usage", None), model, brand, platform)
+    return response.choices[0].message.content
+
+
+async def _create(client, model, brand, platform, mode, **kwargs):
+    """One chat completion request, with its latency, usage and errors recorded under `model`."""
+    started = time.perf_counter()
+    try:
+        response = await client.chat.completions.create(model=model, **kwargs)
+    except Exception:
+        metrics.OPENAI_ERRORS.labels(brand, platform, model).inc()
+        raise
+    metrics.OPENAI_REQUEST_DURATION.labels(model, mode).observe_since(started)
+    metrics.record_usage(getattr(response, "usage", None), model, brand, platform)
+    return response
+
+
+async def chat_async(client, messages, model, brand, platform):
+    """
+    Run a chat completion on an AsyncOpenAI client and return the message content.
+    The request goes through the model router (latency budget, hedging, fallback).
+    """
+    brand, platform = _labels(brand, platform)
+
+    async def attempt(name):
+        return await _create(client, name, brand, platform, "async", messages=messages)
+
+    response = await routing.get_router().call(model, attempt)
+    return response.choices[0].message.content
+
+
+async def chat_tool_async(client, messages, tool, model, brand, platform):
+    """
+    Run a chat completion that must call the given function tool and return
+    the raw JSON arguments string of that call.
+    """
+    name = tool["function"]["name"]
+    brand, platform = _labels(brand, platform)
+
+    async def attempt(model_name):
+        return await _create(
+            client, model_name, brand, platform, "tool",
+            messages=messages,
+            tools=[tool],
+            tool_choice={"type": "function", "function": {"name": name}},
+        )
+
+    response = await routing.get_router().call(model, attempt)
+    for call in getattr(response.choices[0].message, "tool_calls", None) or []:
+        if call.function.name == name:
+            return call.function.arguments
+    raise ValueError(f"Model did not call {name}")
+
+
+async def chat_stream(client, messages, model, brand, platform):
+    """
+    Stream a chat completion, yielding content deltas as they arrive.
+    Streams are not hedged, but the router's breakers pick the model and the
+    wait for the response to start is bounded by the latency budget.
+    """
+    brand, platform = _labels(brand, platform)
+    router = routing.get_router()
+    model = router.pick(model)
+    started = time.perf_counter()
+    try:
+        stream = await asyncio.wait_for(
+            client.chat.completions.create(
+                model=model, messages=messages, stream=True, stream_options={"include_usage": True}
+            ),
+            timeout=router.budget,
+        )
+        async for chunk in stream:
+            # The final chunk carries usage and no choices
+            if getattr(chunk, "usage", None) is not None:
+                metrics.record_usage(chunk.usage, model, brand, platform)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+    except asyncio.TimeoutError:
+        error = routing.UpstreamTimeout(f"{model} did not start streaming within {router.budget:.1f}s")
+        metrics.OPENAI_ERRORS.labels(brand, platform, model).inc()
+        router.record(model, error)
+        raise error
+    except Exception as e:
+        metrics.OPENAI_ERRORS.labels(brand, platform, model).inc()
+        router.record(model, e)
+        raise
+    router.record(model)
+    metrics.OPENAI_REQUEST_DURATION.labels(model, "stream").observe_since(started)
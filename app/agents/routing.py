@@ -0,0 +1,272 @@
+# app/agents/routing.py
+
+import os
+import sys
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Optional
+
+from app.utils import metrics
+
+logger = logging.getLogger("mcp")
+
+# Faster model used when the requested one times out, fails or has an open circuit ("" disables fallback)
+FALLBACK_MODEL = os.getenv("MCP_MODEL_FALLBACK", "")
+# Total seconds one agent call may take, across hedges and fallback
+LLM_BUDGET = float(os.getenv("MCP_LLM_BUDGET", "60"))
+# Share of the budget given to the requested model when a fallback is configured
+PRIMARY_SHARE = float(os.getenv("MCP_LLM_PRIMARY_SHARE", "0.6"))
+HEDGE = os.getenv("MCP_LLM_HEDGE", "true").lower() != "false"
+HEDGE_QUANTILE = float(os.getenv("MCP_LLM_HEDGE_QUANTILE", "0.95"))
+HEDGE_MIN_DELAY = float(os.getenv("MCP_LLM_HEDGE_MIN_DELAY", "1"))
+HEDGE_INITIAL_DELAY = float(os.getenv("MCP_LLM_HEDGE_INITIAL_DELAY", "15"))  # until enough latencies are seen
+BREAKER_FAILURES = int(os.getenv("MCP_LLM_BREAKER_FAILURES", "5"))  # consecutive failures that open the circuit
+BREAKER_RESET = float(os.getenv("MCP_LLM_BREAKER_RESET", "30"))  # seconds before a probe request is let through
+
+
+class UpstreamTimeout(TimeoutError):
+    """The model did not answer within its share of the latency budget."""
+
+
+class CircuitOpenError(RuntimeError):
+    """The model's circuit is open; retry_after is when the next probe is allowed."""
+
+    def __init__(self, model: str, retry_after: float):
+        super().__init__(f"{model} is unavailable (circuit open); retry after {retry_after:.0f}s")
+        self.model = model
+        self.retry_after = retry_after
+
+
+def _transport_errors() -> tuple:
+    """Timeout and connection error types, from the HTTP SDKs already loaded (never imported just to check)."""
+    errors = [asyncio.TimeoutError, TimeoutError, ConnectionError]
+    if "httpx" in sys.modules:
+        errors.append(sys.modules["httpx"].TransportError)
+    if "openai" in sys.modules:
+        errors.append(sys.modules["openai"].APIConnectionError)  # includes APITimeoutError
+    return tuple(errors)
+
+
+def is_upstream_failure(error: Exception) -> bool:
+    """
+    True for errors that say the upstream is degraded: timeouts, connection
+    errors and 5xx/408/409/429 responses. Other 4xx are the request's fault, and
+    anything else (e.g. a KeyError parsing a response) is a local bug; neither
+    trips the breaker nor triggers fallback.
+    """
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status >= 500 or status in (408, 409, 429)
+    return isinstance(error, _transport_errors())
+
+
+class LatencyTracker:
+    """Rolling window of recent successful call latencies."""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def quantile(self, q: float, default: float) -> float:
+        if len(self.samples) < self.min_samples:
+            return default
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    """
+    Opens after `failures` consecutive upstream failures. While open, calls
+    fail fast; once every `reset_after` seconds one probe call is let through,
+    and its success closes the circuit again.
+    """
+
+    def __init__(self, failures: int = BREAKER_FAILURES, reset_after: float = BREAKER_RESET):
+        self.failures = failures
+        self.reset_after = reset_after
+        self.consecutive = 0
+        self.opened_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self.opened_at >= self.reset_after:
+            # Half-open: this call is the probe; others keep failing fast for another window
+            self.opened_at = now
+            return True
+        return False
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_after - time.monotonic())
+
+    def record_success(self):
+        self.consecutive = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.consecutive += 1
+        if self.consecutive >= self.failures:
+            self.opened_at = time.monotonic()
+
+
+class ModelRouter:
+    """
+    Routes agent calls across the requested model and an optional fallback.
+
+    Each call gets a latency budget. Within the requested model's share, a
+    duplicate request is sent once the first has been outstanding longer than
+    that model's recent p95 latency, and whichever answers first wins. If the
+    model times out, fails or its circuit is open, the fallback model gets the
+    rest of the budget. Per-model circuit breakers make calls fail fast while
+    the upstream is degraded instead of holding requests for the full timeout.
+    """
+
+    def __init__(self, fallback: str = FALLBACK_MODEL, budget: float = LLM_BUDGET,
+                 primary_share: float = PRIMARY_SHARE, hedge: bool = HEDGE):
+        self.fallback = fallback
+        self.budget = budget
+        self.primary_share = primary_share
+        self.hedge = hedge
+        self.latency = {}  # model -> LatencyTracker
+        self.breakers = {}  # model -> CircuitBreaker
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        if model not in self.breakers:
+            self.breakers[model] = CircuitBreaker()
+        return self.breakers[model]
+
+    def tracker(self, model: str) -> LatencyTracker:
+        if model not in self.latency:
+            self.latency[model] = LatencyTracker()
+        return self.latency[model]
+
+    def hedge_delay(self, model: str) -> float:
+        return max(HEDGE_MIN_DELAY, self.tracker(model).quantile(HEDGE_QUANTILE, HEDGE_INITIAL_DELAY))
+
+    def plan(self, model: str):
+        if self.fallback and self.fallback != model:
+            return [model, self.fallback]
+        return [model]
+
+    def pick(self, model: str) -> str:
+        """The first model in the plan whose circuit lets a call through (for streaming)."""
+        for candidate in self.plan(model):
+            if self.breaker(candidate).allow():
+                return candidate
+        breaker = self.breaker(model)
+        raise CircuitOpenError(model, breaker.retry_after())
+
+    def record(self, model: str, error: Optional[Exception] = None):
+        if error is None:
+            self.breaker(model).record_success()
+        elif is_upstream_failure(error):
+            self.breaker(model).record_failure()
+
+    async def call(self, model: str, attempt):
+        """
+        Run `attempt(model_name)` (a coroutine function) under the routing policy
+        and return its result. Raises UpstreamTimeout, CircuitOpenError or the
+        last upstream error when no model answers within the budget.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.budget
+        plan = self.plan(model)
+        last_error = None
+        for i, candidate in enumerate(plan):
+            breaker = self.breaker(candidate)
+            if not breaker.allow():
+                last_error = last_error or CircuitOpenError(candidate, breaker.retry_after())
+            else:
+                remaining = deadline - loop.time()
+                timeout = remaining * self.primary_share if i + 1 < len(plan) else remaining
+                try:
+                    result = await self._hedged(candidate, attempt, timeout)
+                except asyncio.TimeoutError:
+                    breaker.record_failure()
+                    last_error = UpstreamTimeout(f"{candidate} did not answer within {timeout:.1f}s")
+                except Exception as e:
+                    self.record(candidate, e)
+                    if not is_upstream_failure(e):
+                        raise
+                    last_error = e
+                else:
+                    breaker.record_success()
+                    return result
+            if i + 1 < len(plan):
+                metrics.OPENAI_FALLBACKS.labels(candidate, plan[i + 1]).inc()
+                logger.warning(f"Falling back from {candidate} to {plan[i + 1]}: {last_error}")
+        raise last_error
+
+    async def _hedged(self, model: str, attempt, timeout: float):
+        """Run attempt(model), adding one duplicate after the hedge delay; the first success wins."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        hedge_at = loop.time() + self.hedge_delay(model) if self.hedge else None
+        started = {}
+        pending = set()
+
+        def launch():
+            task = asyncio.ensure_future(attempt(model))
+            started[task] = loop.time()
+            pending.add(task)
+
+        launch()
+        error = None
+        try:
+            while pending:
+                now = loop.time()
+                if now >= deadline:
+                    raise asyncio.TimeoutError
+                wake = deadline if hedge_at is None else min(deadline, hedge_at)
+                done, _ = await asyncio.wait(pending, timeout=wake - now, return_when=asyncio.FIRST_COMPLETED)
+                pending -= done
+                errors = {task: task.exception() for task in done}
+                winner = next((task for task, e in errors.items() if e is None), None)
+                if winner is not None:
+                    # Only the winner's latency is real; a cancelled loser's would just be a lower bound
+                    self.tracker(model).record(loop.time() - started[winner])
+                    return winner.result()
+                if errors:
+                    error = list(errors.values())[-1]
+                if hedge_at is not None and pending and loop.time() >= hedge_at:
+                    hedge_at = None
+                    metrics.OPENAI_HEDGES.labels(model).inc()
+                    launch()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+_router: Optional[ModelRouter] = None
+
+
+def get_router() -> ModelRouter:
+    """Return the process-wide router, so latency history and breakers are shared by all agents."""
+    global _router
+    if _router is None:
+        _router = ModelRouter()
+    return _router
+
+
+def set_router(router: Optional[ModelRouter]):
+    """Replace the process-wide router (None resets it to the configured one)."""
+    global _router
+    _router = router
+
+
+metrics.OPENAI_CIRCUIT_OPEN.callback = lambda: {
+    (model,): int(breaker.is_open) for model, breaker in get_router().breakers.items()
+}
@@ -1,8 +1,19 @@
+import os
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Dict
 
-app = FastAPI()
+from app.utils.state import StateDict, close_state_backend
+
+logger = logging.getLogger("mcp")
+
+# Build client pools and load SDKs in the background right after startup
+PREWARM = os.getenv("MCP_PREWARM", "true").lower() != "false"
 
 router = APIRouter()
 
@@ -10,18 +21,24 @@ class EnhancementRequest(BaseModel):
     summary: str
     details: str
 
-# Use dependency injection for a real system; for demo, use a global dict
-agent_statuses: Dict[str, Dict[str, str]] = {
+DEFAULT_AGENT_STATUSES: Dict[str, Dict[str, str]] = {
     'code': {'status': 'pending', 'log': ''},
     'test': {'status': 'pending', 'log': ''},
     'docs': {'status': 'pending', 'log': ''},
     'secops': {'status': 'pending', 'log': ''}
 }
 
+# Kept in the shared state backend so every worker process reports the same statuses
+agent_statuses = StateDict('agent_statuses')
+
+
+def current_agent_statuses() -> Dict[str, Dict[str, str]]:
+    return {**DEFAULT_AGENT_STATUSES, **agent_statuses.to_dict()}
+
 @router.get("/enhancement-log", tags=["Enhancement"])
 async def get_enhancement_log():
     """Return latest agent statuses."""
-    return agent_statuses
+    return current_agent_statuses()
 
 @router.post("/enhancement", tags=["Enhancement"])
 async def handle_enhancement(request: EnhancementRequest):
@@ -29,15 +46,78 @@ async def handle_enhancement(request: EnhancementRequest):
     Simulate internal processing by each agent.
     If secops fails, return success=False.
     """
-    for agent in agent_statuses:
+    statuses = {}
+    for agent in DEFAULT_AGENT_STATUSES:
         if agent != 'secops':
-            agent_statuses[agent]['status'] = 'passed'
-            agent_statuses[agent]['log'] = f'Simulated log for {agent} agent. Enhancement: {request.summary}'
+            statuses[agent] = {'status': 'passed', 'log': f'Simulated log for {agent} agent. Enhancement: {request.summary}'}
         else:
-            agent_statuses[agent]['status'] = 'failed'
-            agent_statuses[agent]['log'] = f'Simulated log for {agent} agent. Enhancement: {request.summary} [FAILED]'
+            statuses[agent] = {'status': 'failed', 'log': f'Simulated log for {agent} agent. Enhancement: {request.summary} [FAILED]'}
+    agent_statuses.update_all(statuses)
+
+    all_passed = all(status['status'] == 'passed' for status in statuses.values())
+    return {'success': all_passed, 'statuses': current_agent_statuses()}
+
+
+async def prewarm():
+    """
+    Create the OpenAI client, load the tokenizer, open the enhancement store and import
+    the GitHub SDKs off the event loop, so the first requests do not pay for them.
+    """
+    from app.routes import api
+    from app.utils import github, openai_client
+    from app.utils.tokens import get_counter
+
+    started = time.perf_counter()
+    try:
+        await asyncio.to_thread(openai_client.get_async_client)
+        await asyncio.to_thread(get_counter, api.OPENAI_MODEL)
+        await asyncio.to_thread(api.get_enhancement_store)
+        await asyncio.to_thread(github._load_sdk)
+    except Exception as e:
+        logger.warning(f"Pre-warm failed (resources will be created on first use): {e}")
+        return
+    logger.info(f"Pre-warmed shared resources in {time.perf_counter() - started:.2f}s")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Own the process-wide resources: validate configuration on startup, pre-warm
+    pools in the background, and on shutdown cancel background jobs and close
+    the OpenAI/GitHub pools, the queue and job stores and the state backend.
+    """
+    from app.routes import api
+    from app.utils import github, openai_client
+
+    api.check_required_env()
+    warm_task = asyncio.create_task(prewarm()) if PREWARM else None
+    try:
+        yield
+    finally:
+        if warm_task is not None:
+            # Let a running pre-warm finish, so it cannot recreate resources after they are closed
+            await asyncio.gather(warm_task, return_exceptions=True)
+        # Running and queued jobs are marked as cancelled
+        await api.shutdown_jobs()
+        await openai_client.close_async_client()
+        github.close_github_client()
+        api.close_enhancement_store()
+        api.close_job_store()
+        close_state_backend()
+
+
+def create_app() -> FastAPI:
+    """
+    Build the MCP application. Importing this module does no I/O and needs no
+    credentials; configuration is checked when the app starts.
+    """
+    from app.routes import api
+
+    app = FastAPI(lifespan=lifespan)
+    app.add_api_route("/", api.health_check, methods=["GET"], tags=["Health"])
+    app.include_router(router, prefix='/api')
+    app.include_router(api.router, prefix='/api')
+    return app
 
-    all_passed = all(status['status'] == 'passed' for status in agent_statuses.values())
-    return {'success': all_passed, 'statuses': agent_statuses}
 
-app.include_router(router, prefix='/api')
+app = create_app()
@@ -1,18 +1,38 @@
 # app/routes/api.py
 
 import os
+import re
 import json
-import traceback
+import math
+import base64
 import time
+import asyncio
+import hmac
+import hashlib
+import secrets
+import socket
+import ipaddress
+import traceback
 import logging
+from typing import Dict, Optional
+from urllib.parse import urlparse
 
-from fastapi import APIRouter, Request, Header, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
-from openai import OpenAI
+from fastapi import APIRouter, Request, Response, Header, HTTPException, BackgroundTasks
+from fastapi.responses import JSONResponse, StreamingResponse
 
-from app.agents import headline, compliance, formatter
+from app.agents import headline, compliance, formatter, assistant, fused, routing
 from app.utils.text import clean_text, log_request, estimate_tokens
+from app.utils.tokens import count_tokens_batch, get_counter
 from app.utils import github
+from app.utils.openai_client import get_async_client, is_rate_limit_error
+from app.utils.cache import ResponseCache, cache_key
+from app.utils.queue_store import EnhancementStore
+from app.utils.job_store import JobStore, JobExecutor
+from app.utils.brand_scan import scan_brand
+from app.utils.similarity import SimilarityIndex, simhash
+from app.utils.admission import AdmissionController, AdmissionRejected
+from app.utils import metrics
+from app.utils.patching import PatchError, resolve_files
 
 # Setup logger
 logger = logging.getLogger("mcp")
@@ -31,16 +51,107 @@ REQUIRED_ENV_VARS = [
     "BOT_GH_USER",
     "BOT_GH_REPO"
 ]
-missing_vars = [v for v in REQUIRED_ENV_VARS if not os.getenv(v)]
-if missing_vars:
-    logger.error(f"Missing required environment variables: {', '.join(missing_vars)}")
-    raise RuntimeError(f"Missing required environment variables: {', '.join(missing_vars)}")
-
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-MCP_SECRET = os.getenv("MCP_SECRET", "")
-ENH_FILE = "/app/enhancements.json"
+
+
+def check_required_env():
+    """Fail fast at startup (not at import) when required configuration is missing."""
+    missing_vars = [v for v in REQUIRED_ENV_VARS if not os.getenv(v)]
+    if missing_vars:
+        logger.error(f"Missing required environment variables: {', '.join(missing_vars)}")
+        raise RuntimeError(f"Missing required environment variables: {', '.join(missing_vars)}")
+
+
+# Without a configured secret nobody can authenticate (startup also refuses to run)
+MCP_SECRET = os.getenv("MCP_SECRET") or secrets.token_urlsafe(32)
+ENH_FILE = "/app/enhancements.json"  # legacy queue file, imported into ENH_DB on first start
+ENH_DB = os.getenv("MCP_ENH_DB", "/app/enhancements.db")
+ENH_STALE_AFTER = int(os.getenv("MCP_ENH_STALE_AFTER", "3600"))  # seconds before in-progress items are requeued
+ENH_WORKERS = int(os.getenv("MCP_ENH_WORKERS", "4"))
+ENH_TIMEOUT = int(os.getenv("MCP_ENH_TIMEOUT", "600"))  # per-enhancement budget in seconds
+ENH_PAGE_SIZE = int(os.getenv("MCP_ENH_PAGE_SIZE", "100"))  # default /enhancements page size
+ENH_PAGE_MAX = int(os.getenv("MCP_ENH_PAGE_MAX", "1000"))
+ASSISTANT_STREAMING = os.getenv("MCP_ASSISTANT_STREAMING", "true").lower() != "false"
+COMMIT_BACKEND = os.getenv("MCP_COMMIT_BACKEND", "git").lower()  # "git" (worktree + push) or "api" (Git Data API)
+if COMMIT_BACKEND not in ("git", "api"):
+    raise RuntimeError(f"MCP_COMMIT_BACKEND must be 'git' or 'api', not '{COMMIT_BACKEND}'")
+# "patch" (the coding agent returns diffs or search/replace edits, applied here) or "full" (whole files)
+CODE_OUTPUT = os.getenv("MCP_CODE_OUTPUT", "patch").lower()
+if CODE_OUTPUT not in ("patch", "full"):
+    raise RuntimeError(f"MCP_CODE_OUTPUT must be 'patch' or 'full', not '{CODE_OUTPUT}'")
+CODE_CONTEXT_BYTES = int(os.getenv("MCP_CODE_CONTEXT_BYTES", "200000"))  # current files shown to the agent
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_ASSISTANT_ID = os.getenv("OPENAI_ASSISTANT_ID")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4")
+# Fused mode: one structured call returns content, headlines and the brand verdict
+FUSED_MODE = os.getenv("MCP_FUSED_MODE", "false").lower() == "true"
+
+# ---- /process response cache ----
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("MCP_CACHE_MAX_ENTRIES", "512")),
+    max_bytes=int(os.getenv("MCP_CACHE_MAX_BYTES", str(32 * 1024 * 1024))),
+    ttl=int(os.getenv("MCP_CACHE_TTL", "86400")),
+    disk_dir=os.getenv("MCP_CACHE_DIR") or None,
+)
+
+# ---- Near-duplicate detection ----
+# "off", "offer" (return the similar result instead of generating, marked as an offer)
+# or "return" (serve the similar result as the answer); overridable per request via x-mcp-similar
+SIMILAR_MODES = ("off", "offer", "return")
+SIMILAR_MODE = os.getenv("MCP_SIMILAR_MODE", "off").lower()
+if SIMILAR_MODE not in SIMILAR_MODES:
+    raise RuntimeError(f"MCP_SIMILAR_MODE must be one of {', '.join(SIMILAR_MODES)}, not '{SIMILAR_MODE}'")
+similar_index = SimilarityIndex(
+    max_entries=int(os.getenv("MCP_SIMILAR_MAX_ENTRIES", "10000")),
+    max_distance=int(os.getenv("MCP_SIMILAR_MAX_DISTANCE", "3")),
+    ttl=response_cache.ttl,
+)
+
+# ---- OpenAI admission control ----
+# Quotas of 0 disable the corresponding bucket; set them to the account's RPM/TPM limits
+admission = AdmissionController(
+    rpm=float(os.getenv("MCP_ADMISSION_RPM", "0")),
+    tpm=float(os.getenv("MCP_ADMISSION_TPM", "0")),
+    max_queue=int(os.getenv("MCP_ADMISSION_MAX_QUEUE", "100")),
+    max_wait=float(os.getenv("MCP_ADMISSION_MAX_WAIT", "30")),
+)
+ADMISSION_COMPLETION_TOKENS = int(os.getenv("MCP_ADMISSION_COMPLETION_TOKENS", "800"))  # expected output per call
+# JSON object mapping x-mcp-api-key values to priorities (higher is admitted first, default 0)
+ADMISSION_PRIORITIES = json.loads(os.getenv("MCP_ADMISSION_PRIORITIES", "{}"))
+OPENAI_RETRY_AFTER = 5.0  # pause used when OpenAI returns 429 without Retry-After
+metrics.ADMISSION_QUEUE_DEPTH.callback = lambda: {(): admission.queue_depth()}
+
+# ---- /process/batch limits ----
+BATCH_CONCURRENCY = int(os.getenv("MCP_BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("MCP_BATCH_MAX_CONCURRENCY", "16"))
+BATCH_MAX_ITEMS = int(os.getenv("MCP_BATCH_MAX_ITEMS", "500"))
+TOKENS_BATCH_MAX = int(os.getenv("MCP_TOKENS_BATCH_MAX", "10000"))
+_batch_slots = None  # (loop, semaphore) bounding pipeline runs across all concurrent batches
+
+
+def batch_slots() -> asyncio.Semaphore:
+    """Process-wide limit of BATCH_MAX_CONCURRENCY batch items in flight, however many batches run."""
+    global _batch_slots
+    loop = asyncio.get_running_loop()
+    if _batch_slots is None or _batch_slots[0] is not loop:
+        # Semaphores belong to one event loop (tests start several)
+        _batch_slots = (loop, asyncio.Semaphore(BATCH_MAX_CONCURRENCY))
+    return _batch_slots[1]
+
+# ---- /process/jobs ----
+JOB_DB = os.getenv("MCP_JOB_DB", "/app/jobs.db")
+JOB_TTL = int(os.getenv("MCP_JOB_TTL", "86400"))  # seconds a finished job stays pollable
+JOB_TIMEOUT = int(os.getenv("MCP_JOB_TIMEOUT", "900"))  # per-job budget, including waits for OpenAI quota
+JOB_WEBHOOK_ATTEMPTS = int(os.getenv("MCP_JOB_WEBHOOK_ATTEMPTS", "3"))
+JOB_WEBHOOK_TIMEOUT = float(os.getenv("MCP_JOB_WEBHOOK_TIMEOUT", "10"))
+# Comma-separated hosts callbackUrl may point at. Without it any host is allowed whose
+# addresses are all public, so jobs cannot be used to reach internal or metadata services.
+JOB_CALLBACK_HOSTS = {h.strip().lower() for h in os.getenv("MCP_JOB_CALLBACK_HOSTS", "").split(",") if h.strip()}
+JOB_CANCELLED = "Job cancelled by server shutdown"
+job_executor = JobExecutor(
+    concurrency=int(os.getenv("MCP_JOB_CONCURRENCY", "4")),
+    max_pending=int(os.getenv("MCP_JOB_MAX_PENDING", "1000")),
+)
+metrics.JOBS_PENDING.callback = lambda: {(): job_executor.pending}
 
 
 @router.get("/", tags=["Health"])
@@ -49,31 +160,35 @@ async def health_check():
     return {"status": "ok"}
 
 
-@router.post("/process", tags=["Processing"])
-async def process_content(
-    request: Request,
-    x_mcp_secret: str = Header(..., alias="x-mcp-secret")
-):
-    """Process content through MCP agents with brand/pillar/platform context."""
-    if x_mcp_secret != MCP_SECRET:
-        raise HTTPException(status_code=401, detail="Unauthorized")
-
-    body = await request.json()
-    raw_text = body.get("text", "")
-    platform = body.get("platform", "LinkedIn")
-    pillar = body.get("pillar", "AI Risk")
-    name = body.get("name", "")
-    brand = body.get("brand", "Ethical AI Insider")
-    context = body.get("context", "")
-
-    if not raw_text or not platform or not pillar:
+def parse_process_fields(body: dict) -> dict:
+    """Read and validate the /process request fields."""
+    fields = {
+        "raw_text": body.get("text", ""),
+        "platform": body.get("platform", "LinkedIn"),
+        "pillar": body.get("pillar", "AI Risk"),
+        "name": body.get("name", ""),
+        "brand": body.get("brand", "Ethical AI Insider"),
+        "context": body.get("context", ""),
+    }
+    wrong_type = [f for f in ("text", "platform", "pillar", "brand", "name", "context")
+                  if not isinstance(fields["raw_text" if f == "text" else f], str)]
+    if wrong_type:
+        raise HTTPException(status_code=400, detail=f"Fields must be strings: {', '.join(wrong_type)}")
+    if not fields["raw_text"] or not fields["platform"] or not fields["pillar"]:
         raise HTTPException(status_code=400, detail="Missing required fields: text, platform, pillar")
+    fields["text"] = clean_text(fields["raw_text"])
+    return fields
 
-    # Sanitize and log
-    text = clean_text(raw_text)
-    log_request("mcp-process", text)
 
-    prompt_context = f"""
+def build_prompt_context(fields: dict) -> str:
+    """Build the shared agent prompt for a /process request."""
+    brand = fields["brand"]
+    pillar = fields["pillar"]
+    platform = fields["platform"]
+    text = fields["text"]
+    name = fields["name"]
+    context = fields["context"]
+    return f"""
 You are the content engine for {brand}—a leading advisory on AI risk, compliance, and responsible innovation for technology executives and startup founders.
 
 Requirements:
@@ -92,49 +207,760 @@ Requirements:
 After writing, also return a field "brandCompliance" (True/False) with a one-sentence rationale.
 """.strip()
 
+
+def process_model_tag() -> str:
+    """Model identifier for cache keys; fused results are cached separately."""
+    return f"{OPENAI_MODEL}+fused" if FUSED_MODE else OPENAI_MODEL
+
+
+def process_cache_key(fields: dict) -> str:
+    return cache_key(
+        fields["text"], fields["brand"], fields["pillar"], fields["platform"], fields["context"],
+        process_model_tag()
+    )
+
+
+def brand_compliance_note(scan: dict, brand: str) -> str:
+    """Brand Compliance QA note for a brand_scan result on the rewritten content."""
+    if scan["banned"]:
+        return f"False: Content uses terms banned for {brand}: {', '.join(scan['banned'])}."
+    if scan["compliant"]:
+        return f"True: Content references key {brand} themes."
+    return f"False: Content may not reference {brand} themes—please revise prompt."
+
+
+def agent_duration(agent: str, platform: str):
+    """AGENT_DURATION series for an agent step; free-text platforms are bucketed as "other"."""
+    return metrics.AGENT_DURATION.labels(agent, formatter.metric_platform(platform))
+
+
+def brand_qa(safe: str, fields: dict) -> dict:
+    """Scan the rewritten content against the brand dictionaries; returns the brand result fields."""
+    started = time.perf_counter()
+    scan = scan_brand(safe, fields["brand"])
+    agent_duration("brand_scan", fields["platform"]).observe_since(started)
+    return {"brandCompliance": brand_compliance_note(scan, fields["brand"]), "brandScan": scan}
+
+
+async def timed_agent(agent: str, platform: str, awaitable):
+    """Await an agent call, recording its duration."""
+    started = time.perf_counter()
     try:
-        # Run agents
-        safe = compliance.rewrite_safe(
-            prompt_context,
-            client,
-            brand=brand,
-            pillar=pillar,
-            platform=platform
-        )
+        return await awaitable
+    finally:
+        agent_duration(agent, platform).observe_since(started)
+
+
+def rate_limited(detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(math.ceil(retry_after))})
+
+
+async def admit_process(prompt_context: str, priority: int = 0):
+    """
+    Wait for OpenAI quota for one /process pipeline run, or raise a 429.
+    The token cost is the prompt size per call plus the expected completion.
+    """
+    calls = 1 if FUSED_MODE else 2
+    cost = calls * (estimate_tokens(prompt_context, OPENAI_MODEL) + ADMISSION_COMPLETION_TOKENS)
+    started = time.perf_counter()
+    try:
+        await admission.acquire(cost, calls=calls, priority=priority)
+    except AdmissionRejected as e:
+        metrics.ADMISSION_REJECTED.labels(e.reason).inc()
+        raise rate_limited(f"OpenAI capacity exhausted: {e}", e.retry_after)
+    metrics.ADMISSION_WAIT.labels().observe_since(started)
+
+
+def openai_retry_after(error: Exception) -> float:
+    """Seconds to back off after an OpenAI 429, pausing admission for that long."""
+    response = getattr(error, "response", None)
+    try:
+        retry_after = float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        retry_after = OPENAI_RETRY_AFTER
+    admission.pause(retry_after)
+    metrics.ADMISSION_REJECTED.labels("openai rate limit").inc()
+    return retry_after
+
+
+def priority_for(api_key: str) -> int:
+    return int(ADMISSION_PRIORITIES.get(api_key, 0)) if api_key else 0
+
+
+async def run_process_pipeline(fields: dict, priority: int = 0) -> dict:
+    """Run the agent pipeline for one /process request and build the response body."""
+    prompt_context = build_prompt_context(fields)
+    await admit_process(prompt_context, priority)
+    platform = fields["platform"]
+    agent_kwargs = {
+        "brand": fields["brand"],
+        "pillar": fields["pillar"],
+        "platform": platform,
+        "model": OPENAI_MODEL,
+    }
+
+    extra = {}
+    try:
+        client = get_async_client()
+        fused_post = None
+        if FUSED_MODE:
+            fused_post = await run_fused_agent(prompt_context, client, agent_kwargs)
+        if fused_post is not None:
+            safe, headlines = fused_post["safe"], fused_post["headlines"]
+            extra["brandVerdict"] = fused_post["brandVerdict"]
+        else:
+            # Run agents concurrently; headlines only depend on prompt_context
+            safe, headlines = await asyncio.gather(
+                timed_agent(
+                    "rewrite_safe", platform,
+                    compliance.rewrite_safe_async(prompt_context, client, **agent_kwargs)
+                ),
+                timed_agent(
+                    "generate_variants", platform,
+                    headline.generate_variants_async(prompt_context, client, **agent_kwargs)
+                ),
+            )
+        started = time.perf_counter()
         formatted = formatter.format_post(safe, platform)
-        headlines = headline.generate_variants(
-            prompt_context,
-            client,
-            brand=brand,
-            pillar=pillar,
-            platform=platform
-        )
+        agent_duration("format_post", platform).observe_since(started)
     except Exception as e:
+        if is_rate_limit_error(e):
+            logger.warning(f"OpenAI rate limit: {str(e)}")
+            raise rate_limited("OpenAI rate limit reached", openai_retry_after(e))
+        if isinstance(e, routing.CircuitOpenError):
+            raise HTTPException(
+                status_code=503, detail=f"OpenAI unavailable: {e}",
+                headers={"Retry-After": str(math.ceil(e.retry_after))},
+            )
+        if isinstance(e, routing.UpstreamTimeout):
+            raise HTTPException(status_code=504, detail=f"OpenAI agent timed out: {e}")
         logger.error(f"OpenAI agent error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"OpenAI agent error: {str(e)}")
 
-    # Brand Compliance QA
-    compliance_keywords = [
-        "ethical AI", "compliance", "risk", "governance", "AI Insider", "tech leader", "startup founder"
-    ]
-    brand_compliance = any(kw.lower() in safe.lower() for kw in compliance_keywords)
-    brand_compliance_note = (
-        "True: Content references key Ethical AI Insider themes."
-        if brand_compliance
-        else "False: Content may not reference Ethical AI Insider themes—please revise prompt."
+    return {
+        "safe": safe,
+        "formatted": formatted,
+        "headlines": headlines,
+        "platform": platform,
+        "pillar": fields["pillar"],
+        "brand": fields["brand"],
+        **brand_qa(safe, fields),
+        **extra,
+        "name": fields["name"],
+        "context": fields["context"]
+    }
+
+
+async def run_fused_agent(prompt_context: str, client, agent_kwargs: dict):
+    """
+    Run the fused single-call agent. Returns None when the structured response
+    fails validation, so the caller falls back to the two-call path.
+    """
+    try:
+        return await timed_agent(
+            "fused", agent_kwargs["platform"],
+            fused.generate_post_async(prompt_context, client, **agent_kwargs)
+        )
+    except fused.FusedOutputError as e:
+        metrics.FUSED_FALLBACKS.inc()
+        logger.warning(f"Fused agent output rejected, falling back to separate calls: {e}")
+        return None
+
+
+def similar_scope(fields: dict) -> tuple:
+    """Requests are only near-duplicates of each other within the same brand/pillar/platform context."""
+    return (fields["brand"], fields["pillar"], fields["platform"].lower(), fields["context"], process_model_tag())
+
+
+def similar_mode_for(header: str) -> str:
+    mode = (header or SIMILAR_MODE).lower()
+    if mode not in SIMILAR_MODES:
+        raise HTTPException(status_code=400, detail=f"x-mcp-similar must be one of {', '.join(SIMILAR_MODES)}")
+    return mode
+
+
+def find_similar(fields: dict, key: str, fingerprint: int):
+    """Return (distance, original text, cached result) for a recent near-duplicate request, or None."""
+    match = similar_index.lookup(similar_scope(fields), fingerprint, exclude=key)
+    if match is None:
+        return None
+    distance, similar_key, similar_text = match
+    result = response_cache.get(similar_key)
+    if result is None:
+        similar_index.remove(similar_key)
+        return None
+    return distance, similar_text, result
+
+
+def similar_response(fields: dict, match, mode: str):
+    """Build the /process body for a near-duplicate hit; returns (body, cache status)."""
+    distance, similar_text, result = match
+    similar_to = {"text": similar_text, "distance": distance}
+    if mode == "return":
+        return {**result, "name": fields["name"], "similarTo": similar_to}, "similar"
+    return {"similar": {**similar_to, "result": result}}, "similar-offer"
+
+
+def remember_result(fields: dict, key: str, fingerprint: int, result: dict):
+    response_cache.set(key, result)
+    similar_index.add(key, similar_scope(fields), fingerprint, fields["text"])
+
+
+async def process_with_cache(fields: dict, cache_mode: str = "", similar_mode: str = SIMILAR_MODE, priority: int = 0):
+    """
+    Serve a /process request from the response cache, a near-duplicate or the pipeline.
+    Returns the response body and the cache status (hit, similar, similar-offer, miss, bypass or refresh).
+    """
+    key = process_cache_key(fields)
+    fingerprint = simhash(fields["text"])
+    if cache_mode not in ("bypass", "refresh"):
+        cached = response_cache.get(key)
+        if cached is not None:
+            return {**cached, "name": fields["name"]}, "hit"
+        if similar_mode != "off":
+            match = find_similar(fields, key, fingerprint)
+            if match is not None:
+                return similar_response(fields, match, similar_mode)
+
+    result = await run_process_pipeline(fields, priority)
+    if cache_mode != "bypass":
+        remember_result(fields, key, fingerprint, result)
+    return result, cache_mode if cache_mode in ("bypass", "refresh") else "miss"
+
+
+@router.get("/metrics", tags=["Health"])
+async def metrics_endpoint():
+    """Prometheus metrics for agent latency, token usage and queue depth."""
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@router.post("/process", tags=["Processing"])
+async def process_content(
+    request: Request,
+    response: Response,
+    x_mcp_secret: str = Header(..., alias="x-mcp-secret"),
+    x_mcp_cache: str = Header("", alias="x-mcp-cache"),
+    x_mcp_similar: str = Header("", alias="x-mcp-similar"),
+    x_mcp_api_key: str = Header("", alias="x-mcp-api-key")
+):
+    """
+    Process content through MCP agents with brand/pillar/platform context.
+    Send `x-mcp-cache: bypass` to skip the response cache or `refresh` to regenerate the entry.
+    Send `Accept: text/event-stream` to receive the same result as Server-Sent Events.
+    Send `x-mcp-similar: off|offer|return` to control near-duplicate reuse for this request.
+    Requests beyond the OpenAI quota get 429 with Retry-After; `x-mcp-api-key` sets the queue priority.
+    """
+    if x_mcp_secret != MCP_SECRET:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    body = await request.json()
+    fields = parse_process_fields(body)
+    similar_mode = similar_mode_for(x_mcp_similar)
+
+    # Sanitize and log
+    log_request("mcp-process", fields["text"])
+
+    if "text/event-stream" in request.headers.get("accept", ""):
+        return await process_event_stream(fields, x_mcp_cache.lower(), similar_mode, priority_for(x_mcp_api_key))
+
+    result, cache_status = await process_with_cache(
+        fields, x_mcp_cache.lower(), similar_mode, priority_for(x_mcp_api_key)
     )
+    response.headers["X-MCP-Cache"] = cache_status
+    return result
 
-    return {
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def stream_process_pipeline(fields: dict):
+    """
+    Streaming counterpart of run_process_pipeline.
+    Yields `safe` deltas as the rewrite is generated, then `formatted`, one `headline`
+    event per headline and a final `done` event carrying the full response body.
+    """
+    prompt_context = build_prompt_context(fields)
+    platform = fields["platform"]
+    agent_kwargs = {
+        "brand": fields["brand"],
+        "pillar": fields["pillar"],
+        "platform": platform,
+        "model": OPENAI_MODEL,
+    }
+    client = get_async_client()
+    headline_queue = asyncio.Queue()
+
+    async def collect_headlines():
+        started = time.perf_counter()
+        try:
+            async for item in headline.generate_variants_stream(prompt_context, client, **agent_kwargs):
+                await headline_queue.put(item)
+        except Exception as e:
+            await headline_queue.put(e)
+        agent_duration("generate_variants", platform).observe_since(started)
+        await headline_queue.put(None)
+
+    # Headlines stream in the background while the rewrite streams to the client
+    headline_task = asyncio.create_task(collect_headlines())
+    try:
+        stream_formatter = formatter.StreamFormatter(platform)
+        safe_parts = []
+        formatted_parts = []
+        format_seconds = 0.0
+        started = time.perf_counter()
+        async for delta in compliance.rewrite_safe_stream(prompt_context, client, **agent_kwargs):
+            safe_parts.append(delta)
+            format_started = time.perf_counter()
+            formatted_parts.append(stream_formatter.feed(delta))
+            format_seconds += time.perf_counter() - format_started
+            yield "safe", {"delta": delta}
+        agent_duration("rewrite_safe", platform).observe_since(started)
+        formatted_parts.append(stream_formatter.close())
+        agent_duration("format_post", platform).observe(format_seconds)
+        safe = "".join(safe_parts)
+        formatted = "".join(formatted_parts)
+        yield "formatted", {"formatted": formatted}
+
+        headlines = []
+        while True:
+            item = await headline_queue.get()
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield "headline", {"index": len(headlines), "headline": item}
+            headlines.append(item)
+    finally:
+        headline_task.cancel()
+
+    yield "done", {
         "safe": safe,
         "formatted": formatted,
         "headlines": headlines,
         "platform": platform,
-        "pillar": pillar,
-        "brand": brand,
-        "brandCompliance": brand_compliance_note,
-        "name": name,
-        "context": context
+        "pillar": fields["pillar"],
+        "brand": fields["brand"],
+        **brand_qa(safe, fields),
+        "name": fields["name"],
+        "context": fields["context"]
+    }
+
+
+def replay_cached_result(result: dict):
+    """Replay a cached /process result as the same event sequence a live stream produces."""
+    yield "safe", {"delta": result["safe"]}
+    yield "formatted", {"formatted": result["formatted"]}
+    for i, item in enumerate(result["headlines"]):
+        yield "headline", {"index": i, "headline": item}
+    yield "done", result
+
+
+async def process_event_stream(
+    fields: dict, cache_mode: str, similar_mode: str = SIMILAR_MODE, priority: int = 0
+) -> StreamingResponse:
+    """Build the text/event-stream response for a /process request."""
+    key = process_cache_key(fields)
+    fingerprint = simhash(fields["text"])
+    cached, cache_status = None, cache_mode if cache_mode in ("bypass", "refresh") else "miss"
+    if cache_mode not in ("bypass", "refresh"):
+        cached = response_cache.get(key)
+        if cached is not None:
+            cached, cache_status = {**cached, "name": fields["name"]}, "hit"
+        elif similar_mode != "off":
+            match = find_similar(fields, key, fingerprint)
+            if match is not None:
+                cached, cache_status = similar_response(fields, match, similar_mode)
+    if cached is None:
+        # Admit before the response starts, so an overload is still a plain 429
+        await admit_process(build_prompt_context(fields), priority)
+
+    async def events():
+        if cache_status == "similar-offer":
+            yield sse_event("similar", cached["similar"])
+            return
+        if cached is not None:
+            for event, data in replay_cached_result(cached):
+                yield sse_event(event, data)
+            return
+        try:
+            async for event, data in stream_process_pipeline(fields):
+                if event == "done" and cache_mode != "bypass":
+                    remember_result(fields, key, fingerprint, data)
+                yield sse_event(event, data)
+        except Exception as e:
+            if is_rate_limit_error(e):
+                logger.warning(f"OpenAI rate limit: {str(e)}")
+                yield sse_event("error", {"detail": "OpenAI rate limit reached", "retryAfter": openai_retry_after(e)})
+                return
+            if isinstance(e, routing.CircuitOpenError):
+                yield sse_event("error", {"detail": f"OpenAI unavailable: {e}", "retryAfter": e.retry_after})
+                return
+            logger.error(f"OpenAI agent error: {str(e)}")
+            yield sse_event("error", {"detail": f"OpenAI agent error: {str(e)}"})
+
+    headers = {
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+        "X-MCP-Cache": cache_status,
+    }
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+
+@router.post("/process/stream", tags=["Processing"])
+async def process_content_stream(
+    request: Request,
+    x_mcp_secret: str = Header(..., alias="x-mcp-secret"),
+    x_mcp_cache: str = Header("", alias="x-mcp-cache"),
+    x_mcp_similar: str = Header("", alias="x-mcp-similar"),
+    x_mcp_api_key: str = Header("", alias="x-mcp-api-key")
+):
+    """Stream /process results as Server-Sent Events."""
+    if x_mcp_secret != MCP_SECRET:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    body = await request.json()
+    fields = parse_process_fields(body)
+    log_request("mcp-process-stream", fields["text"])
+    return await process_event_stream(
+        fields, x_mcp_cache.lower(), similar_mode_for(x_mcp_similar), priority_for(x_mcp_api_key)
+    )
+
+
+def batch_error(error: Exception) -> dict:
+    """Status and message for a failed batch item; unexpected errors are logged and reported as 500."""
+    if isinstance(error, HTTPException):
+        return {"status": error.status_code, "error": error.detail}
+    logger.error(f"Batch item failed: {error}\n{traceback.format_exc()}")
+    return {"status": 500, "error": str(error)}
+
+
+async def stream_batch_results(
+    items: list, concurrency: int, cache_mode: str, similar_mode: str = SIMILAR_MODE, priority: int = 0
+):
+    """
+    Run the /process pipeline over a batch with bounded concurrency (`concurrency` per
+    batch, BATCH_MAX_CONCURRENCY across all batches). A failing item is reported inline.
+    Yields one NDJSON line per input item, in completion order. Items with the same
+    cache key are processed once and reported with `duplicateOf` pointing at the first.
+    """
+    groups = {}  # cache key -> [(index, fields), ...]
+    for index, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise HTTPException(status_code=400, detail="Batch items must be JSON objects")
+            fields = parse_process_fields(item)
+            key = process_cache_key(fields)
+        except Exception as e:
+            yield json.dumps({"index": index, "ok": False, **batch_error(e)}, ensure_ascii=False) + "\n"
+            continue
+        groups.setdefault(key, []).append((index, fields))
+
+    semaphore = asyncio.Semaphore(concurrency)
+    shared = batch_slots()
+
+    async def run_group(members):
+        _, fields = members[0]
+        async with semaphore, shared:
+            try:
+                result, cache_status = await process_with_cache(fields, cache_mode, similar_mode, priority)
+                return members, result, cache_status, None
+            except Exception as e:
+                return members, None, None, batch_error(e)
+
+    tasks = [asyncio.create_task(run_group(members)) for members in groups.values()]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            members, result, cache_status, error = await next_done
+            first_index = members[0][0]
+            for index, fields in members:
+                line = {"index": index}
+                if index != first_index:
+                    line["duplicateOf"] = first_index
+                if error is not None:
+                    line.update({"ok": False, **error})
+                else:
+                    line.update({"ok": True, "cache": cache_status, "result": {**result, "name": fields["name"]}})
+                yield json.dumps(line, ensure_ascii=False) + "\n"
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@router.post("/process/batch", tags=["Processing"])
+async def process_batch(
+    request: Request,
+    x_mcp_secret: str = Header(..., alias="x-mcp-secret"),
+    x_mcp_cache: str = Header("", alias="x-mcp-cache"),
+    x_mcp_similar: str = Header("", alias="x-mcp-similar"),
+    x_mcp_api_key: str = Header("", alias="x-mcp-api-key")
+):
+    """
+    Process a batch of content items; body: {"items": [...], "concurrency": n}.
+    Each item takes the same fields as /process. Results stream back as NDJSON as they complete.
+    """
+    if x_mcp_secret != MCP_SECRET:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    body = await request.json()
+    items = body.get("items") if isinstance(body, dict) else None
+    if not isinstance(items, list) or not items:
+        raise HTTPException(status_code=400, detail="Missing required field: items")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_ITEMS} items")
+    try:
+        concurrency = int(body.get("concurrency", BATCH_CONCURRENCY))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="concurrency must be an integer")
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+
+    log_request("mcp-process-batch", f"{len(items)} items")
+    return StreamingResponse(
+        stream_batch_results(
+            items, concurrency, x_mcp_cache.lower(), similar_mode_for(x_mcp_similar), priority_for(x_mcp_api_key)
+        ),
+        media_type="application/x-ndjson",
+    )
+
+
+# ---------- Asynchronous /process jobs ----------
+
+_job_store = None
+
+
+def get_job_store() -> JobStore:
+    """Return the shared job store, opening it on first use."""
+    global _job_store
+    if _job_store is None:
+        _job_store = JobStore(JOB_DB, ttl=JOB_TTL)
+    return _job_store
+
+
+def close_job_store():
+    global _job_store
+    if _job_store is not None:
+        _job_store.close()
+        _job_store = None
+
+
+def parse_callback_url(body: dict):
+    url = body.get("callbackUrl")
+    if url is None:
+        return None
+    if not isinstance(url, str) or not url.startswith(("http://", "https://")) or not urlparse(url).hostname:
+        raise HTTPException(status_code=400, detail="callbackUrl must be an http(s) URL")
+    return url
+
+
+async def check_callback_host(url: str):
+    """
+    Raise ValueError unless url's host may receive webhooks: one of MCP_JOB_CALLBACK_HOSTS
+    or, without that list, a host whose addresses are all public (no loopback, private,
+    link-local or metadata addresses). Checked on submission and again before delivery,
+    since DNS answers can change in between.
+    """
+    parts = urlparse(url)
+    host = (parts.hostname or "").lower()
+    if JOB_CALLBACK_HOSTS:
+        if host not in JOB_CALLBACK_HOSTS:
+            raise ValueError(f"callbackUrl host {host} is not in MCP_JOB_CALLBACK_HOSTS")
+        return
+    try:
+        addresses = [ipaddress.ip_address(host)]
+    except ValueError:
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, parts.port, type=socket.SOCK_STREAM)
+        except OSError as e:
+            raise ValueError(f"callbackUrl host {host} cannot be resolved: {e}")
+        addresses = [ipaddress.ip_address(info[4][0].split("%")[0]) for info in infos]
+    if not addresses or not all(address.is_global for address in addresses):
+        raise ValueError(f"callbackUrl host {host} is not a public address")
+
+
+async def process_job_request(request: dict):
+    """
+    Run the pipeline for a job. Unlike /process, a 429 from admission control or
+    OpenAI, or a 503 while the model circuit is open, is not returned to anyone,
+    so the job waits out Retry-After and tries again.
+    """
+    fields = request["fields"]
+    while True:
+        try:
+            return await process_with_cache(
+                fields, request["cacheMode"], request["similarMode"], request["priority"]
+            )
+        except HTTPException as e:
+            if e.status_code not in (429, 503):
+                raise
+            retry_after = float((e.headers or {}).get("Retry-After", OPENAI_RETRY_AFTER))
+            logger.info(f"Job waiting {retry_after:.0f}s for OpenAI capacity")
+            await asyncio.sleep(retry_after)
+
+
+def sign_webhook(body: bytes) -> str:
+    return "sha256=" + hmac.new(MCP_SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+
+async def post_webhook(url: str, body: bytes, headers: dict) -> int:
+    import httpx
+
+    async with httpx.AsyncClient(timeout=JOB_WEBHOOK_TIMEOUT) as client:
+        response = await client.post(url, content=body, headers=headers)
+    return response.status_code
+
+
+async def deliver_webhook(url: str, job: dict) -> bool:
+    """
+    POST the finished job to its callbackUrl, retrying with backoff on errors and
+    non-2xx responses. The body is signed with MCP_SECRET in X-MCP-Signature.
+    """
+    body = json.dumps(job, ensure_ascii=False).encode()
+    headers = {"Content-Type": "application/json", "X-MCP-Signature": sign_webhook(body)}
+    try:
+        await check_callback_host(url)
+    except ValueError as e:
+        metrics.JOB_WEBHOOK_FAILURES.inc()
+        logger.error(f"Job {job['id']} webhook not sent: {e}")
+        return False
+    for attempt in range(JOB_WEBHOOK_ATTEMPTS):
+        if attempt:
+            await asyncio.sleep(2 ** (attempt - 1))
+        try:
+            status = await post_webhook(url, body, headers)
+        except Exception as e:
+            logger.warning(f"Job {job['id']} webhook attempt {attempt + 1} failed: {e}")
+            continue
+        if 200 <= status < 300:
+            return True
+        logger.warning(f"Job {job['id']} webhook attempt {attempt + 1} returned {status}")
+    metrics.JOB_WEBHOOK_FAILURES.inc()
+    logger.error(f"Job {job['id']} webhook could not be delivered to {url}")
+    return False
+
+
+# Webhooks for orphaned jobs failed by the sweep; referenced here until they finish
+_sweep_webhooks = set()
+
+
+async def run_job(job_id: str, request: dict, callback_url):
+    """Run one queued job on the executor and record its outcome."""
+    store = get_job_store()
+    if not await asyncio.to_thread(store.transition, job_id, "queued", "running"):
+        return
+    submitted = request["submittedAt"]
+    outcome = {}
+    try:
+        result, cache_status = await asyncio.wait_for(process_job_request(request), timeout=JOB_TIMEOUT)
+        outcome = {"result": result, "cache": cache_status}
+    except asyncio.TimeoutError:
+        outcome = {"error": f"Job timed out after {JOB_TIMEOUT}s", "status_code": 504}
+    except HTTPException as e:
+        outcome = {"error": str(e.detail), "status_code": e.status_code}
+    except asyncio.CancelledError:
+        store.transition(job_id, "running", "error", error=JOB_CANCELLED, status_code=503)
+        raise
+    except Exception as e:
+        logger.error(f"Job {job_id} failed: {e}\n{traceback.format_exc()}")
+        outcome = {"error": str(e), "status_code": 500}
+
+    status = "done" if "result" in outcome else "error"
+    await asyncio.to_thread(store.transition, job_id, "running", status, **outcome)
+    metrics.JOBS_COMPLETED.labels(status).inc()
+    metrics.JOB_DURATION.labels().observe(time.time() - submitted)
+    if callback_url:
+        job = await asyncio.to_thread(store.get, job_id)
+        if job is not None:
+            await deliver_webhook(callback_url, job)
+
+
+async def shutdown_jobs():
+    """Cancel background jobs on shutdown. Running jobs record the cancellation; queued ones are failed here."""
+    not_started = await job_executor.shutdown()
+    if not not_started:
+        return
+    store = get_job_store()
+
+    def fail_queued():
+        for job_id, _, _ in not_started:
+            store.transition(job_id, "queued", "error", error=JOB_CANCELLED, status_code=503)
+
+    await asyncio.to_thread(fail_queued)
+    logger.warning(f"Failed {len(not_started)} queued jobs at shutdown")
+
+
+@router.post("/process/jobs", tags=["Processing"], status_code=202)
+async def create_process_job(
+    request: Request,
+    response: Response,
+    x_mcp_secret: str = Header(..., alias="x-mcp-secret"),
+    x_mcp_cache: str = Header("", alias="x-mcp-cache"),
+    x_mcp_similar: str = Header("", alias="x-mcp-similar"),
+    x_mcp_api_key: str = Header("", alias="x-mcp-api-key")
+):
+    """
+    Start /process as a background job and return its id immediately.
+    Takes the same fields and headers as /process plus an optional `callbackUrl`,
+    which receives the finished job as a signed POST. Poll GET /process/jobs/{id} otherwise.
+    """
+    if x_mcp_secret != MCP_SECRET:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    body = await request.json()
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="Request body must be a JSON object")
+    fields = parse_process_fields(body)
+    callback_url = parse_callback_url(body)
+    if callback_url:
+        try:
+            await check_callback_host(callback_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    if job_executor.full():
+        raise rate_limited("Too many pending jobs", OPENAI_RETRY_AFTER)
+
+    log_request("mcp-process-job", fields["text"])
+    job_request = {
+        "fields": fields,
+        "cacheMode": x_mcp_cache.lower(),
+        "similarMode": similar_mode_for(x_mcp_similar),
+        "priority": priority_for(x_mcp_api_key),
+        "submittedAt": time.time(),
     }
+    store = get_job_store()
+
+    def create():
+        # Sweep expired and orphaned jobs as new ones arrive; both are indexed deletes/updates
+        swept = store.expire(stale_after=JOB_TIMEOUT + 60)
+        return store.create(job_request, callback_url), swept["failed"]
+
+    job, orphaned = await asyncio.to_thread(create)
+    job_executor.submit(run_job, job["id"], job_request, callback_url)
+    for failed in orphaned:
+        if failed.get("callbackUrl"):
+            task = asyncio.create_task(deliver_webhook(failed["callbackUrl"], failed))
+            _sweep_webhooks.add(task)
+            task.add_done_callback(_sweep_webhooks.discard)
+    response.headers["Location"] = f"{request.url.path.rstrip('/')}/{job['id']}"
+    return job
+
+
+@router.get("/process/jobs/{job_id}", tags=["Processing"])
+async def get_process_job(job_id: str, x_mcp_secret: str = Header(..., alias="x-mcp-secret")):
+    """Return a job's status, and its result or error once finished."""
+    if x_mcp_secret != MCP_SECRET:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    job = await asyncio.to_thread(get_job_store().get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+
+@router.get("/cache/stats", tags=["Debug"])
+async def cache_stats(x_mcp_secret: str = Header(..., alias="x-mcp-secret")):
+    """Return /process response cache and near-duplicate index counters."""
+    if x_mcp_secret != MCP_SECRET:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+    return {**response_cache.stats(), "similar": similar_index.stats()}
 
 
 @router.post("/tokens", tags=["Debug"])
@@ -156,6 +982,27 @@ async def token_count(
     return {"tokens": count, "model": model}
 
 
+@router.post("/tokens/batch", tags=["Debug"])
+async def token_count_batch(
+    request: Request,
+    x_mcp_secret: str = Header(..., alias="x-mcp-secret")
+):
+    """Count OpenAI tokens for many strings in one call; body: {"texts": [...], "model": ...}."""
+    if x_mcp_secret != MCP_SECRET:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    body = await request.json()
+    texts = body.get("texts")
+    model = body.get("model", "gpt-4")
+    if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+        raise HTTPException(status_code=400, detail="texts must be a list of strings")
+    if len(texts) > TOKENS_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {TOKENS_BATCH_MAX} texts")
+
+    counts = count_tokens_batch([clean_text(t) for t in texts], model)
+    return {"tokens": counts, "total": sum(counts), "model": model, "exact": get_counter(model).exact}
+
+
 # ---------- Enhancement Automation Section ----------
 
 def validate_enhancement(enh: dict):
@@ -163,119 +1010,276 @@ def validate_enhancement(enh: dict):
     if not enh or not enh.get("summary") or not enh.get("details"):
         raise ValueError("Enhancement request must include 'summary' and 'details'.")
 
-def run_enhancement_agent():
-    """Background task to process queued enhancement requests using OpenAI coding agent and GitHub."""
-    if not os.path.exists(ENH_FILE):
-        with open(ENH_FILE, "w") as f:
-            json.dump([], f)
-    with open(ENH_FILE, "r") as f:
-        queue = json.load(f)
+_enhancement_store = None
 
-    updated = False
 
-    for i, enh in enumerate(queue):
-        if enh.get("status") != "new":
-            continue
-        try:
-            validate_enhancement(enh)
-            summary = enh["summary"]
-            details = enh["details"]
-            ai_prompt = f"""
+def get_enhancement_store() -> EnhancementStore:
+    """Return the shared enhancement queue store, opening it on first use."""
+    global _enhancement_store
+    if _enhancement_store is None:
+        _enhancement_store = EnhancementStore(ENH_DB, legacy_json_path=ENH_FILE)
+    return _enhancement_store
+
+
+def close_enhancement_store():
+    global _enhancement_store
+    if _enhancement_store is not None:
+        _enhancement_store.close()
+        _enhancement_store = None
+
+
+# Queue depth is read from the store at scrape time
+metrics.ENHANCEMENT_QUEUE_DEPTH.callback = lambda: {
+    (status,): n for status, n in get_enhancement_store().counts().items()
+}
+
+
+def build_code_prompt(summary: str, details: str, output: str = "full", context: Optional[Dict[str, str]] = None) -> str:
+    if output == "patch":
+        files_spec = """- files: [{
+    "path": <relative file>,
+    "patch": <unified diff of the file shown below, with 3 lines of context>
+  }]
+  For a small change you may send "edits": [{"search": <exact current lines>, "replace": <new lines>}]
+  instead of "patch", and for a new file "content": <full file content>.
+  Only output changed lines and their context; never repeat unchanged code."""
+    else:
+        files_spec = """- files: [{
+    "path": <relative file>,
+    "content": <full file content to write>
+  }]"""
+    prompt = f"""
 You are the coding agent for MCP-server (Python FastAPI, Docker).
 Enhancement request: {summary}
 Details: {details}
 Provide a JSON object with:
-- files: [{{
-    "path": <relative file>,
-    "content": <full file content to write>
-  }}]
+{files_spec}
 - commit_message: <commit summary>
 - pr_title: <PR title>
 - pr_body: <PR body>
 """
-            ai_response = call_openai_for_code(ai_prompt)
-            files = ai_response["files"]
-            commit_message = ai_response["commit_message"]
-            pr_title = ai_response["pr_title"]
-            pr_body = ai_response["pr_body"]
-
-            # GitHub workflow
-            github.clone_or_pull_repo()
-            branch = github.safe_branch_name(summary)
-            github.create_feature_branch(branch)
-            changed_files = []
-            for file_obj in files:
-                rel = file_obj["path"]
-                content = file_obj["content"]
-                abs_path = github.file_write(rel, content)
-                changed_files.append(abs_path)
-            github.commit_and_push(changed_files, branch, commit_message)
-            pr_url = github.create_pull_request(branch, pr_title, pr_body)
-
-            enh["status"] = "pr-submitted"
-            enh["pr_url"] = pr_url
-            updated = True
-            logger.info(f"Enhancement '{summary}' submitted as PR: {pr_url}")
+    if context:
+        prompt += "Current files:\n" + "".join(
+            f"\n### {path}\n```\n{content}\n```\n" for path, content in context.items()
+        )
+    return prompt
+
+
+def repo_reader():
+    """(list_files, read_file) for the configured commit backend."""
+    if COMMIT_BACKEND == "api":
+        return github.list_files_via_api, github.read_file_via_api
+    return github.list_files, github.read_file
+
+
+def collect_code_context(enh: dict, branch: str) -> Dict[str, str]:
+    """
+    Current content of the files an enhancement names, so the agent can patch
+    them: paths listed in enh["files"] or mentioned in the summary/details (by
+    full path, or by a file name unique in the repo), up to CODE_CONTEXT_BYTES.
+    """
+    list_files, read_file = repo_reader()
+    paths = list_files(branch)
+    words = {w.rstrip(".") for w in re.findall(r"[\w./-]+", f"{enh['summary']} {enh['details']}")}
+    by_name = {}
+    for path in paths:
+        by_name.setdefault(os.path.basename(path), []).append(path)
+    wanted = [p for p in enh.get("files") or [] if isinstance(p, str)]
+    wanted += [p for p in paths if p in words]
+    wanted += [matches[0] for name, matches in by_name.items() if len(matches) == 1 and "." in name and name in words]
+
+    context, size = {}, 0
+    for path in dict.fromkeys(wanted):
+        try:
+            # The size is checked before the blob is read; binary files fail to decode
+            content = read_file(path, branch, max_bytes=CODE_CONTEXT_BYTES - size)
+        except ValueError as e:
+            logger.info(f"Leaving {path} out of the code context: {e}")
+            continue
+        if content is None:
+            continue
+        context[path] = content
+        size += len(content.encode("utf-8"))
+    return context
+
+
+def materialize_patches(ai_response: dict, branch: str) -> dict:
+    """Apply patch/edits entries to the current files; raises PatchError if any does not apply."""
+    _, read_file = repo_reader()
+
+    def read_current(path):
+        try:
+            return read_file(path, branch)
+        except ValueError as e:  # not UTF-8 text
+            raise PatchError(f"Cannot patch {path}: {e}")
+
+    files = resolve_files(ai_response.get("files"), read_current)
+    return {**ai_response, "files": files}
+
+
+def enhancement_branch(enh: dict) -> str:
+    """Branch (and worktree) for an enhancement, unique per queue item so parallel workers never share one."""
+    return github.safe_branch_name(enh["summary"], enh.get("id"))
+
+
+def check_deadline(deadline: Optional[float], step: str):
+    """Raise TimeoutError once an enhancement's deadline (time.monotonic) has passed."""
+    if deadline is not None and time.monotonic() >= deadline:
+        raise TimeoutError(f"Enhancement deadline passed before {step}")
+
+
+def publish_enhancement(branch: str, ai_response: dict, deadline: Optional[float] = None) -> str:
+    """
+    Commit generated files to branch with the configured backend and open a PR; returns the PR URL.
+    The deadline is checked before pushing and before opening the PR, since a thread cannot be cancelled.
+    """
+    files = ai_response["files"]
+    commit_message = ai_response["commit_message"]
+    pr_title = ai_response["pr_title"]
+    pr_body = ai_response["pr_body"]
+
+    if COMMIT_BACKEND == "api":
+        # Clone-free: blobs, tree, commit and ref update through the Git Data API
+        check_deadline(deadline, "commit")
+        github.commit_via_api(branch, [(f["path"], f["content"]) for f in files], commit_message)
+        check_deadline(deadline, "opening the PR")
+        return github.create_pull_request(branch, pr_title, pr_body)
+
+    # GitHub workflow, isolated in a per-branch worktree
+    worktree = github.add_worktree(branch)
+    try:
+        changed_files = []
+        for file_obj in files:
+            rel = file_obj["path"]
+            content = file_obj["content"]
+            abs_path = github.file_write(rel, content, repo_path=worktree)
+            changed_files.append(abs_path)
+        check_deadline(deadline, "push")
+        github.commit_and_push(changed_files, branch, commit_message, repo_path=worktree)
+    finally:
+        github.remove_worktree(worktree)
+    check_deadline(deadline, "opening the PR")
+    return github.create_pull_request(branch, pr_title, pr_body)
+
+
+async def generate_enhancement(enh: dict, branch: str, deadline: float) -> dict:
+    """
+    Ask the coding agent for an enhancement's files.
+    In patch mode the agent sees the files it is asked to change and returns diffs,
+    which are applied here; if any does not apply, the agent is asked again for full files.
+    """
+    summary = enh["summary"]
+    timeout = max(1, int(deadline - time.monotonic()))
+    if CODE_OUTPUT == "full":
+        return await call_openai_for_code(build_code_prompt(summary, enh["details"]), timeout=timeout)
+
+    context = await asyncio.to_thread(collect_code_context, enh, branch)
+    prompt = build_code_prompt(summary, enh["details"], "patch", context)
+    ai_response = await call_openai_for_code(prompt, timeout=timeout)
+    try:
+        ai_response = await asyncio.to_thread(materialize_patches, ai_response, branch)
+        metrics.CODE_PATCH_RESULTS.labels("applied").inc()
+    except PatchError as e:
+        metrics.CODE_PATCH_RESULTS.labels("fallback").inc()
+        logger.warning(f"Patch for '{summary}' does not apply ({e}); requesting full files")
+        prompt = build_code_prompt(summary, enh["details"], "full", context)
+        remaining = max(1, int(deadline - time.monotonic()))
+        ai_response = await call_openai_for_code(prompt, timeout=remaining)
+    return ai_response
+
+
+async def process_enhancement(enh: dict, timeout: int = ENH_TIMEOUT) -> str:
+    """
+    Generate code for one enhancement and publish it as a PR, within timeout seconds.
+    Raises a TimeoutError (asyncio's or the builtin) when the deadline passes.
+    """
+    validate_enhancement(enh)
+    deadline = time.monotonic() + timeout
+    branch = enhancement_branch(enh)
+    ai_response = await asyncio.wait_for(generate_enhancement(enh, branch, deadline), timeout=timeout)
+    # Publishing is not wrapped in wait_for: cancelling would not stop the thread, which could
+    # still push and open a PR after the item was marked as timed out. It checks the deadline itself.
+    return await asyncio.to_thread(publish_enhancement, branch, ai_response, deadline)
+
+
+async def enhancement_worker(store: EnhancementStore, worker_id: int):
+    """Claim and process queued enhancements until the queue is empty."""
+    while True:
+        # Claiming is atomic, so concurrent workers never pick up the same item
+        enh = await asyncio.to_thread(store.claim_next, "new", "in-progress")
+        if enh is None:
+            return
+        summary = enh.get("summary")
+        try:
+            pr_url = await process_enhancement(enh, ENH_TIMEOUT)
+        except (asyncio.TimeoutError, TimeoutError) as e:
+            error = str(e) or f"Enhancement timed out after {ENH_TIMEOUT}s"
         except Exception as e:
-            enh["status"] = "error"
-            enh["error"] = str(e) + "\n" + traceback.format_exc()
-            updated = True
-            logger.error(f"Enhancement processing error: {str(e)}")
+            error = str(e) + "\n" + traceback.format_exc()
+        else:
+            await asyncio.to_thread(store.transition, enh["id"], "in-progress", "pr-submitted", pr_url)
+            logger.info(f"[worker {worker_id}] Enhancement '{summary}' submitted as PR: {pr_url}")
+            continue
+        await asyncio.to_thread(store.transition, enh["id"], "in-progress", "error", None, error)
+        logger.error(f"[worker {worker_id}] Enhancement processing error: {error.splitlines()[0]}")
+
+
+async def run_enhancement_agent():
+    """Background task to process queued enhancement requests using OpenAI coding agent and GitHub."""
+    store = await asyncio.to_thread(get_enhancement_store)
+    requeued = await asyncio.to_thread(store.requeue_stale, "in-progress", older_than=ENH_STALE_AFTER)
+    if requeued:
+        logger.warning(f"Requeued {requeued} stale in-progress enhancements")
+    counts = await asyncio.to_thread(store.counts)
+    if not counts.get("new"):
+        return
+
+    if COMMIT_BACKEND == "git":
+        # Refresh the shared mirror once per cycle; workers branch off it via worktrees
+        await asyncio.to_thread(github.clone_or_pull_repo)
+    await asyncio.gather(*(enhancement_worker(store, n) for n in range(ENH_WORKERS)))
+
 
-    # Persist updated queue
-    if updated:
-        with open(ENH_FILE, "w") as f:
-            json.dump(queue, f, indent=2)
+CODE_AGENT_INSTRUCTIONS = (
+    "You are an expert Python/DevOps/Automation agent. "
+    "Your reply MUST be a single valid JSON block with the keys: files, commit_message, pr_title, pr_body. "
+    "If you output code, always use triple backticks with correct syntax highlighting. "
+    "No markdown or prose outside the code block."
+)
 
 
-def call_openai_for_code(prompt: str) -> dict:
+async def call_openai_for_code(prompt: str, timeout: int = 120) -> dict:
     """
     Calls an OpenAI Assistant (with Code Interpreter enabled) to generate code enhancements.
     Expects the Assistant to output a single JSON object with the required structure.
     """
     try:
-        code_client = OpenAI(api_key=OPENAI_API_KEY)
-        thread = code_client.beta.threads.create()
-        code_client.beta.threads.messages.create(
-            thread_id=thread.id,
-            role="user",
-            content=prompt
+        result = await assistant.run_assistant(
+            get_async_client(),
+            OPENAI_ASSISTANT_ID,
+            prompt,
+            CODE_AGENT_INSTRUCTIONS,
+            timeout=timeout,
+            stream=ASSISTANT_STREAMING,
         )
-        run = code_client.beta.threads.runs.create(
-            thread_id=thread.id,
-            assistant_id=OPENAI_ASSISTANT_ID,
-            instructions=(
-                "You are an expert Python/DevOps/Automation agent. "
-                "Your reply MUST be a single valid JSON block with the keys: files, commit_message, pr_title, pr_body. "
-                "If you output code, always use triple backticks with correct syntax highlighting. "
-                "No markdown or prose outside the code block."
-            )
+        logger.info(
+            f"OpenAI run {result['run_id']} {result['status']} in {result['latency']:.1f}s "
+            f"({result['polls']} polls)"
         )
-        # Wait for completion
-        timeout = 120
-        elapsed = 0
-        while run.status not in ("completed", "failed", "cancelled"):
-            time.sleep(2)
-            elapsed += 2
-            if elapsed > timeout:
-                raise RuntimeError("OpenAI run timed out")
-            run = code_client.beta.threads.runs.retrieve(thread_id=thread.id, run_id=run.id)
-
-        if run.status != "completed":
-            raise RuntimeError(f"OpenAI run failed: {run.status}")
-
-        messages = code_client.beta.threads.messages.list(thread_id=thread.id)
-        for msg in reversed(messages.data):
-            for c in msg.content:
-                if c.type == "text":
-                    content = c.text.value.strip()
-                    if content.startswith("```json"):
-                        content = content.replace("```json", "").replace("```", "").strip()
-                    try:
-                        return json.loads(content)
-                    except Exception as e:
-                        logger.error(f"OpenAI Assistant output parse error: {e} - Content: {content}")
-                        continue
+        metrics.ASSISTANT_RUN_DURATION.labels(result["status"]).set(result["latency"])
+        metrics.ASSISTANT_RUN_LATENCY.labels(result["status"]).observe(result["latency"])
+        if result["status"] != "completed":
+            raise RuntimeError(f"OpenAI run failed: {result['status']}")
+
+        for content in result["messages"]:
+            content = content.strip()
+            if content.startswith("```json"):
+                content = content.replace("```json", "").replace("```", "").strip()
+            try:
+                return json.loads(content)
+            except Exception as e:
+                logger.error(f"OpenAI Assistant output parse error: {e} - Content: {content}")
+                continue
         raise RuntimeError("No valid JSON response from OpenAI Assistant.")
 
     except Exception as e:
@@ -308,26 +1312,85 @@ async def add_enhancement(
         validate_enhancement(enh)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Enhancement validation failed: {str(e)}")
-    enh["status"] = "new"
-    # Ensure file exists and is list
-    if not os.path.exists(ENH_FILE):
-        with open(ENH_FILE, "w") as f:
-            json.dump([], f)
-    with open(ENH_FILE, "r+") as f:
-        queue = json.load(f)
-        queue.append(enh)
-        f.seek(0)
-        json.dump(queue, f, indent=2)
-        f.truncate()
+    store = await asyncio.to_thread(get_enhancement_store)
+    queued = await asyncio.to_thread(store.enqueue, enh)
     logger.info(f"Enhancement queued: {enh['summary']}")
-    return {"ok": True, "msg": "Enhancement queued"}
+    return {"ok": True, "msg": "Enhancement queued", "id": queued["id"]}
+
+def encode_cursor(enh_id: int) -> str:
+    return base64.urlsafe_b64encode(str(enh_id).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        return int(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag."""
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in (tag.removeprefix("W/") for tag in tags)
+
+
+def page_etag(query: list, versions: list) -> str:
+    """Weak ETag for a page: the query plus the (id, updated_at) of the rows it covers."""
+    return f'W/"{hashlib.sha1(json.dumps([query, versions]).encode()).hexdigest()}"'
+
+
+def page_headers(request: Request, etag: str, versions: list, limit: Optional[int]) -> dict:
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if limit is not None and len(versions) > limit:
+        next_cursor = encode_cursor(versions[limit - 1][0])
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    return headers
+
 
 @router.get("/enhancements", tags=["Enhancement Automation"])
-async def list_enhancements(x_mcp_secret: str = Header(..., alias="x-mcp-secret")):
-    """List all enhancement requests and statuses."""
+async def list_enhancements(
+    request: Request,
+    status: str = "",
+    cursor: str = "",
+    limit: Optional[int] = None,
+    order: str = "asc",
+    fields: str = "",
+    x_mcp_secret: str = Header(..., alias="x-mcp-secret"),
+    if_none_match: str = Header("", alias="if-none-match")
+):
+    """
+    List enhancement requests in id order (`order=desc` for newest first). Without `limit`
+    or `cursor` every matching item is returned, as before pagination was added; with
+    either, one page of `limit` items (default MCP_ENH_PAGE_SIZE) is returned and the next
+    page's `cursor` is in the X-Next-Cursor and Link headers. Filter with `status`; pick
+    fields with `fields=summary,status` (id is always returned, and error tracebacks are
+    only read when `error` is asked for). Responses carry an ETag, and an unchanged list
+    returns 304 to If-None-Match, so polling costs one small indexed query.
+    """
     if x_mcp_secret != MCP_SECRET:
         raise HTTPException(status_code=401, detail="Unauthorized")
-    if not os.path.exists(ENH_FILE):
-        return []
-    with open(ENH_FILE, "r") as f:
-        return json.load(f)
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+    if limit is not None or cursor:
+        limit = max(1, min(limit or ENH_PAGE_SIZE, ENH_PAGE_MAX))
+    after = decode_cursor(cursor) if cursor else None
+    descending = order == "desc"
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    query = [status, after, limit, order, selected]
+    store = get_enhancement_store()
+
+    if if_none_match:
+        # Revalidate against ids and update times only, without reading payloads or tracebacks
+        versions = await asyncio.to_thread(store.page_versions, status or None, after, limit, descending)
+        etag = page_etag(query, versions)
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=page_headers(request, etag, versions, limit))
+
+    with_error = not selected or "error" in selected
+    # The ETag is derived from the rows actually returned, read in the same query as the body
+    items, versions = await asyncio.to_thread(store.read_page, status or None, after, limit, descending, with_error)
+    if selected:
+        items = [{"id": enh["id"], **{f: enh[f] for f in selected if f in enh}} for enh in items]
+    return JSONResponse(items, headers=page_headers(request, page_etag(query, versions), versions, limit))
+
@@ -1,4 +1,4 @@
 # Import necessary utilities to expose them through the utils package
-from app.utils.text import clean_text
+from app.utils.text import clean_text, estimate_tokens, log_request
 
-__all__ = ['clean_text']
+__all__ = ['clean_text', 'estimate_tokens', 'log_request']
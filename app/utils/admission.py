@@ -0,0 +1,175 @@
+# app/utils/admission.py
+
+import time
+import heapq
+import asyncio
+import itertools
+from typing import Optional
+
+
+class AdmissionRejected(Exception):
+    """The request cannot be admitted in time; retry_after is a suggested wait in seconds."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"{reason}; retry after {retry_after:.1f}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Classic token bucket: holds up to `capacity`, refilled at `rate` per second."""
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.level = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (0 if it is available now)."""
+        self._refill(now)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount: float, now: float):
+        self._refill(now)
+        self.level -= amount
+
+    def drain(self, now: float):
+        self._refill(now)
+        self.level = min(self.level, 0.0)
+
+
+class AdmissionController:
+    """
+    Token-aware admission control in front of OpenAI calls.
+
+    Two token buckets track the requests-per-minute and tokens-per-minute quotas.
+    A request that fits is admitted immediately; otherwise it waits in a bounded
+    priority queue (higher priority first, FIFO within a priority) and is admitted
+    as the buckets refill. Requests are rejected up front, without waiting, when
+    the queue is full or the projected wait exceeds max_wait, so callers get a
+    fast 429 instead of a slow timeout. A limit of 0 disables that bucket.
+    """
+
+    def __init__(self, rpm: float = 0, tpm: float = 0, max_queue: int = 100, max_wait: float = 30.0):
+        self.requests = TokenBucket(rpm, rpm / 60.0) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm, tpm / 60.0) if tpm > 0 else None
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._waiters = []  # heap of (-priority, seq, calls, cost, future)
+        self._queued_calls = 0
+        self._queued_cost = 0
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def _clamp(self, calls, cost):
+        # A single request larger than a whole bucket could never be admitted
+        if self.requests is not None:
+            calls = min(calls, self.requests.capacity)
+        if self.tokens is not None:
+            cost = min(cost, self.tokens.capacity)
+        return calls, cost
+
+    def _wait_time(self, calls, cost, now) -> float:
+        wait = 0.0
+        if self.requests is not None:
+            wait = max(wait, self.requests.wait_time(calls, now))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(cost, now))
+        return wait
+
+    def _take(self, calls, cost, now):
+        if self.requests is not None:
+            self.requests.take(calls, now)
+        if self.tokens is not None:
+            self.tokens.take(cost, now)
+
+    def pause(self, seconds: float):
+        """Empty the buckets after an upstream 429 so queued work waits for the quota to recover."""
+        now = time.monotonic()
+        for bucket in (self.requests, self.tokens):
+            if bucket is not None:
+                bucket.drain(now)
+                bucket.level -= seconds * bucket.rate
+
+    async def acquire(self, cost: int, calls: int = 1, priority: int = 0):
+        """
+        Wait until `calls` OpenAI requests costing `cost` tokens in total may be sent.
+        Raises AdmissionRejected if that cannot happen within max_wait.
+        """
+        if not self.enabled:
+            return
+        calls, cost = self._clamp(calls, cost)
+        now = time.monotonic()
+        if not self._waiters and self._wait_time(calls, cost, now) == 0:
+            self._take(calls, cost, now)
+            self.admitted += 1
+            return
+
+        # Everything already queued is served first (at equal or higher priority)
+        projected = self._wait_time(self._queued_calls + calls, self._queued_cost + cost, now)
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise AdmissionRejected("admission queue full", max(projected, 1.0))
+        if projected > self.max_wait:
+            self.rejected += 1
+            raise AdmissionRejected("projected wait exceeds limit", projected)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (-priority, next(self._seq), calls, cost, future))
+        self._queued_calls += calls
+        self._queued_cost += cost
+        self._ensure_dispatcher()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if not future.done():
+                future.cancel()
+            raise
+        self.admitted += 1
+
+    def _ensure_dispatcher(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        self._wakeup.set()
+
+    async def _dispatch(self):
+        while self._waiters:
+            _, _, calls, cost, future = self._waiters[0]
+            if future.done():
+                self._pop()
+                continue
+            now = time.monotonic()
+            wait = self._wait_time(calls, cost, now)
+            if wait == 0:
+                self._take(calls, cost, now)
+                self._pop()
+                future.set_result(None)
+                continue
+            # Sleep until the head fits, or until a higher-priority request arrives
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+            except asyncio.TimeoutError:
+                pass
+
+    def _pop(self):
+        _, _, calls, cost, _ = heapq.heappop(self._waiters)
+        self._queued_calls -= calls
+        self._queued_cost -= cost
@@ -0,0 +1,246 @@
+# app/utils/brand_scan.py
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from typing import Optional
+
+logger = logging.getLogger("mcp")
+
+# JSON file of per-brand dictionaries:
+# {"<brand>": {"required": [...], "banned": [...], "minRequired": 1, "wholeWords": true}, "*": {...}}
+# "*" applies to brands without an entry of their own. Terms match whole words
+# unless "wholeWords" is false, which matches them anywhere (so "risk" also counts "risks").
+BRAND_TERMS_PATH = os.getenv("MCP_BRAND_TERMS", "")
+# How often (seconds) the terms file is checked for changes
+BRAND_TERMS_CHECK_INTERVAL = float(os.getenv("MCP_BRAND_TERMS_CHECK_INTERVAL", "2"))
+
+DEFAULT_BRAND = "Ethical AI Insider"
+DEFAULT_TERMS = {
+    "required": ["ethical AI", "compliance", "risk", "governance", "AI Insider", "tech leader", "startup founder"],
+    "banned": [],
+    "minRequired": 1,
+    # Substring matching, as the original `term in text` check did: plurals and inflections count
+    "wholeWords": False,
+}
+
+
+def _fold(text: str) -> str:
+    """Lowercase text without changing its length, so match offsets index the original."""
+    folded = text.lower()
+    if len(folded) == len(text):
+        return folded
+    return "".join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+
+def _is_word_char(c: str) -> bool:
+    return c.isalnum() or c == "_"
+
+
+class TermAutomaton:
+    """
+    Aho-Corasick automaton over a fixed set of case-insensitive terms.
+
+    Built once per dictionary; scan() walks the text a single time, so its cost
+    is linear in the text length plus the number of matches, however many terms
+    there are. With whole_words, matches must start and end on word boundaries;
+    otherwise every substring occurrence counts.
+    """
+
+    def __init__(self, terms, whole_words: bool = True):
+        self.whole_words = whole_words
+        self.terms = []  # term id -> (term, kind)
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [None]  # node -> term id ending here
+        self._out_link = [0]  # node -> nearest suffix node with output (0 = none)
+        for term, kind in terms:
+            self._add(term, kind)
+        self._build_links()
+
+    def _add(self, term: str, kind: str):
+        key = _fold(term.strip())
+        if not key:
+            return
+        node = 0
+        for c in key:
+            nxt = self._goto[node].get(c)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][c] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(None)
+                self._out_link.append(0)
+            node = nxt
+        if self._out[node] is None:
+            self._out[node] = len(self.terms)
+            self.terms.append((term.strip(), kind))
+
+    def _build_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for c, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and c not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(c, 0)
+                self._fail[child] = target if target != child else 0
+                link = self._fail[child]
+                self._out_link[child] = link if self._out[link] is not None else self._out_link[link]
+
+    def scan(self, text: str):
+        """Yield (term id, start, end) for every (whole-word) occurrence in text."""
+        folded = _fold(text)
+        goto, fail, out, out_link, terms = self._goto, self._fail, self._out, self._out_link, self.terms
+        node = 0
+        n = len(folded)
+        whole_words = self.whole_words
+        for i, c in enumerate(folded):
+            while node and c not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(c, 0)
+            hit = node if out[node] is not None else out_link[node]
+            while hit:
+                term_id = out[hit]
+                end = i + 1
+                start = end - len(terms[term_id][0])
+                if not whole_words or (
+                    (start == 0 or not _is_word_char(folded[start - 1]))
+                    and (end == n or not _is_word_char(folded[end]))
+                ):
+                    yield term_id, start, end
+                hit = out_link[hit]
+
+
+class BrandScanner:
+    """Required/banned term scanner for one brand."""
+
+    def __init__(self, required=(), banned=(), min_required=1, whole_words=True):
+        self.min_required = max(0, int(min_required))
+        self.automaton = TermAutomaton(
+            [(t, "required") for t in required] + [(t, "banned") for t in banned], bool(whole_words)
+        )
+
+    def scan(self, text: str) -> dict:
+        """
+        Find all required and banned terms in one pass.
+
+        Returns match spans, per-term counts, the required terms not found, a
+        score in [0, 1] (share of minRequired distinct required terms found, 0 if
+        any banned term appears) and an overall compliant flag.
+        """
+        counts = {"required": {}, "banned": {}}
+        matches = []
+        for term_id, start, end in self.automaton.scan(text):
+            term, kind = self.automaton.terms[term_id]
+            counts[kind][term] = counts[kind].get(term, 0) + 1
+            matches.append({"term": term, "kind": kind, "start": start, "end": end})
+        found = len(counts["required"])
+        coverage = min(1.0, found / self.min_required) if self.min_required else 1.0
+        banned = bool(counts["banned"])
+        return {
+            "compliant": found >= self.min_required and not banned,
+            "score": 0.0 if banned else round(coverage, 3),
+            "required": counts["required"],
+            "banned": counts["banned"],
+            "missingRequired": [t for t, kind in self.automaton.terms
+                                if kind == "required" and t not in counts["required"]],
+            "matches": matches,
+        }
+
+
+class BrandTermRegistry:
+    """
+    Per-brand scanners compiled from the MCP_BRAND_TERMS file.
+
+    The file is re-read when its mtime changes (checked at most every
+    check_interval seconds), so dictionaries can be edited without a restart.
+    A file that fails to load keeps the previous dictionaries in place.
+    """
+
+    def __init__(self, path: str = "", check_interval: float = BRAND_TERMS_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._config = {}
+        self._mtime = None
+        self._checked_at = 0.0
+        self._scanners = {}
+        self._lock = threading.Lock()
+
+    def _maybe_reload(self):
+        now = time.monotonic()
+        if not self.path or now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                config = json.load(f)
+            if not isinstance(config, dict):
+                raise ValueError("brand terms file must be a JSON object")
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to load brand terms from {self.path}: {e}")
+            self._mtime = mtime
+            return
+        self._config = config
+        self._mtime = mtime
+        self._scanners = {}
+        logger.info(f"Loaded brand terms for {len(config)} brand(s) from {self.path}")
+
+    def get(self, brand: str) -> BrandScanner:
+        with self._lock:
+            self._maybe_reload()
+            # Cache by the dictionary entry used, not the client-supplied brand, so the cache stays
+            # bounded by the config file (None is the built-in default)
+            entry = brand if self._config.get(brand) else "*" if self._config.get("*") else None
+            scanner = self._scanners.get(entry)
+            if scanner is None:
+                terms = self._config[entry] if entry is not None else DEFAULT_TERMS
+                scanner = BrandScanner(
+                    terms.get("required", ()), terms.get("banned", ()), terms.get("minRequired", 1),
+                    terms.get("wholeWords", True),
+                )
+                self._scanners[entry] = scanner
+            return scanner
+
+    def configured(self, brand: str) -> bool:
+        """Whether brand has a dictionary entry of its own in the terms file."""
+        with self._lock:
+            self._maybe_reload()
+            return brand != "*" and bool(self._config.get(brand))
+
+
+_registry: Optional[BrandTermRegistry] = None
+
+
+def get_registry() -> BrandTermRegistry:
+    global _registry
+    if _registry is None:
+        _registry = BrandTermRegistry(BRAND_TERMS_PATH)
+    return _registry
+
+
+def scan_brand(text: str, brand: str) -> dict:
+    """Scan text against the brand's required and banned terms."""
+    return get_registry().get(brand).scan(text)
+
+
+def metric_brand(brand) -> str:
+    """
+    Brand as a metrics label. Brands come from free-text request fields, so only
+    the default and configured brands keep their name; anything else is "other".
+    """
+    if isinstance(brand, str) and (brand == DEFAULT_BRAND or get_registry().configured(brand)):
+        return brand
+    return "other"
@@ -1,21 +1,49 @@
 # app/utils/github.py
 
 import os
+import time
 import tempfile
 import shutil
-from github import Github, GithubException
-from git import Repo, InvalidGitRepositoryError, GitCommandError  # pip install gitpython
+import threading
+import sys
+import importlib
 import logging
 
+# gitpython (pip install gitpython) and PyGithub (pip install PyGithub) are imported on
+# first use (see _sdk); together they add about 0.3s to import time, which every worker
+# fork and test run would pay
+_SDK_NAMES = {
+    "Repo": "git", "InvalidGitRepositoryError": "git", "GitCommandError": "git",
+    "Auth": "github", "Github": "github", "GithubException": "github", "InputGitTreeElement": "github",
+}
+
 # --- CONFIGURATION ---
 
 # Environment variables (required)
 GITHUB_TOKEN = os.getenv("BOT_GH_TOKEN")   # GitHub PAT with repo permissions
 GITHUB_USER = os.getenv("BOT_GH_USER")     # GitHub bot username (not required for all API calls)
 GITHUB_REPO = os.getenv("BOT_GH_REPO")     # Format: mikeholownych/mcp-server
+GITHUB_POOL_SIZE = int(os.getenv("MCP_GITHUB_POOL_SIZE", "10"))
+
+REPO_URL = os.getenv("MCP_REPO_URL") or f"https://github.com/{GITHUB_REPO or 'mikeholownych/mcp-server'}.git"
+BASE_BRANCH = os.getenv("MCP_BASE_BRANCH", "main")
+
+# Long-lived bare mirror; kept across restarts and refreshed with incremental fetches
+CLONE_PATH = os.getenv("MCP_CLONE_PATH") or os.path.expanduser("~/.cache/mcp/mirror.git")
+
+# Optional partial (e.g. "blob:none") or shallow clone of the mirror
+CLONE_FILTER = os.getenv("MCP_GIT_FILTER") or None
+CLONE_DEPTH = int(os.getenv("MCP_GIT_DEPTH", "0")) or None
+
+# Minimum seconds between fetches, however often clone_or_pull_repo is called
+FETCH_INTERVAL = float(os.getenv("MCP_GIT_FETCH_INTERVAL", "30"))
+_last_fetch = 0.0
+
+# Per-branch worktrees share the mirror's object store
+WORKTREE_ROOT = os.getenv("MCP_WORKTREE_ROOT") or os.path.join(tempfile.gettempdir(), "mcp-worktrees")
 
-# Use a temp dir for thread/process safety
-CLONE_PATH = os.getenv("MCP_CLONE_PATH") or tempfile.mkdtemp(prefix="mcp-git-")
+# Serializes operations that touch the shared clone's refs and worktree metadata
+_git_lock = threading.Lock()
 
 # Logging setup
 logger = logging.getLogger("mcp-github")
@@ -25,6 +53,22 @@ if not logger.hasHandlers():
 
 # --- UTILITY FUNCTIONS ---
 
+def __getattr__(name):
+    """Resolve github.Repo, github.GithubException etc. from their SDK on first access."""
+    module = _SDK_NAMES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(module), name)
+
+def _sdk(name):
+    """An SDK name as seen from outside the module, so attributes set on it (e.g. by tests) win."""
+    return getattr(sys.modules[__name__], name)
+
+def _load_sdk():
+    """Import gitpython and PyGithub ahead of first use (see main.prewarm)."""
+    for module in set(_SDK_NAMES.values()):
+        importlib.import_module(module)
+
 def _check_env():
     for k, v in [
         ("BOT_GH_TOKEN", GITHUB_TOKEN),
@@ -33,28 +77,58 @@ def _check_env():
         if not v:
             raise EnvironmentError(f"Required env var {k} is missing!")
 
-def clone_or_pull_repo():
-    # Use your actual values
-    REPO_URL = "https://github.com/mikeholownych/mcp-server.git"
-    CLONE_PATH = "/tmp/mcp-git-fkp_6mw6"
+def _clone_mirror():
+    start = time.monotonic()
+    options = {"bare": True}
+    if CLONE_FILTER:
+        options["filter"] = CLONE_FILTER
+    if CLONE_DEPTH:
+        options["depth"] = CLONE_DEPTH
+        options["no_single_branch"] = True
+    repo = _sdk("Repo").clone_from(REPO_URL, CLONE_PATH, **options)
+    # Track remote branches under origin/* so fetches never touch local branches
+    repo.git.config("remote.origin.fetch", "+refs/heads/*:refs/remotes/origin/*")
+    _fetch(repo)
+    logger.info(f"Cloned mirror of {REPO_URL} into {CLONE_PATH} in {time.monotonic() - start:.2f}s")
+    return repo
 
-    # If path exists but is not a repo, delete it first (optional safety)
-    if os.path.exists(CLONE_PATH):
-        try:
-            _ = Repo(CLONE_PATH)
-        except InvalidGitRepositoryError:
-            import shutil
-            shutil.rmtree(CLONE_PATH)
-            # Re-clone below
-
-    if not os.path.exists(CLONE_PATH):
-        Repo.clone_from(REPO_URL, CLONE_PATH)
-    else:
-        # Already a valid repo, pull
-        repo = Repo(CLONE_PATH)
-        repo.remotes.origin.pull()
+def _fetch(repo):
+    global _last_fetch
+    start = time.monotonic()
+    args = ["origin", "--prune"]
+    if CLONE_DEPTH:
+        args.append(f"--depth={CLONE_DEPTH}")
+    repo.git.fetch(*args)
+    _last_fetch = time.monotonic()
+    logger.info(f"Fetched {REPO_URL} in {_last_fetch - start:.2f}s")
+
+def clone_or_pull_repo(force=False):
+    """
+    Make sure the bare mirror at CLONE_PATH exists and is up to date.
+    The first call clones; later calls do an incremental fetch, at most once per FETCH_INTERVAL.
+    """
+    with _git_lock:
+        # If path exists but is not a repo, delete it first (optional safety)
+        if os.path.exists(CLONE_PATH):
+            try:
+                repo = _sdk("Repo")(CLONE_PATH)
+            except _sdk("InvalidGitRepositoryError"):
+                shutil.rmtree(CLONE_PATH)
+                repo = None
+        else:
+            repo = None
+
+        if repo is None:
+            os.makedirs(os.path.dirname(CLONE_PATH) or ".", exist_ok=True)
+            return _clone_mirror()
+        if force or time.monotonic() - _last_fetch >= FETCH_INTERVAL:
+            _fetch(repo)
+        else:
+            logger.info("Mirror fetched recently; skipping fetch")
+        repo.git.worktree("prune")
+        return repo
 
-def safe_branch_name(summary):
+def safe_branch_name(summary, unique=None):
     # Lowercase, dash, 32 chars for slug, and "feature/" prefix
     slug = (
         summary.lower()
@@ -63,29 +137,101 @@ def safe_branch_name(summary):
         .replace("/", "-")
         .replace(".", "-")
     )
-    return f"feature/{slug[:32]}"
+    # Summaries sharing their first 32 characters would otherwise share a branch and worktree
+    suffix = f"-{unique}" if unique is not None else ""
+    return f"feature/{slug[:32]}{suffix}"
+
+def _ref_exists(repo, ref):
+    try:
+        repo.git.rev_parse("--verify", "--quiet", ref)
+        return True
+    except _sdk("GitCommandError"):
+        return False
 
 def create_feature_branch(branch):
-    repo = Repo(CLONE_PATH)
-    branch_names = [h.name for h in repo.heads]
-    if branch in branch_names:
-        logger.info(f"Checking out existing branch {branch}")
-        repo.git.checkout(branch)
+    """
+    Point branch at its remote tip (or at BASE_BRANCH for a new branch) in the mirror.
+    No checkout and no download: the commit is already in the mirror's object store.
+    """
+    repo = _sdk("Repo")(CLONE_PATH)
+    remote_ref = f"refs/remotes/origin/{branch}"
+    if _ref_exists(repo, remote_ref):
+        logger.info(f"Resetting branch {branch} to origin/{branch}")
+        start_point = remote_ref
     else:
-        logger.info(f"Creating and checking out branch {branch}")
-        repo.git.checkout("HEAD", b=branch)
+        logger.info(f"Creating branch {branch} from origin/{BASE_BRANCH}")
+        start_point = f"refs/remotes/origin/{BASE_BRANCH}"
+    repo.git.branch("--force", "--no-track", branch, start_point)
+
+def _source_ref(repo, branch):
+    """The commit a branch's worktree will start from: its remote tip, or BASE_BRANCH (see create_feature_branch)."""
+    remote_ref = f"refs/remotes/origin/{branch}"
+    if branch and _ref_exists(repo, remote_ref):
+        return remote_ref
+    return f"refs/remotes/origin/{BASE_BRANCH}"
+
+def list_files(branch=None):
+    """Paths of all files in the mirror at the commit branch is based on."""
+    repo = _sdk("Repo")(CLONE_PATH)
+    tree = repo.commit(_source_ref(repo, branch)).tree
+    return [item.path for item in tree.traverse() if item.type == "blob"]
+
+def _check_size(rel_path, size, max_bytes):
+    if max_bytes is not None and size > max_bytes:
+        raise ValueError(f"{rel_path} is {size} bytes, over the {max_bytes} byte limit")
+
+def read_file(rel_path, branch=None, max_bytes=None):
+    """
+    Content of rel_path in the mirror at the commit branch is based on, or None if it does not exist.
+    Raises ValueError for files over max_bytes (checked before reading) or that are not UTF-8 text.
+    """
+    repo = _sdk("Repo")(CLONE_PATH)
+    try:
+        blob = repo.commit(_source_ref(repo, branch)).tree / rel_path
+    except KeyError:
+        return None
+    _check_size(rel_path, blob.size, max_bytes)
+    return blob.data_stream.read().decode("utf-8")
+
+def add_worktree(branch):
+    """
+    Check out branch in its own worktree under WORKTREE_ROOT and return the path.
+    Workers each get a separate working copy, so concurrent checkouts never conflict.
+    """
+    path = os.path.join(WORKTREE_ROOT, branch.replace("/", "-"))
+    with _git_lock:
+        repo = _sdk("Repo")(CLONE_PATH)
+        if os.path.exists(path):
+            repo.git.worktree("remove", "--force", path)
+        repo.git.worktree("prune")
+        os.makedirs(WORKTREE_ROOT, exist_ok=True)
+        create_feature_branch(branch)
+        logger.info(f"Adding worktree for branch {branch} at {path}")
+        repo.git.worktree("add", path, branch)
+    return path
 
-def file_write(rel_path, content):
-    abs_path = os.path.join(CLONE_PATH, rel_path)
+def remove_worktree(path):
+    with _git_lock:
+        repo = _sdk("Repo")(CLONE_PATH)
+        try:
+            repo.git.worktree("remove", "--force", path)
+        except _sdk("GitCommandError") as e:
+            logger.warning(f"Worktree removal failed for {path}: {e}")
+            shutil.rmtree(path, ignore_errors=True)
+            repo.git.worktree("prune")
+
+def file_write(rel_path, content, repo_path=None):
+    abs_path = os.path.join(repo_path or CLONE_PATH, rel_path)
     os.makedirs(os.path.dirname(abs_path), exist_ok=True)
     with open(abs_path, "w", encoding="utf-8") as f:
         f.write(content)
     logger.info(f"Wrote file: {rel_path}")
     return abs_path
 
-def commit_and_push(files, branch, message):
-    repo = Repo(CLONE_PATH)
-    rel_files = [os.path.relpath(f, CLONE_PATH) for f in files]
+def commit_and_push(files, branch, message, repo_path=None):
+    repo_path = repo_path or CLONE_PATH
+    repo = _sdk("Repo")(repo_path)
+    rel_files = [os.path.relpath(f, repo_path) for f in files]
     repo.index.add(rel_files)
     # Only commit if there are changes
     if repo.is_dirty(untracked_files=True):
@@ -93,27 +239,114 @@ def commit_and_push(files, branch, message):
         repo.index.commit(message)
         try:
             repo.git.push('--set-upstream', 'origin', branch)
-        except GitCommandError as e:
+        except _sdk("GitCommandError") as e:
             logger.error(f"Push failed: {e}")
             raise
     else:
         logger.info("No changes to commit.")
 
-def create_pull_request(branch, title, body):
+_client = None
+_repo = None
+_repo_lock = threading.Lock()
+
+def get_github_repo():
+    """Return the shared PyGithub repository handle (one client and connection pool per process)."""
+    global _client, _repo
     _check_env()
-    g = Github(GITHUB_TOKEN)
-    repo = g.get_repo(GITHUB_REPO)
+    with _repo_lock:
+        if _repo is None:
+            _client = _sdk("Github")(auth=_sdk("Auth").Token(GITHUB_TOKEN), pool_size=GITHUB_POOL_SIZE)
+            _repo = _client.get_repo(GITHUB_REPO)
+        return _repo
+
+def close_github_client():
+    """Close the shared PyGithub client's connection pool; the next get_github_repo reopens it."""
+    global _client, _repo
+    with _repo_lock:
+        if _client is not None:
+            _client.close()
+        _client = _repo = None
+
+def commit_via_api(branch, files, message):
+    """
+    Commit files straight through the Git Data API, with no local checkout.
+    files is a list of (path, content) pairs. Blob contents are sent inline in the
+    tree request, then a commit is created and the branch ref moved (or created from
+    BASE_BRANCH). Returns the new head commit SHA.
+    """
+    repo = get_github_repo()
+    try:
+        branch_ref = repo.get_git_ref(f"heads/{branch}")
+        parent_sha = branch_ref.object.sha
+    except _sdk("GithubException") as e:
+        if e.status != 404:
+            raise
+        branch_ref = None
+        parent_sha = repo.get_git_ref(f"heads/{BASE_BRANCH}").object.sha
+    parent = repo.get_git_commit(parent_sha)
+
+    elements = [
+        _sdk("InputGitTreeElement")(path=path, mode="100644", type="blob", content=content)
+        for path, content in files
+    ]
+    tree = repo.create_git_tree(elements, base_tree=parent.tree)
+    if tree.sha == parent.tree.sha:
+        logger.info("No changes to commit.")
+        return parent_sha
+
+    commit = repo.create_git_commit(message, tree, [parent])
+    if branch_ref is None:
+        logger.info(f"Creating branch {branch} at {commit.sha} via API")
+        repo.create_git_ref(f"refs/heads/{branch}", commit.sha)
+    else:
+        logger.info(f"Moving branch {branch} to {commit.sha} via API")
+        branch_ref.edit(commit.sha)
+    return commit.sha
+
+def _api_source_ref(repo, branch):
+    """The ref commit_via_api will build on: branch if it exists, else BASE_BRANCH."""
+    if branch:
+        try:
+            repo.get_git_ref(f"heads/{branch}")
+            return branch
+        except _sdk("GithubException") as e:
+            if e.status != 404:
+                raise
+    return BASE_BRANCH
+
+def list_files_via_api(branch=None):
+    """Paths of all files at the ref branch is based on, from one recursive tree request."""
+    repo = get_github_repo()
+    tree = repo.get_git_tree(_api_source_ref(repo, branch), recursive=True)
+    return [item.path for item in tree.tree if item.type == "blob"]
+
+def read_file_via_api(rel_path, branch=None, max_bytes=None):
+    """Content of rel_path at the ref branch is based on, or None if it does not exist (see read_file)."""
+    repo = get_github_repo()
+    try:
+        contents = repo.get_contents(rel_path, ref=_api_source_ref(repo, branch))
+    except _sdk("GithubException") as e:
+        if e.status == 404:
+            return None
+        raise
+    if isinstance(contents, list):
+        return None  # a directory
+    _check_size(rel_path, contents.size, max_bytes)
+    return contents.decoded_content.decode("utf-8")
+
+def create_pull_request(branch, title, body):
+    repo = get_github_repo()
     # Try to create a PR; if it already exists, return its URL
     try:
         pr = repo.create_pull(
             title=title,
             body=body,
             head=branch,
-            base="main"
+            base=BASE_BRANCH
         )
         logger.info(f"PR created: {pr.html_url}")
         return pr.html_url
-    except GithubException as e:
+    except _sdk("GithubException") as e:
         # If PR already exists, try to fetch it
         logger.warning(f"Exception on PR creation: {e}")
         pulls = repo.get_pulls(state='open', head=f"{branch}")
@@ -124,10 +357,8 @@ def create_pull_request(branch, title, body):
         raise
 
 def cleanup():
+    """Remove the mirror and all worktrees; the next cycle starts from a fresh clone."""
     if os.path.exists(CLONE_PATH):
         logger.info(f"Cleaning up repo at {CLONE_PATH}")
         shutil.rmtree(CLONE_PATH)
-
-# --- Optional: run cleanup at process exit ---
-import atexit
-atexit.register(cleanup)
+    shutil.rmtree(WORKTREE_ROOT, ignore_errors=True)
@@ -0,0 +1,191 @@
+# app/utils/job_store.py
+
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+from typing import Dict, Optional
+
+from app.utils.sqlite_store import SQLiteConnections
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    request TEXT NOT NULL,
+    callback_url TEXT,
+    result TEXT,
+    cache TEXT,
+    error TEXT,
+    status_code INTEGER,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_expires ON jobs (expires_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, updated_at);
+"""
+
+class JobStore:
+    """
+    SQLite-backed state for asynchronous /process jobs.
+
+    Uses the same WAL, connection-per-thread setup as EnhancementStore so every
+    worker process can answer polls for jobs started by another. Jobs move
+    queued -> running -> done or error with compare-and-set updates. Each status
+    change pushes expires_at to ttl seconds later; expired jobs are invisible
+    and removed by expire().
+    """
+
+    def __init__(self, path: str, ttl: float = 86400):
+        self.path = path
+        self.ttl = ttl
+        self._db = SQLiteConnections(path)
+        self._conn().executescript(SCHEMA)
+
+    def close(self):
+        """Close the connections of all threads; the store reconnects on next use."""
+        self._db.close()
+
+    def _conn(self) -> sqlite3.Connection:
+        return self._db.get()
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        job = {
+            "id": row["id"],
+            "status": row["status"],
+            "createdAt": row["created_at"],
+            "updatedAt": row["updated_at"],
+            "expiresAt": row["expires_at"],
+        }
+        if row["callback_url"] is not None:
+            job["callbackUrl"] = row["callback_url"]
+        if row["result"] is not None:
+            job["result"] = json.loads(row["result"])
+            job["cache"] = row["cache"]
+        if row["error"] is not None:
+            job["error"] = row["error"]
+            job["statusCode"] = row["status_code"]
+        return job
+
+    def create(self, request: dict, callback_url: Optional[str] = None) -> dict:
+        """Store a queued job for `request` and return its public view."""
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        self._conn().execute(
+            "INSERT INTO jobs (id, status, request, callback_url, created_at, updated_at, expires_at) "
+            "VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+            (job_id, json.dumps(request), callback_url, now, now, now + self.ttl),
+        )
+        job = {"id": job_id, "status": "queued", "createdAt": now, "updatedAt": now, "expiresAt": now + self.ttl}
+        if callback_url is not None:
+            job["callbackUrl"] = callback_url
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        row = self._conn().execute(
+            "SELECT * FROM jobs WHERE id = ? AND expires_at > ?", (job_id, time.time())
+        ).fetchone()
+        return self._to_dict(row) if row else None
+
+    def transition(self, job_id: str, from_status: str, to_status: str, result: Optional[dict] = None,
+                   cache: Optional[str] = None, error: Optional[str] = None,
+                   status_code: Optional[int] = None) -> bool:
+        """Compare-and-set status change; returns False if the job was not in from_status."""
+        now = time.time()
+        cur = self._conn().execute(
+            "UPDATE jobs SET status = ?, result = ?, cache = ?, error = ?, status_code = ?, "
+            "updated_at = ?, expires_at = ? WHERE id = ? AND status = ?",
+            (to_status, json.dumps(result) if result is not None else None, cache, error, status_code,
+             now, now + self.ttl, job_id, from_status),
+        )
+        return cur.rowcount == 1
+
+    def expire(self, stale_after: float) -> dict:
+        """
+        Delete expired jobs and fail jobs left running for longer than stale_after
+        (their worker crashed or was restarted). Queued jobs are left alone: they may
+        be waiting for an executor slot, and a job's own timeout only starts once it
+        runs. Returns the number purged and the public view of each job failed.
+        """
+        now = time.time()
+        conn = self._conn()
+        purged = conn.execute("DELETE FROM jobs WHERE expires_at <= ?", (now,)).rowcount
+        stale = conn.execute(
+            "SELECT id FROM jobs WHERE status = 'running' AND updated_at < ?", (now - stale_after,)
+        ).fetchall()
+        failed = []
+        for row in stale:
+            if self.transition(row["id"], "running", "error",
+                               error="Job was interrupted before it finished", status_code=500):
+                failed.append(self.get(row["id"]))
+        return {"purged": purged, "failed": [job for job in failed if job is not None]}
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._conn().execute(
+            "SELECT status, COUNT(*) AS n FROM jobs WHERE expires_at > ? GROUP BY status", (time.time(),)
+        ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+class JobExecutor:
+    """
+    Runs job coroutines as background tasks, at most `concurrency` at a time.
+    Tasks beyond that wait for a slot; submit() refuses work once max_pending
+    jobs are waiting or running, so a latency spike cannot grow the backlog
+    without bound.
+    """
+
+    def __init__(self, concurrency: int = 4, max_pending: int = 1000):
+        self.concurrency = concurrency
+        self.max_pending = max_pending
+        self._tasks = set()
+        self._queued = {}  # task -> args, until the task gets a slot
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._tasks)
+
+    def full(self) -> bool:
+        return self.pending >= self.max_pending
+
+    def submit(self, coro_fn, *args) -> asyncio.Task:
+        """Schedule coro_fn(*args) to run once a slot is free."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Tasks and semaphores belong to one event loop (tests start several)
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._tasks = set()
+            self._queued = {}
+        task = loop.create_task(self._run(coro_fn, *args))
+        self._tasks.add(task)
+        self._queued[task] = args
+        task.add_done_callback(self._forget)
+        return task
+
+    def _forget(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        self._queued.pop(task, None)
+
+    async def _run(self, coro_fn, *args):
+        async with self._semaphore:
+            self._queued.pop(asyncio.current_task(), None)
+            await coro_fn(*args)
+
+    async def shutdown(self) -> list:
+        """
+        Cancel outstanding jobs and wait for them to record their state. Returns
+        the arguments of jobs cancelled before they started, which never ran and
+        so could not record anything themselves.
+        """
+        tasks = list(self._tasks)
+        not_started = list(self._queued.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return not_started
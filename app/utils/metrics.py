@@ -0,0 +1,253 @@
+# app/utils/metrics.py
+
+import time
+import threading
+from bisect import bisect_left
+
+# Latency buckets (seconds) spanning in-process work up to long GPT-4 generations
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """
+    Base for labelled metrics. Each label combination gets one child object,
+    created once and then looked up from a dict, so the hot path is a dict
+    lookup plus an uncontended per-child lock.
+    """
+
+    type_name = ""
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def collect(self):
+        """Return (name, labels, value) samples."""
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        for name, labels, value in self.collect():
+            lines.append(f"{name}{labels} {value}")
+        return "\n".join(lines)
+
+
+class _Value:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount=1.0):
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = float(value)
+
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1.0):
+        self.labels().inc(amount)
+
+    def collect(self):
+        return [(self.name, _format_labels(self.labelnames, k), c.value) for k, c in list(self._children.items())]
+
+
+class Gauge(_Metric):
+    """Gauge; optionally backed by a callback returning {label tuple: value} at scrape time."""
+
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, callback=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.callback = callback
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value):
+        self.labels().set(value)
+
+    def collect(self):
+        if self.callback is not None:
+            try:
+                values = self.callback()
+            except Exception:
+                values = {}
+            return [(self.name, _format_labels(self.labelnames, k), v) for k, v in values.items()]
+        return [(self.name, _format_labels(self.labelnames, k), c.value) for k, c in list(self._children.items())]
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count", "lock")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def observe_since(self, started):
+        """Observe the seconds elapsed since a time.perf_counter() start."""
+        self.observe(time.perf_counter() - started)
+
+
+class Histogram(_Metric):
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def collect(self):
+        samples = []
+        for key, child in list(self._children.items()):
+            with child.lock:
+                counts = list(child.counts)
+                total, count = child.sum, child.count
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                labels = _format_labels(self.labelnames, key, f'le="{le}"')
+                samples.append((f"{self.name}_bucket", labels, cumulative))
+            labels = _format_labels(self.labelnames, key)
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self._metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ---- MCP metrics ----
+
+AGENT_DURATION = Histogram(
+    "mcp_agent_duration_seconds", "Duration of agent steps in /process.", ("agent", "platform")
+)
+OPENAI_REQUEST_DURATION = Histogram(
+    "mcp_openai_request_duration_seconds", "Latency of OpenAI chat completion requests.", ("model", "mode")
+)
+OPENAI_TOKENS = Counter(
+    "mcp_openai_tokens_total", "OpenAI tokens used.", ("type", "brand", "platform", "model")
+)
+OPENAI_ERRORS = Counter(
+    "mcp_openai_errors_total", "Failed OpenAI requests.", ("brand", "platform", "model")
+)
+OPENAI_HEDGES = Counter(
+    "mcp_openai_hedged_requests_total", "Duplicate OpenAI requests sent after the hedge delay.", ("model",)
+)
+OPENAI_FALLBACKS = Counter(
+    "mcp_openai_fallbacks_total", "Agent calls moved to the fallback model.", ("model", "fallback")
+)
+OPENAI_CIRCUIT_OPEN = Gauge(
+    "mcp_openai_circuit_open", "1 while a model's circuit breaker is failing calls fast.", ("model",)
+)
+FUSED_FALLBACKS = Counter(
+    "mcp_fused_fallbacks_total", "Fused agent responses rejected in favour of separate calls."
+)
+ADMISSION_WAIT = Histogram(
+    "mcp_admission_wait_seconds", "Time /process requests waited for OpenAI quota."
+)
+ADMISSION_REJECTED = Counter(
+    "mcp_admission_rejected_total", "Requests rejected with 429 before reaching OpenAI.", ("reason",)
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "mcp_admission_queue_depth", "Requests waiting for OpenAI quota."
+)
+JOBS_COMPLETED = Counter(
+    "mcp_jobs_completed_total", "Asynchronous /process jobs finished, by final status.", ("status",)
+)
+JOB_DURATION = Histogram(
+    "mcp_job_duration_seconds", "Time from job submission to completion."
+)
+JOBS_PENDING = Gauge(
+    "mcp_jobs_pending", "Asynchronous /process jobs waiting or running in this process."
+)
+JOB_WEBHOOK_FAILURES = Counter(
+    "mcp_job_webhook_failures_total", "Job webhook callbacks that could not be delivered."
+)
+ASSISTANT_RUN_DURATION = Gauge(
+    "mcp_assistant_run_duration_seconds", "Duration of the most recent coding Assistant run.", ("status",)
+)
+ASSISTANT_RUN_LATENCY = Histogram(
+    "mcp_assistant_run_latency_seconds", "Coding Assistant run latency.", ("status",),
+    buckets=(1, 5, 10, 20, 30, 60, 120, 300, 600),
+)
+CODE_PATCH_RESULTS = Counter(
+    "mcp_code_patch_results_total", "Coding agent patch responses, by whether they applied or fell back to full files.",
+    ("result",)
+)
+ENHANCEMENT_QUEUE_DEPTH = Gauge(
+    "mcp_enhancement_queue_depth", "Enhancement requests by status.", ("status",)
+)
+
+
+def record_usage(usage, model, brand, platform):
+    """Count prompt/completion tokens from an OpenAI usage object (may be None)."""
+    if usage is None:
+        return
+    OPENAI_TOKENS.labels("prompt", brand, platform, model).inc(usage.prompt_tokens or 0)
+    OPENAI_TOKENS.labels("completion", brand, platform, model).inc(usage.completion_tokens or 0)
@@ -0,0 +1,53 @@
+# app/utils/openai_client.py
+
+import os
+import sys
+import threading
+
+# Connection pool sizing for the shared client
+MAX_CONNECTIONS = int(os.getenv("MCP_OPENAI_MAX_CONNECTIONS", "20"))
+MAX_KEEPALIVE = int(os.getenv("MCP_OPENAI_MAX_KEEPALIVE", "10"))
+REQUEST_TIMEOUT = float(os.getenv("MCP_OPENAI_TIMEOUT", "120"))
+
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def get_async_client():
+    """
+    Return the process-wide AsyncOpenAI client.
+    All agent calls share one pooled keep-alive HTTP connection pool.
+    The openai SDK is imported here rather than at module load, since it dominates import time.
+    """
+    global _async_client
+    with _client_lock:
+        if _async_client is None:
+            import httpx
+            from openai import AsyncOpenAI
+
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE,
+                ),
+                timeout=REQUEST_TIMEOUT,
+            )
+            _async_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client)
+        return _async_client
+
+
+async def close_async_client():
+    """Close the shared client's connection pool; the next get_async_client creates a new one."""
+    global _async_client
+    with _client_lock:
+        client, _async_client = _async_client, None
+    if client is not None:
+        await client.close()
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True for OpenAI 429 errors; never imports the SDK just to check."""
+    if "openai" not in sys.modules:
+        return False
+    from openai import RateLimitError
+    return isinstance(error, RateLimitError)
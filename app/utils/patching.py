@@ -0,0 +1,290 @@
+# app/utils/patching.py
+
+import re
+import difflib
+from typing import Callable, List, Optional
+
+HUNK_HEADER_RE = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+SEARCH_RE = re.compile(r"^<{5,9} ?SEARCH\s*$")
+DIVIDER_RE = re.compile(r"^={5,9}\s*$")
+REPLACE_RE = re.compile(r"^>{5,9} ?REPLACE\s*$")
+
+FUZZ_CONTEXT = 2  # context lines a diff hunk may lose at each end and still apply, as in `patch -F2`
+MIN_SIMILARITY = 0.85  # SequenceMatcher ratio for the last-resort fuzzy match
+
+
+class PatchError(ValueError):
+    """A patch could not be parsed or does not apply to the current file."""
+
+
+class Hunk:
+    """
+    One edit: replace the `before` lines with the `after` lines. Diff hunks also
+    carry the old start line (a hint for where to look) and how many unchanged
+    context lines lead and trail the change.
+    """
+
+    def __init__(self, before: List[str], after: List[str], line: Optional[int] = None,
+                 lead: int = 0, trail: int = 0):
+        self.before = before
+        self.after = after
+        self.line = line
+        self.lead = lead
+        self.trail = trail
+
+    def trimmed(self, fuzz: int) -> "Hunk":
+        """The hunk with up to `fuzz` context lines dropped from each end."""
+        lead, trail = min(fuzz, self.lead), min(fuzz, self.trail)
+        line = self.line + lead if self.line else self.line
+        return Hunk(
+            self.before[lead:len(self.before) - trail], self.after[lead:len(self.after) - trail],
+            line, self.lead - lead, self.trail - trail,
+        )
+
+
+def _split(text: str) -> List[str]:
+    return text.splitlines()
+
+
+def parse_unified_diff(diff: str) -> List[Hunk]:
+    """
+    Parse the hunks of a unified diff for one file. Line counts in the @@
+    headers are not trusted (models often get them wrong): a hunk runs until
+    the next header. A blank line inside a hunk is taken as blank context.
+    """
+    hunks = []
+    lines = diff.splitlines()
+    current = None
+    in_change = False
+    for i, line in enumerate(lines):
+        match = HUNK_HEADER_RE.match(line)
+        if match:
+            current = Hunk([], [], int(match.group(1)))
+            hunks.append(current)
+            in_change = False
+            continue
+        if line.startswith("diff --git") or (
+            line.startswith("--- ") and i + 1 < len(lines) and lines[i + 1].startswith("+++ ")
+        ):
+            current = None
+            continue
+        if current is None or line.startswith("\\"):
+            continue
+        if line.startswith("-"):
+            current.before.append(line[1:])
+            in_change, current.trail = True, 0
+        elif line.startswith("+"):
+            current.after.append(line[1:])
+            in_change, current.trail = True, 0
+        else:
+            text = line[1:] if line.startswith(" ") else line
+            current.before.append(text)
+            current.after.append(text)
+            if in_change:
+                current.trail += 1
+            else:
+                current.lead += 1
+    if not hunks:
+        raise PatchError("No @@ hunks found in diff")
+    return hunks
+
+
+def parse_search_replace(text: str) -> List[Hunk]:
+    """Parse <<<<<<< SEARCH / ======= / >>>>>>> REPLACE blocks."""
+    hunks = []
+    state, before, after = None, [], []
+    for line in text.splitlines():
+        if state is None and SEARCH_RE.match(line):
+            state, before, after = "search", [], []
+        elif state == "search" and DIVIDER_RE.match(line):
+            state = "replace"
+        elif state == "replace" and REPLACE_RE.match(line):
+            hunks.append(Hunk(before, after))
+            state = None
+        elif state == "search":
+            before.append(line)
+        elif state == "replace":
+            after.append(line)
+    if state is not None:
+        raise PatchError("Unterminated SEARCH/REPLACE block")
+    if not hunks:
+        raise PatchError("No SEARCH/REPLACE blocks found")
+    return hunks
+
+
+def parse_patch(text: str) -> List[Hunk]:
+    """Parse either a unified diff or SEARCH/REPLACE blocks."""
+    if any(SEARCH_RE.match(line) for line in text.splitlines()):
+        return parse_search_replace(text)
+    return parse_unified_diff(text)
+
+
+def _nearest(positions: List[int], hint: Optional[int]) -> int:
+    if len(positions) > 1 and hint is None:
+        raise PatchError(f"Edit matches {len(positions)} places in the file; add more context")
+    return min(positions, key=lambda p: abs(p - hint)) if hint is not None else positions[0]
+
+
+def _find(lines: List[str], before: List[str], hint: Optional[int], normalize) -> Optional[int]:
+    target = [normalize(line) for line in before]
+    n = len(target)
+    positions = [
+        i for i in range(len(lines) - n + 1)
+        if normalize(lines[i]) == target[0] and [normalize(line) for line in lines[i:i + n]] == target
+    ]
+    return _nearest(positions, hint) if positions else None
+
+
+def _find_similar(lines: List[str], before: List[str], hint: Optional[int]) -> Optional[int]:
+    """Best window whose text is at least MIN_SIMILARITY similar to `before`."""
+    n = len(before)
+    wanted = "\n".join(line.strip() for line in before)
+    best_ratio, positions = 0.0, []
+    matcher = difflib.SequenceMatcher(None, b=wanted, autojunk=False)
+    for i in range(len(lines) - n + 1):
+        matcher.set_seq1("\n".join(line.strip() for line in lines[i:i + n]))
+        if matcher.real_quick_ratio() < MIN_SIMILARITY or matcher.quick_ratio() < MIN_SIMILARITY:
+            continue
+        ratio = matcher.ratio()
+        if ratio > best_ratio + 1e-9:
+            best_ratio, positions = ratio, [i]
+        elif abs(ratio - best_ratio) <= 1e-9:
+            positions.append(i)
+    if best_ratio < MIN_SIMILARITY:
+        return None
+    return _nearest(positions, hint)
+
+
+def _find_core(lines: List[str], hunk: Hunk, core: Hunk, hint: Optional[int]) -> Optional[int]:
+    """Where the hunk's changed lines occur; several matches are ranked by how well the context fits."""
+    normalize = str.rstrip
+    n = len(core.before)
+    target = [normalize(line) for line in core.before]
+    positions = [i for i in range(len(lines) - n + 1) if [normalize(line) for line in lines[i:i + n]] == target]
+    if len(positions) <= 1:
+        return positions[0] if positions else None
+    lead = hunk.lead
+    wanted = "\n".join(line.strip() for line in hunk.before)
+    scores = {}
+    for i in positions:
+        window = lines[max(0, i - lead):i + n + hunk.trail]
+        scores[i] = difflib.SequenceMatcher(None, "\n".join(line.strip() for line in window), wanted).ratio()
+    best = max(scores.values())
+    core_hint = hint + lead if hint is not None else None
+    return _nearest([i for i, score in scores.items() if score == best], core_hint)
+
+
+def _locate(lines: List[str], hunk: Hunk, hint: Optional[int]):
+    """Return (start, hunk as matched) for where the hunk applies, trying progressively looser matches."""
+    tried = set()
+    for fuzz in range(FUZZ_CONTEXT + 1):
+        candidate = hunk.trimmed(fuzz)
+        if (candidate.lead, candidate.trail) in tried or not candidate.before:
+            continue  # no more context to drop, or nothing left to anchor on
+        tried.add((candidate.lead, candidate.trail))
+        shifted = hint + (candidate.line - hunk.line) if hint is not None and hunk.line else hint
+        for normalize in (lambda s: s, lambda s: s.rstrip(), lambda s: " ".join(s.split())):
+            start = _find(lines, candidate.before, shifted, normalize)
+            if start is not None:
+                return start, candidate
+    if hunk.lead or hunk.trail:
+        core = hunk.trimmed(max(hunk.lead, hunk.trail))
+        if core.before:
+            # Context drifted beyond the fuzz limit: anchor on the lines being replaced
+            start = _find_core(lines, hunk, core, hint)
+            if start is not None:
+                return start, core
+            # Never replace lines that differ from the ones the diff removes
+            raise PatchError(f"Edit does not apply; lines to replace not found: {core.before[0].strip()[:80]!r}")
+    if hunk.before:
+        start = _find_similar(lines, hunk.before, hint)
+        if start is not None:
+            return start, hunk
+    preview = hunk.before[0].strip() if hunk.before else ""
+    raise PatchError(f"Edit does not apply; context not found near: {preview[:80]!r}")
+
+
+def apply_hunks(original: str, hunks: List[Hunk]) -> str:
+    """Apply hunks in order, keeping the file's line endings and final newline."""
+    newline = "\r\n" if "\r\n" in original else "\n"
+    lines = original.splitlines()
+    final_newline = original.endswith(("\n", "\r")) or not original
+    offset = 0
+    for hunk in hunks:
+        hint = hunk.line - 1 + offset if hunk.line else None
+        if not hunk.before:
+            # Pure insertion: only possible at a known line, or into an empty file. A -U0 hunk's
+            # old start is the line to insert after (0 for the top of the file).
+            if hunk.line is None and lines:
+                raise PatchError("Insertion without context or line number")
+            start = max(0, min(len(lines), (hunk.line or 0) + offset))
+            lines[start:start] = hunk.after
+            offset += len(hunk.after)
+            continue
+        start, matched = _locate(lines, hunk, hint)
+        lines[start:start + len(matched.before)] = matched.after
+        offset += len(matched.after) - len(matched.before)
+    text = newline.join(lines)
+    return text + newline if lines and final_newline else text
+
+
+def apply_patch(original: Optional[str], patch: str) -> str:
+    """Apply a unified diff or SEARCH/REPLACE blocks to original (None for a new file)."""
+    hunks = parse_patch(patch)
+    if original is None:
+        if any(h.before for h in hunks):
+            raise PatchError("Patch edits a file that does not exist")
+        original = ""
+    return apply_hunks(original, hunks)
+
+
+def apply_edits(original: Optional[str], edits: List[dict]) -> str:
+    """Apply [{"search": ..., "replace": ...}] edits to original."""
+    if not isinstance(edits, list) or not edits:
+        raise PatchError("edits must be a non-empty list")
+    try:
+        hunks = [Hunk(_split(e["search"]), _split(e["replace"])) for e in edits]
+    except (KeyError, TypeError, AttributeError):
+        raise PatchError("Each edit needs string 'search' and 'replace' fields")
+    if original is None:
+        if any(h.before for h in hunks):
+            raise PatchError("Edits target a file that does not exist")
+        original = ""
+    return apply_hunks(original, hunks)
+
+
+def resolve_files(files: List[dict], read_file: Callable[[str], Optional[str]]) -> List[dict]:
+    """
+    Turn agent file entries into [{"path", "content"}]. Entries may carry the
+    full "content", a "patch" (unified diff or SEARCH/REPLACE blocks) or a
+    list of search/replace "edits"; the latter two are applied to the current
+    file from read_file(path). Raises PatchError naming the first file that
+    does not apply.
+    """
+    if not isinstance(files, list):
+        raise PatchError("files must be a list")
+    resolved = []
+    for entry in files:
+        if not isinstance(entry, dict):
+            raise PatchError(f"File entries must be objects, not {type(entry).__name__}")
+        path = entry.get("path")
+        if not path or not isinstance(path, str):
+            raise PatchError("File entry without a path")
+        if "content" in entry:
+            if not isinstance(entry["content"], str):
+                raise PatchError(f"{path}: content must be a string")
+            resolved.append({"path": path, "content": entry["content"]})
+            continue
+        try:
+            if "patch" in entry:
+                if not isinstance(entry["patch"], str):
+                    raise PatchError("patch must be a string")
+                content = apply_patch(read_file(path), entry["patch"])
+            elif "edits" in entry:
+                content = apply_edits(read_file(path), entry["edits"])
+            else:
+                raise PatchError("File entry needs content, patch or edits")
+        except PatchError as e:
+            raise PatchError(f"{path}: {e}")
+        resolved.append({"path": path, "content": content})
+    return resolved
@@ -0,0 +1,204 @@
+# app/utils/queue_store.py
+
+import os
+import json
+import time
+import sqlite3
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from app.utils.sqlite_store import SQLiteConnections
+
+logger = logging.getLogger("mcp")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS enhancements (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    status TEXT NOT NULL,
+    data TEXT NOT NULL,
+    pr_url TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_enhancements_status ON enhancements (status, id);
+"""
+
+
+class EnhancementStore:
+    """
+    SQLite-backed enhancement queue.
+
+    The database runs in WAL mode so the API and the background agent can read
+    and write concurrently. Enqueue is a single indexed INSERT, and status
+    changes are compare-and-set UPDATEs, so two workers can never claim the
+    same item and no writer overwrites another's changes.
+    """
+
+    def __init__(self, path: str, legacy_json_path: Optional[str] = None):
+        self.path = path
+        self._db = SQLiteConnections(path, pragmas=("journal_mode=WAL", "synchronous=FULL", "busy_timeout=30000"))
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        if legacy_json_path:
+            self._import_legacy_json(legacy_json_path)
+
+    def close(self):
+        """Close the connections of all threads; the store reconnects on next use."""
+        self._db.close()
+
+    def _conn(self) -> sqlite3.Connection:
+        return self._db.get()
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> dict:
+        enh = json.loads(row["data"])
+        enh["id"] = row["id"]
+        enh["status"] = row["status"]
+        if row["pr_url"] is not None:
+            enh["pr_url"] = row["pr_url"]
+        if row["error"] is not None:
+            enh["error"] = row["error"]
+        return enh
+
+    def enqueue(self, enh: dict, status: str = "new") -> dict:
+        """Append an enhancement request and return it with its id and status."""
+        data = {k: v for k, v in enh.items() if k not in ("id", "status", "pr_url", "error")}
+        now = time.time()
+        cur = self._conn().execute(
+            "INSERT INTO enhancements (status, data, created_at, updated_at) VALUES (?, ?, ?, ?)",
+            (status, json.dumps(data), now, now),
+        )
+        return {**data, "id": cur.lastrowid, "status": status}
+
+    def get(self, enh_id: int) -> Optional[dict]:
+        row = self._conn().execute("SELECT * FROM enhancements WHERE id = ?", (enh_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def claim_next(self, from_status: str = "new", to_status: str = "in-progress") -> Optional[dict]:
+        """Atomically move the oldest item in from_status to to_status and return it."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM enhancements WHERE status = ? ORDER BY id LIMIT 1", (from_status,)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE enhancements SET status = ?, updated_at = ? WHERE id = ?",
+                (to_status, time.time(), row["id"]),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        enh = self._to_dict(row)
+        enh["status"] = to_status
+        return enh
+
+    def transition(self, enh_id: int, from_status: str, to_status: str,
+                   pr_url: Optional[str] = None, error: Optional[str] = None) -> bool:
+        """Compare-and-set status change; returns False if the item was not in from_status."""
+        cur = self._conn().execute(
+            "UPDATE enhancements SET status = ?, pr_url = COALESCE(?, pr_url), error = ?, updated_at = ? "
+            "WHERE id = ? AND status = ?",
+            (to_status, pr_url, error, time.time(), enh_id, from_status),
+        )
+        return cur.rowcount == 1
+
+    def requeue_stale(self, status: str = "in-progress", older_than: float = 3600, to_status: str = "new") -> int:
+        """Return items stuck in a working status (e.g. after a crash) to the queue."""
+        now = time.time()
+        cur = self._conn().execute(
+            "UPDATE enhancements SET status = ?, updated_at = ? WHERE status = ? AND updated_at < ?",
+            (to_status, now, status, now - older_than),
+        )
+        return cur.rowcount
+
+    def list(self, status: Optional[str] = None) -> List[dict]:
+        if status:
+            rows = self._conn().execute(
+                "SELECT * FROM enhancements WHERE status = ? ORDER BY id", (status,)
+            ).fetchall()
+        else:
+            rows = self._conn().execute("SELECT * FROM enhancements ORDER BY id").fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def _page_rows(self, columns: str, status: Optional[str], after: Optional[int], limit: Optional[int],
+                   descending: bool):
+        clauses, params = [], []
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if after is not None:
+            clauses.append("id < ?" if descending else "id > ?")
+            params.append(after)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        order = "DESC" if descending else "ASC"
+        if limit is None:
+            return self._conn().execute(f"SELECT {columns} FROM enhancements {where}ORDER BY id {order}", params).fetchall()
+        # Served from the primary key or the (status, id) index; one extra row tells whether more follow
+        return self._conn().execute(
+            f"SELECT {columns} FROM enhancements {where}ORDER BY id {order} LIMIT ?", (*params, limit + 1)
+        ).fetchall()
+
+    def page_versions(self, status: Optional[str] = None, after: Optional[int] = None, limit: Optional[int] = 100,
+                      descending: bool = False) -> List[Tuple[int, float]]:
+        """(id, updated_at) for the rows page() would return, plus one more if another page follows."""
+        rows = self._page_rows("id, updated_at", status, after, limit, descending)
+        return [(row["id"], row["updated_at"]) for row in rows]
+
+    def read_page(self, status: Optional[str] = None, after: Optional[int] = None, limit: Optional[int] = 100,
+                  descending: bool = False, with_error: bool = True) -> Tuple[List[dict], List[Tuple[int, float]]]:
+        """
+        One page of enhancements in id order, starting after id `after` (limit=None
+        reads all). Returns the items and, from the same query, the versions
+        page_versions() reports for them. with_error=False leaves the error column
+        (full tracebacks) unread.
+        """
+        columns = "id, status, data, pr_url, updated_at, " + ("error" if with_error else "NULL AS error")
+        rows = self._page_rows(columns, status, after, limit, descending)
+        items = rows if limit is None else rows[:limit]
+        return [self._to_dict(row) for row in items], [(row["id"], row["updated_at"]) for row in rows]
+
+    def page(self, status: Optional[str] = None, after: Optional[int] = None, limit: Optional[int] = 100,
+             descending: bool = False, with_error: bool = True) -> Tuple[List[dict], bool]:
+        """One page of enhancements (see read_page); returns (items, has_more)."""
+        items, versions = self.read_page(status, after, limit, descending, with_error)
+        return items, len(versions) > len(items)
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._conn().execute("SELECT status, COUNT(*) AS n FROM enhancements GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def _import_legacy_json(self, json_path: str):
+        """One-time import of the old enhancements.json queue file."""
+        if not os.path.exists(json_path):
+            return
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM enhancements LIMIT 1").fetchone():
+            return
+        try:
+            with open(json_path, "r") as f:
+                queue = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not import legacy enhancement queue {json_path}: {e}")
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            for enh in queue:
+                data = {k: v for k, v in enh.items() if k not in ("id", "status", "pr_url", "error")}
+                conn.execute(
+                    "INSERT INTO enhancements (status, data, pr_url, error, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (enh.get("status", "new"), json.dumps(data), enh.get("pr_url"), enh.get("error"), now, now),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        os.replace(json_path, json_path + ".migrated")
+        logger.info(f"Imported {len(queue)} enhancements from {json_path}")
@@ -0,0 +1,134 @@
+# app/utils/similarity.py
+
+import re
+import time
+import hashlib
+import threading
+from functools import lru_cache
+from collections import OrderedDict
+
+FINGERPRINT_BITS = 64
+
+_WORD_RE = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=65536)
+def _feature_bits(feature: str):
+    """The 64 bits of a feature's hash as a tuple of +1/-1 votes."""
+    h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+    return tuple(1 if (h >> i) & 1 else -1 for i in range(FINGERPRINT_BITS))
+
+
+def simhash(text: str) -> int:
+    """
+    64-bit SimHash of text over lowercased word unigrams and bigrams.
+    Punctuation, case and whitespace do not affect the result, and rewording a
+    few words flips only a few bits.
+    """
+    words = _WORD_RE.findall(text.lower())
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    if not features:
+        return 0
+    votes = [sum(column) for column in zip(*(_feature_bits(f) for f in features))]
+    fingerprint = 0
+    for i, vote in enumerate(votes):
+        if vote > 0:
+            fingerprint |= 1 << i
+    return fingerprint
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class SimilarityIndex:
+    """
+    Bounded near-duplicate index over SimHash fingerprints.
+
+    Fingerprints are split into max_distance + 1 bands; by the pigeonhole
+    principle any fingerprint within max_distance bits of a stored one matches
+    it exactly in at least one band, so a lookup only compares the few entries
+    sharing a band bucket. Entries are scoped (e.g. by brand/pillar/platform),
+    expire after ttl seconds and are evicted oldest-first beyond max_entries.
+    """
+
+    def __init__(self, max_entries=10000, max_distance=3, ttl=86400):
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.ttl = ttl
+        self.bands = max_distance + 1
+        self._band_bits = FINGERPRINT_BITS // self.bands
+        self._band_mask = (1 << self._band_bits) - 1
+        self._entries = OrderedDict()  # key -> (scope, fingerprint, expires_at, value)
+        self._buckets = {}  # (scope, band, band value) -> set of keys
+        self.hits = 0
+        self.misses = 0
+        self.compared = 0  # candidates compared across all lookups
+        self._lock = threading.Lock()
+
+    def _band_keys(self, scope, fingerprint):
+        return [
+            (scope, band, (fingerprint >> (band * self._band_bits)) & self._band_mask)
+            for band in range(self.bands)
+        ]
+
+    def add(self, key, scope, fingerprint: int, value):
+        """Index value under key; re-adding a key replaces its entry."""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (scope, fingerprint, time.time() + self.ttl, value)
+            for bucket in self._band_keys(scope, fingerprint):
+                self._buckets.setdefault(bucket, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def lookup(self, scope, fingerprint: int, exclude=None):
+        """
+        Return (distance, key, value) for the nearest entry in scope within
+        max_distance, or None.
+        """
+        now = time.time()
+        best = None
+        with self._lock:
+            candidates = set()
+            for bucket in self._band_keys(scope, fingerprint):
+                candidates.update(self._buckets.get(bucket, ()))
+            candidates.discard(exclude)
+            self.compared += len(candidates)
+            for key in candidates:
+                _, other, expires_at, value = self._entries[key]
+                if expires_at <= now:
+                    self._remove(key)
+                    continue
+                distance = hamming(fingerprint, other)
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, key, value)
+            if best is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(best[1])
+        return best
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        scope, fingerprint = entry[0], entry[1]
+        for bucket in self._band_keys(scope, fingerprint):
+            keys = self._buckets.get(bucket)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._buckets[bucket]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "compared": self.compared}
@@ -0,0 +1,50 @@
+# app/utils/sqlite_store.py
+
+import os
+import sqlite3
+import threading
+from typing import Sequence
+
+DEFAULT_PRAGMAS = ("journal_mode=WAL", "busy_timeout=30000")
+
+
+class SQLiteConnections:
+    """
+    One SQLite connection per thread for a database file, shared by the
+    SQLite-backed stores. Each connection is set up with pragmas (WAL mode and a
+    busy timeout by default). close() closes the connections of all threads;
+    a thread whose connection was closed reconnects on its next use.
+    """
+
+    def __init__(self, path: str, pragmas: Sequence[str] = DEFAULT_PRAGMAS, row_factory=sqlite3.Row):
+        self.path = path
+        self.pragmas = tuple(pragmas)
+        self.row_factory = row_factory
+        self._local = threading.local()
+        self._conns = []
+        self._lock = threading.Lock()
+        self._generation = 0  # bumped by close()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def get(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.generation != self._generation:
+            # Only the owning thread queries it, but close() may run on another
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.row_factory = self.row_factory
+            for pragma in self.pragmas:
+                conn.execute(f"PRAGMA {pragma}")
+            with self._lock:
+                self._conns.append(conn)
+                self._local.generation = self._generation
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        with self._lock:
+            conns, self._conns = self._conns, []
+            self._generation += 1
+        for conn in conns:
+            conn.close()
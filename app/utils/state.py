@@ -0,0 +1,230 @@
+# app/utils/state.py
+
+import os
+import json
+import time
+import sqlite3
+import tempfile
+import threading
+from collections.abc import MutableMapping, MutableSet
+from typing import Dict, Optional
+
+from app.utils.sqlite_store import SQLiteConnections
+
+# "sqlite" (default; shared by every worker process on the host) or "memory" (one process, for tests)
+STATE_BACKEND = os.getenv("MCP_STATE_BACKEND", "sqlite").lower()
+STATE_DB = os.getenv("MCP_STATE_DB", os.path.join(tempfile.gettempdir(), "mcp-state.db"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+"""
+
+_MISSING = object()
+
+
+class StateBackend:
+    """
+    Small key/value interface for state that must agree across worker processes.
+    Values are JSON-serialisable; keys are strings grouped by namespace.
+    """
+
+    def get(self, namespace: str, key: str, default=None):
+        raise NotImplementedError
+
+    def set(self, namespace: str, key: str, value):
+        self.set_many(namespace, {key: value})
+
+    def set_many(self, namespace: str, values: Dict[str, object]):
+        """Write several keys atomically."""
+        raise NotImplementedError
+
+    def delete(self, namespace: str, key: str) -> bool:
+        raise NotImplementedError
+
+    def items(self, namespace: str) -> Dict[str, object]:
+        raise NotImplementedError
+
+    def close(self):
+        """Release connections; the backend stays usable and reconnects if needed."""
+
+
+class MemoryStateBackend(StateBackend):
+    """Process-local backend; only correct with a single worker."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, namespace, key, default=None):
+        with self._lock:
+            value = self._data.get(namespace, {}).get(key, _MISSING)
+        # Round-trip through JSON so callers never share mutable objects with the store
+        return default if value is _MISSING else json.loads(value)
+
+    def set_many(self, namespace, values):
+        encoded = {k: json.dumps(v) for k, v in values.items()}
+        with self._lock:
+            self._data.setdefault(namespace, {}).update(encoded)
+
+    def delete(self, namespace, key):
+        with self._lock:
+            return self._data.get(namespace, {}).pop(key, _MISSING) is not _MISSING
+
+    def items(self, namespace):
+        with self._lock:
+            data = dict(self._data.get(namespace, {}))
+        return {k: json.loads(v) for k, v in data.items()}
+
+
+class SQLiteStateBackend(StateBackend):
+    """
+    SQLite-backed state shared by all processes that open the same file.
+    Runs in WAL mode with one connection per thread, like EnhancementStore.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = SQLiteConnections(path, row_factory=None)
+        self._conn().executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def _conn(self) -> sqlite3.Connection:
+        return self._db.get()
+
+    def get(self, namespace, key, default=None):
+        row = self._conn().execute(
+            "SELECT value FROM state WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set_many(self, namespace, values):
+        now = time.time()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "INSERT INTO state (namespace, key, value, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+                [(namespace, k, json.dumps(v), now) for k, v in values.items()],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, namespace, key):
+        cur = self._conn().execute("DELETE FROM state WHERE namespace = ? AND key = ?", (namespace, key))
+        return cur.rowcount > 0
+
+    def items(self, namespace):
+        rows = self._conn().execute(
+            "SELECT key, value FROM state WHERE namespace = ? ORDER BY key", (namespace,)
+        ).fetchall()
+        return {k: json.loads(v) for k, v in rows}
+
+
+BACKENDS = {
+    "sqlite": lambda: SQLiteStateBackend(STATE_DB),
+    "memory": MemoryStateBackend,
+}
+
+_backend: Optional[StateBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_state_backend() -> StateBackend:
+    """Return the process-wide state backend selected by MCP_STATE_BACKEND."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if STATE_BACKEND not in BACKENDS:
+                raise RuntimeError(f"MCP_STATE_BACKEND must be one of {', '.join(BACKENDS)}, not '{STATE_BACKEND}'")
+            _backend = BACKENDS[STATE_BACKEND]()
+        return _backend
+
+
+def close_state_backend():
+    """Close the process-wide backend's connections (it reconnects if used again)."""
+    with _backend_lock:
+        backend = _backend
+    if backend is not None:
+        backend.close()
+
+
+def set_state_backend(backend: Optional[StateBackend]):
+    """Replace the process-wide backend (None resets it to the configured one)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+class StateDict(MutableMapping):
+    """
+    Dict-like view of one state namespace. Every access goes to the backend, so
+    all workers see the same values. Values are copies: assign a whole value to
+    change it, since mutating a returned dict in place is not written back.
+    """
+
+    def __init__(self, namespace: str, backend: Optional[StateBackend] = None):
+        self.namespace = namespace
+        self._backend = backend
+
+    @property
+    def backend(self) -> StateBackend:
+        return self._backend or get_state_backend()
+
+    def __getitem__(self, key):
+        value = self.backend.get(self.namespace, key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.backend.set(self.namespace, key, value)
+
+    def __delitem__(self, key):
+        if not self.backend.delete(self.namespace, key):
+            raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.backend.items(self.namespace))
+
+    def __len__(self):
+        return len(self.backend.items(self.namespace))
+
+    def update_all(self, values: dict):
+        """Write several keys in one transaction."""
+        self.backend.set_many(self.namespace, values)
+
+    def to_dict(self) -> dict:
+        return self.backend.items(self.namespace)
+
+
+class StateSet(MutableSet):
+    """Set-like view of one state namespace, shared across workers."""
+
+    def __init__(self, namespace: str, backend: Optional[StateBackend] = None):
+        self._items = StateDict(namespace, backend)
+
+    def __contains__(self, item):
+        return self._items.backend.get(self._items.namespace, str(item), _MISSING) is not _MISSING
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, item):
+        self._items[str(item)] = True
+
+    def discard(self, item):
+        self._items.backend.delete(self._items.namespace, str(item))
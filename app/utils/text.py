@@ -1,3 +1,20 @@
+import logging
+
+from app.utils.tokens import count_tokens
+
+logger = logging.getLogger("mcp")
+
+
 def clean_text(text):
     # Implementation of clean_text function
     return text.strip().lower()
+
+
+def estimate_tokens(text, model="gpt-4"):
+    """Return the token count for text under the given model's encoding."""
+    return count_tokens(text, model)
+
+
+def log_request(source, text):
+    """Log an incoming request without writing the full payload to the log."""
+    logger.info(f"[{source}] {len(text)} chars")
@@ -0,0 +1,176 @@
+# app/utils/tokens.py
+
+import os
+import re
+import math
+import logging
+from functools import lru_cache
+from typing import List
+
+try:
+    import tiktoken
+    from tiktoken.load import load_tiktoken_bpe
+except ImportError:  # optional dependency; fall back to the estimator
+    tiktoken = None
+
+logger = logging.getLogger("mcp")
+
+# Directory holding local BPE vocabularies named <encoding>.tiktoken.
+# Nothing is ever downloaded: without a local file we use the estimator.
+TOKENIZER_DIR = os.getenv("MCP_TOKENIZER_DIR", "/app/tokenizers")
+
+# Scale factor applied to estimated counts, to calibrate against exact counts offline
+ESTIMATE_SCALE = float(os.getenv("MCP_TOKEN_ESTIMATE_SCALE", "1.0"))
+
+# Model name prefix -> encoding, most specific first
+MODEL_ENCODINGS = [
+    ("gpt-4o", "o200k_base"),
+    ("gpt-4.1", "o200k_base"),
+    ("o1", "o200k_base"),
+    ("o3", "o200k_base"),
+    ("o4", "o200k_base"),
+    ("gpt-4", "cl100k_base"),
+    ("gpt-3.5", "cl100k_base"),
+    ("text-embedding-3", "cl100k_base"),
+    ("text-embedding-ada", "cl100k_base"),
+]
+DEFAULT_ENCODING = "cl100k_base"
+
+ENDOFTEXT = "<|endoftext|>"
+ENDOFPROMPT = "<|endofprompt|>"
+
+ENCODING_SPECS = {
+    "cl100k_base": {
+        "pat_str": r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}++|\p{N}{1,3}+| ?[^\s\p{L}\p{N}]++[\r\n]*+|\s++$|\s*[\r\n]|\s+(?!\S)|\s""",
+        "special_tokens": {
+            ENDOFTEXT: 100257,
+            "<|fim_prefix|>": 100258,
+            "<|fim_middle|>": 100259,
+            "<|fim_suffix|>": 100260,
+            ENDOFPROMPT: 100276,
+        },
+    },
+    "o200k_base": {
+        "pat_str": "|".join([
+            r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]*[\p{Ll}\p{Lm}\p{Lo}\p{M}]+(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+            r"""[^\r\n\p{L}\p{N}]?[\p{Lu}\p{Lt}\p{Lm}\p{Lo}\p{M}]+[\p{Ll}\p{Lm}\p{Lo}\p{M}]*(?i:'s|'t|'re|'ve|'m|'ll|'d)?""",
+            r"""\p{N}{1,3}""",
+            r""" ?[^\s\p{L}\p{N}]+[\r\n/]*""",
+            r"""\s*[\r\n]+""",
+            r"""\s+(?!\S)""",
+            r"""\s+""",
+        ]),
+        "special_tokens": {ENDOFTEXT: 199999, ENDOFPROMPT: 200018},
+    },
+}
+
+# Approximation of the cl100k/o200k pre-tokenizer using only stdlib `re`:
+# contractions, words (with one leading non-letter), 1-3 digit runs,
+# punctuation runs, newline runs and whitespace runs.
+_PIECE_RE = re.compile(
+    r"(?P<contraction>'(?i:[sdmt]|ll|ve|re))"
+    r"|(?P<word>[^\r\n\w]?[^\W\d_]+)"
+    r"|(?P<number>\d{1,3})"
+    r"|(?P<punct> ?(?:[^\s\w]|_)+)[\r\n]*"
+    r"|(?P<space>\s*[\r\n]|\s+(?!\S)|\s+)"
+)
+
+
+def encoding_for_model(model: str) -> str:
+    model = (model or "").lower()
+    for prefix, encoding in MODEL_ENCODINGS:
+        if model.startswith(prefix):
+            return encoding
+    return DEFAULT_ENCODING
+
+
+class EstimatingCounter:
+    """
+    Fast token estimator used when no local vocabulary is available.
+    Splits text the way the BPE pre-tokenizer does, then charges each piece
+    by its length: short ASCII words are one token in the large vocabularies,
+    long or non-ASCII pieces cost roughly one token per few bytes.
+    """
+
+    exact = False
+
+    def __init__(self, encoding: str, scale: float = 1.0):
+        self.encoding = encoding
+        self.scale = scale
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        total = 0
+        word_cost = self._word_cost
+        for match in _PIECE_RE.finditer(text):
+            kind = match.lastgroup
+            if kind == "word":
+                total += word_cost(match.group())
+            elif kind == "punct":
+                size = len(match.group("punct").encode("utf-8"))
+                total += 1 if size <= 3 else math.ceil(size / 3)
+            else:
+                total += 1
+        return max(1, round(total * self.scale))
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        return [self.count(text) for text in texts]
+
+    @staticmethod
+    def _word_cost(piece: str) -> int:
+        if piece.isascii():
+            n = len(piece)
+            if n <= 12:
+                return 1
+            if n <= 16:
+                return 2
+            return math.ceil(n / 6)
+        return max(1, math.ceil(len(piece.encode("utf-8")) / 2.5))
+
+
+class TiktokenCounter:
+    """Exact BPE counts from a local .tiktoken vocabulary file."""
+
+    exact = True
+
+    def __init__(self, encoding: str, vocab_path: str):
+        spec = ENCODING_SPECS[encoding]
+        self.encoding = encoding
+        self._enc = tiktoken.Encoding(
+            name=f"mcp-{encoding}",
+            pat_str=spec["pat_str"],
+            mergeable_ranks=load_tiktoken_bpe(vocab_path),
+            special_tokens=spec["special_tokens"],
+        )
+
+    def count(self, text: str) -> int:
+        return len(self._enc.encode_ordinary(text))
+
+    def count_batch(self, texts: List[str]) -> List[int]:
+        return [len(tokens) for tokens in self._enc.encode_ordinary_batch(texts)]
+
+
+@lru_cache(maxsize=None)
+def _counter_for_encoding(encoding: str):
+    vocab_path = os.path.join(TOKENIZER_DIR, f"{encoding}.tiktoken")
+    if tiktoken is not None and encoding in ENCODING_SPECS and os.path.isfile(vocab_path):
+        try:
+            return TiktokenCounter(encoding, vocab_path)
+        except Exception as e:
+            logger.warning(f"Failed to load tokenizer {vocab_path}, using estimator: {e}")
+    return EstimatingCounter(encoding, ESTIMATE_SCALE)
+
+
+@lru_cache(maxsize=128)
+def get_counter(model: str):
+    """Return the cached token counter for a model."""
+    return _counter_for_encoding(encoding_for_model(model))
+
+
+def count_tokens(text: str, model: str = "gpt-4") -> int:
+    return get_counter(model).count(text)
+
+
+def count_tokens_batch(texts: List[str], model: str = "gpt-4") -> List[int]:
+    return get_counter(model).count_batch(texts)
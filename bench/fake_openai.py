@@ -0,0 +1,134 @@
+# bench/fake_openai.py
+"""
+Local OpenAI-compatible stand-in for offline benchmarks.
+
+Serves /v1/chat/completions (plain and streamed) with configurable latency, so
+the MCP pipeline can be load-tested without network access or token spend.
+"""
+
+import json
+import time
+import random
+import asyncio
+import argparse
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+SAMPLE_CONTENT = (
+    "Ethical AI governance is a board-level risk.\n"
+    "Start with a model inventory and a named owner for each system.\n"
+    "Document intended use, known limitations and escalation paths.\n"
+    "Review compliance evidence quarterly with your risk committee.\n"
+    "This post is for information only and is not legal advice."
+)
+SAMPLE_HEADLINES = "\n".join([
+    "1. Your AI Inventory Is Your First Compliance Control",
+    "2. Who Owns Your Model Risk? Name Them Today",
+    "3. Quarterly AI Reviews Beat Annual Surprises",
+    "4. Governance Before Scale: A Founder's Checklist",
+    "5. Ethical AI Starts With Documented Limits",
+])
+
+
+class LatencyModel:
+    """
+    Latency distribution parsed from a spec string:
+    constant:<s> | uniform:<lo>,<hi> | lognormal:<median>,<sigma>
+    """
+
+    def __init__(self, spec: str = "constant:0"):
+        kind, _, args = spec.partition(":")
+        self.kind = kind
+        self.args = [float(a) for a in args.split(",") if a]
+        if kind not in ("constant", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self) -> float:
+        if self.kind == "constant":
+            return self.args[0] if self.args else 0.0
+        if self.kind == "uniform":
+            return random.uniform(self.args[0], self.args[1])
+        median, sigma = self.args
+        return random.lognormvariate(0, sigma) * median
+
+
+def _usage(messages, content):
+    prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_tokens + len(content) // 4}
+
+
+def create_app(latency: str = "constant:0", first_token: str = "constant:0", chunk_delay: float = 0.0,
+               error_rate: float = 0.0) -> FastAPI:
+    """
+    Build the fake server. latency is the full-response time for non-streamed calls;
+    streamed calls wait first_token before the first chunk and chunk_delay between chunks.
+    """
+    app = FastAPI()
+    total = LatencyModel(latency)
+    ttft = LatencyModel(first_token)
+    app.state.requests = 0
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        if error_rate and random.random() < error_rate:
+            return StreamingResponse(iter([json.dumps({"error": {"message": "fake overload"}})]),
+                                     status_code=503, media_type="application/json")
+        messages = body.get("messages", [])
+        system = messages[0].get("content", "") if messages else ""
+        content = SAMPLE_HEADLINES if "headline" in system.lower() else SAMPLE_CONTENT
+        model = body.get("model", "gpt-4")
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(total.sample())
+            return {
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": _usage(messages, content),
+            }
+
+        include_usage = (body.get("stream_options") or {}).get("include_usage")
+
+        async def events():
+            await asyncio.sleep(ttft.sample())
+            words = content.split(" ")
+            for i, word in enumerate(words):
+                delta = word if i == 0 else " " + word
+                chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created,
+                         "model": model, "choices": [{"index": 0, "delta": {"content": delta},
+                                                      "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                if chunk_delay:
+                    await asyncio.sleep(chunk_delay)
+            if include_usage:
+                chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created,
+                         "model": model, "choices": [], "usage": _usage(messages, content)}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the fake OpenAI server.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="lognormal:1.5,0.5")
+    parser.add_argument("--first-token", default="constant:0.3")
+    parser.add_argument("--chunk-delay", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    import uvicorn
+    app = create_app(args.latency, args.first_token, args.chunk_delay, args.error_rate)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+# bench/run.py
+"""
+Offline load test for the MCP API.
+
+Starts the fake OpenAI server (bench/fake_openai.py) and the MCP router in
+background uvicorn threads, drives each endpoint scenario at the requested
+concurrency levels and reports RPS, p50/p95/p99 latency and event-loop lag of
+the MCP server. Results can be saved as a JSON baseline and compared later:
+
+    python -m bench.run --duration 10 --concurrency 1,8,32 --save bench/baselines/local.json
+    python -m bench.run --duration 10 --concurrency 1,8,32 --compare bench/baselines/local.json
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import socket
+import asyncio
+import argparse
+import tempfile
+import threading
+import platform
+
+SECRET = "bench-secret"
+
+PROCESS_BODY = {"text": "Why ethical AI governance matters for founders", "brand": "Ethical AI Insider",
+                "pillar": "AI governance", "platform": "LinkedIn"}
+
+
+# ---- Servers ----
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LoopLagMonitor:
+    """Samples how late asyncio wakes a sleeping task on the server's event loop."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - started - self.interval))
+
+    def take(self):
+        samples, self.samples = self.samples, []
+        return samples
+
+
+class _LagProbe:
+    """ASGI wrapper that starts the lag monitor inside the server's own event loop."""
+
+    def __init__(self, app, monitor):
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope, receive, send):
+        self.monitor.start()
+        await self.app(scope, receive, send)
+
+
+def _serve(app, port, lifespan="off"):
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning",
+                                           lifespan=lifespan))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Server on port {port} did not start")
+        time.sleep(0.01)
+    return server
+
+
+def _configure_env(openai_port, workdir):
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{openai_port}/v1"
+    os.environ["OPENAI_API_KEY"] = "bench"
+    os.environ["MCP_SECRET"] = SECRET
+    os.environ["MCP_ENH_DB"] = os.path.join(workdir, "enhancements.db")
+    for name in ("OPENAI_ASSISTANT_ID", "BOT_GH_TOKEN", "BOT_GH_USER", "BOT_GH_REPO"):
+        os.environ.setdefault(name, "bench")
+
+
+def build_mcp_app():
+    """The MCP application as served in production."""
+    import logging
+    from app.main import create_app
+    # Per-request INFO logs would dominate the measurement
+    logging.getLogger("mcp").setLevel(logging.WARNING)
+    return create_app()
+
+
+# ---- Scenarios ----
+
+def _process(client, i):
+    body = dict(PROCESS_BODY, text=f"{PROCESS_BODY['text']} #{i}")
+    return client.post("/api/process", json=body)
+
+
+def _process_cached(client, i):
+    return client.post("/api/process", json=PROCESS_BODY)
+
+
+def _process_batch(client, i):
+    items = [dict(PROCESS_BODY, text=f"Batch item {i}-{n}") for n in range(8)]
+    return client.post("/api/process/batch", json={"items": items, "concurrency": 4})
+
+
+def _tokens(client, i):
+    return client.post("/api/tokens", json={"text": PROCESS_BODY["text"] * 20})
+
+
+def _tokens_batch(client, i):
+    return client.post("/api/tokens/batch", json={"texts": [PROCESS_BODY["text"]] * 200})
+
+
+def _enhancement_request(client, i):
+    return client.post("/api/enhancement-request", json={"summary": f"Bench {i}", "details": "Load test"})
+
+
+def _enhancements(client, i):
+    return client.get("/api/enhancements")
+
+
+SCENARIOS = {
+    "process": _process,
+    "process_cached": _process_cached,
+    "process_stream": None,  # measured separately for time to first byte
+    "process_batch": _process_batch,
+    "tokens": _tokens,
+    "tokens_batch": _tokens_batch,
+    "enhancement_request": _enhancement_request,
+    "enhancements": _enhancements,
+}
+
+
+async def _process_stream(client, i):
+    body = dict(PROCESS_BODY, text=f"{PROCESS_BODY['text']} stream #{i}")
+    start = time.perf_counter()
+    first = None
+    async with client.stream("POST", "/api/process/stream", json=body) as response:
+        async for _ in response.aiter_bytes():
+            if first is None:
+                first = time.perf_counter() - start
+    return response, first
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of values (q in 0..100)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summarize(latencies, errors, elapsed, lag, ttfb=None):
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "loop_lag_p99_ms": round(percentile(lag, 99) * 1000, 2),
+        "loop_lag_max_ms": round(max(lag) * 1000, 2) if lag else 0.0,
+    }
+    if ttfb is not None:
+        result["ttfb_p50_ms"] = round(percentile(ttfb, 50) * 1000, 2)
+        result["ttfb_p95_ms"] = round(percentile(ttfb, 95) * 1000, 2)
+    return result
+
+
+async def run_scenario(base_url, name, concurrency, duration, monitor):
+    """Run one scenario with `concurrency` closed-loop clients for `duration` seconds."""
+    import httpx
+
+    latencies, ttfb = [], []
+    errors = 0
+    counter = iter(range(10 ** 9))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    headers = {"x-mcp-secret": SECRET}
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=120) as client:
+        # Warm-up request so connection setup and first-call imports are not measured
+        await client.get("/api/")
+        monitor.take()
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                i = next(counter)
+                start = time.perf_counter()
+                try:
+                    if name == "process_stream":
+                        response, first = await _process_stream(client, i)
+                        if first is not None:
+                            ttfb.append(first)
+                    else:
+                        response = await SCENARIOS[name](client, i)
+                    ok = response.status_code < 400
+                except Exception:
+                    ok = False
+                latencies.append(time.perf_counter() - start)
+                if not ok:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return summarize(latencies, errors, elapsed, monitor.take(), ttfb if name == "process_stream" else None)
+
+
+# ---- Baselines ----
+
+# Metrics where a higher value is a regression; rps is the only lower-is-worse metric
+HIGHER_IS_WORSE = ("p50_ms", "p95_ms", "p99_ms", "loop_lag_p99_ms", "ttfb_p95_ms")
+
+
+def compare(baseline: dict, current: dict, tolerance: float, floor_ms: float = 1.0):
+    """
+    Return a list of regression descriptions between two result dicts.
+    Latencies below floor_ms are ignored, since they are dominated by noise.
+    """
+    regressions = []
+    for key, base in baseline.get("results", {}).items():
+        now = current.get("results", {}).get(key)
+        if now is None:
+            continue
+        for metric in HIGHER_IS_WORSE:
+            if metric not in base or metric not in now:
+                continue
+            limit = max(base[metric], floor_ms) * (1 + tolerance)
+            if now[metric] > limit:
+                regressions.append(f"{key} {metric}: {base[metric]} -> {now[metric]}")
+        if now["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{key} rps: {base['rps']} -> {now['rps']}")
+        if now["errors"] > base["errors"]:
+            regressions.append(f"{key} errors: {base['errors']} -> {now['errors']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline MCP load test against a fake OpenAI server.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated scenario names")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per scenario and level")
+    parser.add_argument("--latency", default="lognormal:0.5,0.4", help="fake OpenAI response latency")
+    parser.add_argument("--first-token", default="constant:0.2", help="fake OpenAI time to first token")
+    parser.add_argument("--chunk-delay", type=float, default=0.005, help="fake OpenAI delay between chunks")
+    parser.add_argument("--save", help="write results to this JSON baseline file")
+    parser.add_argument("--compare", help="compare against this JSON baseline; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    levels = [int(c) for c in args.concurrency.split(",")]
+
+    from bench import fake_openai
+
+    workdir = tempfile.mkdtemp(prefix="mcp-bench-")
+    openai_port, mcp_port = _free_port(), _free_port()
+    _configure_env(openai_port, workdir)
+    _serve(fake_openai.create_app(args.latency, args.first_token, args.chunk_delay), openai_port)
+    monitor = LoopLagMonitor()
+    mcp_server = _serve(_LagProbe(build_mcp_app(), monitor), mcp_port, lifespan="on")
+    base_url = f"http://127.0.0.1:{mcp_port}"
+
+    results = {}
+    for name in names:
+        for level in levels:
+            key = f"{name}@{level}"
+            results[key] = asyncio.run(run_scenario(base_url, name, level, args.duration, monitor))
+            r = results[key]
+            print(f"{key:28} rps={r['rps']:>8} p50={r['p50_ms']:>8}ms p95={r['p95_ms']:>8}ms "
+                  f"p99={r['p99_ms']:>8}ms lag_p99={r['loop_lag_p99_ms']:>7}ms errors={r['errors']}")
+    mcp_server.should_exit = True
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "config": {"duration": args.duration, "latency": args.latency, "first_token": args.first_token,
+                   "chunk_delay": args.chunk_delay},
+        "results": results,
+    }
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.tolerance)
+        if regressions:
+            print("Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"No regressions against {args.compare}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
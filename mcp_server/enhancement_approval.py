@@ -2,14 +2,16 @@ from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 import os
 
+from app.utils.state import StateSet
+
 app = FastAPI()
 
 class ApprovalRequest(BaseModel):
     enhancement_id: str
     approver_email: str
 
-# A simple in-memory store for human-approved enhancements
-approved_enhancements = set()
+# Human-approved enhancements, kept in the shared state backend so all workers agree
+approved_enhancements = StateSet('approved_enhancements')
 
 @app.post("/api/approve-enhancement")
 async def approve_enhancement(request: ApprovalRequest):
@@ -1,9 +1,87 @@
 import os
 import jwt
+import calendar
+import threading
 import requests
-from time import time
+from time import time, sleep, strptime
+from requests.adapters import HTTPAdapter
 from fastapi import HTTPException
 
+from mcp_server.http_utils import parse_retry_after
+
+GITHUB_API_URL = 'https://api.github.com'
+
+# Installation tokens live for an hour; renew them this many seconds before expiry
+TOKEN_REFRESH_MARGIN = 300
+
+# Longest we will sleep on a rate-limit response before giving up and returning it
+MAX_RATE_LIMIT_WAIT = float(os.getenv('GITHUB_MAX_RATE_LIMIT_WAIT', '60'))
+
+
+class GitHubClient:
+    """
+    Shared GitHub REST client.
+
+    Keeps one keep-alive connection pool, sends If-None-Match for GETs it has
+    seen before (a 304 does not count against the rate limit), and sleeps on
+    rate-limit responses according to Retry-After / X-RateLimit-Reset.
+    """
+
+    def __init__(self, token_provider, pool_size=10, max_retries=3, timeout=15):
+        self.token_provider = token_provider
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'Accept': 'application/vnd.github.v3+json'})
+        self._etags = {}  # (path, params) -> (etag, body)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def rate_limit_wait(response):
+        """Seconds to wait before retrying, or None if the response is not a rate-limit rejection."""
+        if response.status_code not in (403, 429):
+            return None
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        if retry_after is not None:
+            return retry_after
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            reset = float(response.headers.get('X-RateLimit-Reset', time()))
+            return max(0.0, reset - time()) + 1
+        return None
+
+    def request(self, method, path, headers=None, **kwargs):
+        url = path if path.startswith('http') else f'{GITHUB_API_URL}{path}'
+        for attempt in range(self.max_retries + 1):
+            request_headers = {'Authorization': f'token {self.token_provider()}'}
+            request_headers.update(headers or {})
+            response = self.session.request(method, url, headers=request_headers, timeout=self.timeout, **kwargs)
+            wait = self.rate_limit_wait(response)
+            if wait is None or wait > MAX_RATE_LIMIT_WAIT or attempt == self.max_retries:
+                return response
+            sleep(wait)
+        return response
+
+    def get_json(self, path, params=None):
+        """GET a JSON resource, revalidating with the last ETag seen for it."""
+        key = (path, tuple(sorted((params or {}).items())))
+        with self._lock:
+            cached = self._etags.get(key)
+        headers = {'If-None-Match': cached[0]} if cached else {}
+        response = self.request('GET', path, headers=headers, params=params)
+        if response.status_code == 304 and cached:
+            return cached[1]
+        if not response.ok:
+            raise HTTPException(status_code=response.status_code, detail=f'GitHub request {path} failed')
+        body = response.json()
+        etag = response.headers.get('ETag')
+        if etag:
+            with self._lock:
+                self._etags[key] = (etag, body)
+        return body
+
+
 class GitHubIntegration:
     def __init__(self):
         self.app_id = os.getenv('GITHUB_APP_ID')
@@ -11,6 +89,10 @@ class GitHubIntegration:
         self.installation_id = os.getenv('GITHUB_APP_INSTALLATION_ID')
         if not self.app_id or not self.private_key or not self.installation_id:
             raise EnvironmentError('Missing GitHub App configuration')
+        self._token = None
+        self._token_expires_at = 0.0
+        self._token_lock = threading.Lock()
+        self.client = GitHubClient(self.get_installation_token)
 
     def generate_jwt(self):
         payload = {
@@ -25,36 +107,51 @@ class GitHubIntegration:
         return jwt_token
 
     def get_installation_token(self):
-        jwt_token = self.generate_jwt()
-        headers = {
-            'Authorization': f'Bearer {jwt_token}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
-        response = requests.post(
-            f'https://api.github.com/app/installations/{self.installation_id}/access_tokens',
-            headers=headers
-        )
-        if response.ok:
-            return response.json()['token']
-        raise HTTPException(status_code=response.status_code, detail='Failed to get installation token')
+        """Return the cached installation token, requesting a new one shortly before it expires."""
+        with self._token_lock:
+            if self._token and time() < self._token_expires_at - TOKEN_REFRESH_MARGIN:
+                return self._token
+            jwt_token = self.generate_jwt()
+            headers = {
+                'Authorization': f'Bearer {jwt_token}',
+                'Accept': 'application/vnd.github.v3+json'
+            }
+            response = self.client.session.post(
+                f'{GITHUB_API_URL}/app/installations/{self.installation_id}/access_tokens',
+                headers=headers,
+                timeout=self.client.timeout
+            )
+            if not response.ok:
+                raise HTTPException(status_code=response.status_code, detail='Failed to get installation token')
+            data = response.json()
+            self._token = data['token']
+            expires_at = data.get('expires_at')
+            if expires_at:
+                self._token_expires_at = calendar.timegm(strptime(expires_at, '%Y-%m-%dT%H:%M:%SZ'))
+            else:
+                self._token_expires_at = time() + 3600
+            return self._token
 
     def perform_github_action(self, repo_name, action):
-        token = self.get_installation_token()
-        headers = {
-            'Authorization': f'token {token}',
-            'Accept': 'application/vnd.github.v3+json'
-        }
         # Example action logic (e.g., list PRs)
         if action == 'list_prs':
-            response = requests.get(
-                f'https://api.github.com/repos/{repo_name}/pulls',
-                headers=headers
-            )
-            if response.ok:
-                return response.json()
-        raise HTTPException(status_code=response.status_code, detail=f'GitHub action {action} failed')
+            return self.client.get_json(f'/repos/{repo_name}/pulls')
+        raise HTTPException(status_code=400, detail=f'GitHub action {action} failed')
+
+
+_integration = None
+_integration_lock = threading.Lock()
+
+
+def get_github_integration():
+    """Return the process-wide GitHubIntegration, so the token cache and connection pool are shared."""
+    global _integration
+    with _integration_lock:
+        if _integration is None:
+            _integration = GitHubIntegration()
+        return _integration
 
 # Example usage
-# github_integration = GitHubIntegration()
+# github_integration = get_github_integration()
 # prs = github_integration.perform_github_action('user/repo', 'list_prs')
 # print(prs)
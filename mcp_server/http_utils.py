@@ -0,0 +1,23 @@
+import time
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+
+
+def parse_retry_after(value):
+    """
+    Seconds to wait according to a Retry-After header, given either as delta-seconds
+    or as an HTTP-date; None if the header is missing or unparseable.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, when.timestamp() - time.time())
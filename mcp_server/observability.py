@@ -1,37 +1,207 @@
 import os
+import time
+import queue
+import atexit
+import random
+import logging
+import threading
+from collections import OrderedDict
+
 import requests
 
-def send_slack_notification(message: str):
+from mcp_server.http_utils import parse_retry_after
+
+logger = logging.getLogger("mcp")
+
+SLACK_TIMEOUT = float(os.getenv('SLACK_TIMEOUT', '10'))
+# Messages of the same kind arriving within this many seconds are merged into one post
+SLACK_COALESCE_WINDOW = float(os.getenv('SLACK_COALESCE_WINDOW', '2'))
+SLACK_QUEUE_SIZE = int(os.getenv('SLACK_QUEUE_SIZE', '1000'))
+SLACK_MAX_RETRIES = int(os.getenv('SLACK_MAX_RETRIES', '5'))
+
+
+class SlackDeliveryError(ValueError):
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def send_slack_notification(message: str, session=None):
     webhook_url = os.getenv('SLACK_WEBHOOK_URL')
     if not webhook_url:
         raise ValueError("The SLACK_WEBHOOK_URL environment variable is not set.")
-    
+
     headers = {
         'Content-Type': 'application/json'
     }
-    
+
     data = {
         "text": message
     }
-    
-    response = requests.post(webhook_url, json=data, headers=headers)
-    
+
+    http = session or requests
+    response = http.post(webhook_url, json=data, headers=headers, timeout=SLACK_TIMEOUT)
+
     if response.status_code != 200:
-        raise ValueError(
-            f'Request to Slack returned an error {response.status_code}, the response is:\n{response.text}'
+        retry_after = response.headers.get('Retry-After') if response.headers else None
+        raise SlackDeliveryError(
+            f'Request to Slack returned an error {response.status_code}, the response is:\n{response.text}',
+            status_code=response.status_code,
+            retry_after=parse_retry_after(retry_after),
         )
 
 
+_STOP = object()
+
+
+class SlackDispatcher:
+    """
+    Background Slack sender.
+
+    submit() only enqueues, so callers never block on the webhook. A single
+    worker thread drains a bounded queue over one pooled HTTP session, merges
+    messages of the same kind that arrive within the coalescing window into
+    one post, and retries failed posts with exponential backoff (honouring
+    Slack's Retry-After on 429).
+    """
+
+    def __init__(self, window=SLACK_COALESCE_WINDOW, maxsize=SLACK_QUEUE_SIZE, max_retries=SLACK_MAX_RETRIES):
+        self.window = window
+        self.max_retries = max_retries
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._session = requests.Session()
+        self._thread = None
+        self._stop_sent = False
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def submit(self, kind: str, message: str) -> bool:
+        try:
+            self._queue.put_nowait((kind, message))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"Slack queue full; dropping {kind} notification")
+            return False
+        finally:
+            # Started after the put, so a worker that is just stopping either sees the message or
+            # has already given up its slot (see _finish)
+            self._ensure_started()
+
+    def flush(self, timeout: float = 10):
+        """Deliver everything queued so far and stop the worker (it restarts on the next submit)."""
+        with self._lock:
+            thread = self._thread
+            if thread is None:
+                return
+            if not self._stop_sent:
+                self._queue.put(_STOP)
+                self._stop_sent = True
+        thread.join(timeout)
+        with self._lock:
+            # A worker still busy (e.g. sleeping before a retry) keeps its slot, so the next
+            # submit cannot start a second consumer on the same queue and reorder messages
+            if self._thread is thread and not thread.is_alive():
+                self._thread = None
+                self._stop_sent = False
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop_sent = False
+                self._thread = threading.Thread(target=self._run, name="slack-dispatcher", daemon=True)
+                self._thread.start()
+
+    def _finish(self) -> bool:
+        """True if a draining worker may exit: the queue is empty and its slot is released."""
+        with self._lock:
+            if not self._queue.empty():
+                return False
+            if self._thread is threading.current_thread():
+                self._thread = None
+                self._stop_sent = False
+            return True
+
+    def _run(self):
+        # After a stop marker the worker drains what was submitted meanwhile, then exits
+        draining = False
+        while True:
+            if draining:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    if self._finish():
+                        return
+                    continue
+            else:
+                item = self._queue.get()
+            if item is _STOP:
+                draining = True
+                continue
+            batches = OrderedDict()
+            batches.setdefault(item[0], []).append(item[1])
+            deadline = time.monotonic() + self.window
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    draining = True
+                    break
+                batches.setdefault(item[0], []).append(item[1])
+            for messages in batches.values():
+                self._deliver(self._coalesce(messages))
+
+    @staticmethod
+    def _coalesce(messages):
+        counts = OrderedDict()
+        for message in messages:
+            counts[message] = counts.get(message, 0) + 1
+        return "\n".join(m if n == 1 else f"{m} (x{n})" for m, n in counts.items())
+
+    def _deliver(self, text):
+        delay = 1.0
+        for attempt in range(self.max_retries + 1):
+            try:
+                send_slack_notification(text, session=self._session)
+                return
+            except SlackDeliveryError as e:
+                if e.status_code is not None and e.status_code < 500 and e.status_code != 429:
+                    logger.error(f"Slack rejected notification: {e}")
+                    return
+                wait = e.retry_after or delay
+                error = e
+            except requests.RequestException as e:
+                wait = delay
+                error = e
+            except ValueError as e:
+                logger.error(f"Slack notification not sent: {e}")
+                return
+            if attempt < self.max_retries:
+                time.sleep(min(wait, 60) * random.uniform(1.0, 1.2))
+                delay *= 2
+        logger.error(f"Slack notification failed after {self.max_retries + 1} attempts: {error}")
+
+
+dispatcher = SlackDispatcher()
+atexit.register(dispatcher.flush)
+
+
 def notify_test_failure(test_name: str):
     message = f":x: Test Failed: {test_name}"
-    send_slack_notification(message)
+    dispatcher.submit("test_failure", message)
 
 
 def notify_deployment(environment: str):
     message = f":rocket: Deployment to {environment} succeeded."
-    send_slack_notification(message)
+    dispatcher.submit("deployment", message)
 
 
 def notify_rollback(environment: str):
     message = f":rewind: Rollback executed on {environment}."
-    send_slack_notification(message)
+    dispatcher.submit("rollback", message)
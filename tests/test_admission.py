@@ -0,0 +1,74 @@
+import time
+import asyncio
+
+import pytest
+
+from app.utils.admission import AdmissionController, AdmissionRejected
+
+
+def test_disabled_controller_admits_everything():
+    controller = AdmissionController()
+
+    async def run():
+        await asyncio.gather(*(controller.acquire(10 ** 6) for _ in range(100)))
+
+    asyncio.run(run())
+    assert not controller.enabled
+
+
+def test_admits_within_quota_then_queues():
+    async def run():
+        controller = AdmissionController(rpm=600, max_wait=5)  # 10 requests/s, burst of 600
+        controller.requests.level = 1
+        started = time.monotonic()
+        await controller.acquire(0)
+        first = time.monotonic() - started
+        await controller.acquire(0)
+        return first, time.monotonic() - started
+
+    first, second = asyncio.run(run())
+    assert first < 0.01
+    assert 0.07 < second < 0.5
+
+
+def test_rejects_fast_when_queue_full_or_wait_too_long():
+    async def run():
+        controller = AdmissionController(tpm=600, max_queue=1, max_wait=1)  # 10 tokens/s
+        controller.tokens.level = 0
+        with pytest.raises(AdmissionRejected) as exc:
+            await controller.acquire(100)  # ~10s away
+        assert exc.value.retry_after > 5
+        waiter = asyncio.ensure_future(controller.acquire(2))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected, match="queue full"):
+            await controller.acquire(1)
+        await waiter
+        return controller
+
+    controller = asyncio.run(run())
+    assert controller.rejected == 2 and controller.admitted == 1
+
+
+def test_higher_priority_is_admitted_first():
+    async def run():
+        controller = AdmissionController(rpm=600, max_wait=5)
+        controller.requests.level = 0
+        order = []
+
+        async def request(name, priority):
+            await controller.acquire(0, priority=priority)
+            order.append(name)
+
+        tasks = [asyncio.ensure_future(request("low", 0))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.ensure_future(request("high", 5)))
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ["high", "low"]
+
+
+def test_pause_drains_quota():
+    controller = AdmissionController(rpm=60)
+    controller.pause(2)
+    assert controller.requests.level == pytest.approx(-2, abs=0.1)
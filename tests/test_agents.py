@@ -0,0 +1,166 @@
+import json
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.agents import compliance, formatter, fused, headline
+
+
+def _response(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+async def _stream(parts):
+    for part in parts:
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=part))])
+
+
+class FakeAsyncClient:
+    def __init__(self, content, chunk_size=3):
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self._content = content
+        self._chunk_size = chunk_size
+
+    async def _create(self, **kwargs):
+        self.calls.append(kwargs)
+        if kwargs.get("stream"):
+            size = self._chunk_size
+            return _stream([self._content[i:i + size] for i in range(0, len(self._content), size)])
+        return _response(self._content)
+
+
+class FakeToolClient:
+    """Returns `arguments` as the publish_post tool call."""
+
+    def __init__(self, arguments):
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self._arguments = arguments
+
+    async def _create(self, **kwargs):
+        self.calls.append(kwargs)
+        call = SimpleNamespace(function=SimpleNamespace(name="publish_post", arguments=self._arguments))
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=None, tool_calls=[call]))])
+
+
+async def _collect(agen):
+    return [item async for item in agen]
+
+
+def test_rewrite_safe_async():
+    client = FakeAsyncClient("Safe content")
+    result = asyncio.run(compliance.rewrite_safe_async("prompt", client, brand="Brand"))
+    assert result == "Safe content"
+    assert "Brand" in client.calls[0]["messages"][0]["content"]
+
+
+def test_generate_variants_async_enforces_limit():
+    client = FakeAsyncClient("1. Short headline\n2. " + "x" * 100)
+    headlines = asyncio.run(headline.generate_variants_async("prompt", client, platform="ConvertKit"))
+    assert headlines[0] == "Short headline"
+    assert len(headlines[1]) == 46 and headlines[1].endswith("…")
+
+
+def test_rewrite_safe_stream_yields_deltas():
+    client = FakeAsyncClient("Streamed safe content")
+    deltas = asyncio.run(_collect(compliance.rewrite_safe_stream("prompt", client)))
+    assert len(deltas) > 1
+    assert "".join(deltas) == "Streamed safe content"
+
+
+def test_generate_variants_stream_matches_non_streaming():
+    content = "1. First headline\n2. Second headline\n- Third"
+    streamed = asyncio.run(_collect(headline.generate_variants_stream("prompt", FakeAsyncClient(content))))
+    whole = asyncio.run(headline.generate_variants_async("prompt", FakeAsyncClient(content)))
+    assert streamed == whole == ["First headline", "Second headline", "Third"]
+
+
+def test_stream_formatter_matches_format_post():
+    content = "Title line\n\nFirst paragraph\nSecond paragraph\n"
+    for platform in ("LinkedIn", "ConvertKit", "Medium", "WordPress"):
+        stream = formatter.StreamFormatter(platform)
+        chunks = [content[i:i + 4] for i in range(0, len(content), 4)]
+        out = "".join(stream.feed(chunk) for chunk in chunks) + stream.close()
+        assert out == formatter.format_post(content, platform)
+
+
+def test_markdown_renderers():
+    content = "# Governance *matters*\n\nIntro with **bold** & <tags>\nnext line\n\n- one\n- [two](https://x.io)\n3. three\n"
+    html = formatter.format_post(content, "ConvertKit")
+    assert html == (
+        "<h2>Governance <em>matters</em></h2>"
+        "<p>Intro with <strong>bold</strong> &amp; &lt;tags&gt;<br>next line</p>"
+        '<ul><li>one</li><li><a href="https://x.io">two</a></li></ul>'
+        '<ol start="3"><li>three</li></ol>'
+    )
+    assert formatter.format_post("Title\nBody `a<b`", "WordPress") == "<h2>Title</h2><p>Body <code>a&lt;b</code></p>"
+    assert formatter.format_post("[x](javascript:alert(1))", "ConvertKit") == "<p>[x](javascript:alert(1))</p>"
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("use `x", "use `x"),
+    ("`", "`"),
+    ("a `b` c `d", "a <code>b</code> c `d"),
+    ("`a` `b` `c", "<code>a</code> <code>b</code> `c"),
+])
+def test_unmatched_backtick_stays_literal(text, expected):
+    assert formatter.render_inline(text) == expected
+    assert formatter.format_post(text, "ConvertKit") == f"<p>{expected}</p>"
+
+
+def test_linkedin_limit_enforced_across_chunks():
+    stream = formatter.StreamFormatter("LinkedIn")
+    out = "".join(stream.feed("x" * 700) for _ in range(6)) + stream.close()
+    assert len(out) == 3000
+
+
+def test_long_lines_are_flushed_with_bounded_buffer():
+    words = " ".join(f"word{i}" for i in range(3000))
+    content = f"Title\n{words}\n- item"
+    stream = formatter.StreamFormatter("WordPress")
+    out = []
+    for i in range(0, len(content), 100):
+        out.append(stream.feed(content[i:i + 100]))
+        assert len(stream.renderer._pending) <= formatter.MAX_LINE_BUFFER + 100
+    out.append(stream.close())
+    assert "".join(out) == formatter.format_post(content, "WordPress")
+
+
+def test_register_custom_renderer():
+    @formatter.register("Shouty")
+    class ShoutyRenderer(formatter.Renderer):
+        def feed(self, chunk):
+            return chunk.upper()
+
+    try:
+        assert formatter.format_post("hi", "shouty") == "HI"
+    finally:
+        formatter.RENDERERS.pop("shouty")
+
+
+def test_fused_generate_post_validates_and_fits_headlines():
+    arguments = json.dumps({
+        "content": "Safe post",
+        "headlines": ["Short one", "", "y" * 100],
+        "brandCompliance": True,
+        "brandComplianceRationale": "On theme.",
+    })
+    client = FakeToolClient(arguments)
+    post = asyncio.run(fused.generate_post_async("prompt", client, platform="ConvertKit"))
+    assert post["safe"] == "Safe post"
+    assert post["headlines"][0] == "Short one"
+    assert len(post["headlines"]) == 2 and post["headlines"][1].endswith("…")
+    assert post["brandVerdict"] == {"compliant": True, "rationale": "On theme."}
+    assert client.calls[0]["tool_choice"]["function"]["name"] == "publish_post"
+
+
+@pytest.mark.parametrize("arguments", [
+    "not json",
+    json.dumps({"content": "x", "headlines": "one", "brandCompliance": True}),
+    json.dumps({"content": " ", "headlines": ["a"], "brandCompliance": False}),
+])
+def test_fused_rejects_invalid_output(arguments):
+    with pytest.raises(fused.FusedOutputError):
+        asyncio.run(fused.generate_post_async("prompt", FakeToolClient(arguments)))
@@ -0,0 +1,110 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.agents import assistant
+
+
+def _message(role, text):
+    block = SimpleNamespace(type="text", text=SimpleNamespace(value=text))
+    return SimpleNamespace(role=role, content=[block])
+
+
+class FakeRuns:
+    def __init__(self, statuses=None, stream_events=None, stream_error=None, hang=False):
+        self.statuses = list(statuses or [])
+        self.stream_events = stream_events
+        self.stream_error = stream_error
+        self.hang = hang
+        self.retrieves = 0
+        self.cancelled = []
+
+    async def create(self, thread_id, assistant_id, instructions, stream=False):
+        if stream:
+            if self.stream_error:
+                raise self.stream_error
+            return self._stream()
+        return SimpleNamespace(id="run_1", status="queued")
+
+    async def _stream(self):
+        for event in self.stream_events:
+            if self.hang and event.event != "thread.run.created":
+                await asyncio.sleep(10)
+            yield event
+
+    async def retrieve(self, thread_id, run_id):
+        self.retrieves += 1
+        if self.hang:
+            return SimpleNamespace(id=run_id, status="in_progress")
+        return SimpleNamespace(id=run_id, status=self.statuses.pop(0))
+
+    async def cancel(self, thread_id, run_id):
+        self.cancelled.append(run_id)
+
+
+class FakeClient:
+    def __init__(self, runs, listed=None):
+        self.runs = runs
+        listed = listed or []
+
+        async def create_thread():
+            return SimpleNamespace(id="thread_1")
+
+        async def create_message(**kwargs):
+            return None
+
+        async def list_messages(**kwargs):
+            return SimpleNamespace(data=listed)
+
+        self.beta = SimpleNamespace(threads=SimpleNamespace(
+            create=create_thread,
+            runs=runs,
+            messages=SimpleNamespace(create=create_message, list=list_messages),
+        ))
+
+
+def _event(name, data):
+    return SimpleNamespace(event=name, data=data)
+
+
+def test_streaming_run_collects_assistant_messages():
+    runs = FakeRuns(stream_events=[
+        _event("thread.run.created", SimpleNamespace(id="run_1")),
+        _event("thread.message.completed", _message("assistant", '{"ok": true}')),
+        _event("thread.run.completed", SimpleNamespace(id="run_1", status="completed")),
+    ])
+    result = asyncio.run(assistant.run_assistant(FakeClient(runs), "asst", "prompt", "instr"))
+    assert result["status"] == "completed"
+    assert result["messages"] == ['{"ok": true}']
+    assert result["polls"] == 0 and result["latency"] >= 0
+
+
+def test_falls_back_to_polling_when_streaming_unavailable(monkeypatch):
+    monkeypatch.setattr(assistant, "POLL_INITIAL_DELAY", 0.001)
+    runs = FakeRuns(statuses=["in_progress", "completed"], stream_error=RuntimeError("no streaming"))
+    client = FakeClient(runs, listed=[_message("user", "prompt"), _message("assistant", "done")])
+    result = asyncio.run(assistant.run_assistant(client, "asst", "prompt", "instr"))
+    assert result["status"] == "completed"
+    assert result["messages"] == ["done"]
+    assert runs.retrieves == 2
+
+
+def test_timed_out_run_is_cancelled():
+    runs = FakeRuns(hang=True, stream_events=[
+        _event("thread.run.created", SimpleNamespace(id="run_9")),
+        _event("thread.run.completed", SimpleNamespace(id="run_9", status="completed")),
+    ])
+    with pytest.raises(RuntimeError, match="timed out"):
+        asyncio.run(assistant.run_assistant(FakeClient(runs), "asst", "prompt", "instr", timeout=0.05))
+    assert runs.cancelled == ["run_9"]
+
+
+def test_run_requiring_action_is_cancelled():
+    runs = FakeRuns(stream_events=[
+        _event("thread.run.created", SimpleNamespace(id="run_5")),
+        _event("thread.run.requires_action", SimpleNamespace(id="run_5", status="requires_action")),
+    ])
+    with pytest.raises(RuntimeError, match="requires tool outputs"):
+        asyncio.run(assistant.run_assistant(FakeClient(runs), "asst", "prompt", "instr"))
+    assert runs.cancelled == ["run_5"]
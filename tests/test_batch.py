@@ -0,0 +1,77 @@
+import json
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.main import create_app
+from app.routes import api
+
+REQUIRED = ("OPENAI_API_KEY", "OPENAI_ASSISTANT_ID", "MCP_SECRET", "BOT_GH_TOKEN", "BOT_GH_USER", "BOT_GH_REPO")
+ITEM = {"brand": "acme", "pillar": "growth", "platform": "linkedin"}
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    for var in REQUIRED:
+        monkeypatch.setenv(var, "x")
+    monkeypatch.setattr(api, "ENH_DB", str(tmp_path / "enh.db"))
+    monkeypatch.setattr(api, "JOB_DB", str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(api, "MCP_SECRET", "s")
+    monkeypatch.setattr(main, "PREWARM", False)
+    with TestClient(create_app()) as client:
+        yield client
+
+
+def _batch(client, items, **body):
+    response = client.post("/api/process/batch", json={"items": items, **body}, headers={"x-mcp-secret": "s"})
+    assert response.status_code == 200
+    return sorted((json.loads(line) for line in response.text.splitlines()), key=lambda line: line["index"])
+
+
+def test_batch_reports_bad_items_inline(client, monkeypatch):
+    async def fake_process(fields, cache_mode, similar_mode, priority):
+        if fields["text"] == "boom":
+            raise KeyError("choices")
+        return {"safe": fields["text"]}, "miss"
+
+    monkeypatch.setattr(api, "process_with_cache", fake_process)
+    items = [{**ITEM, "text": "ok"}, {**ITEM, "text": 123}, "nope", {**ITEM, "text": "boom"}, {**ITEM, "text": "later"}]
+    lines = _batch(client, items)
+    assert [line["ok"] for line in lines] == [True, False, False, False, True]
+    assert lines[1]["status"] == 400 and "text" in lines[1]["error"]
+    assert lines[2]["status"] == 400
+    assert lines[3]["status"] == 500 and "choices" in lines[3]["error"]
+    assert lines[4]["result"] == {"safe": "later", "name": ""}
+
+
+def test_batch_deduplicates_and_bounds_concurrency_across_batches(monkeypatch):
+    monkeypatch.setattr(api, "BATCH_MAX_CONCURRENCY", 2)
+    running, peak = [0], [0]
+
+    async def fake_process(fields, cache_mode, similar_mode, priority):
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+        return {"safe": fields["text"]}, "miss"
+
+    monkeypatch.setattr(api, "process_with_cache", fake_process)
+
+    async def collect(prefix):
+        items = [{**ITEM, "text": f"{prefix} {i}"} for i in range(4)] + [{**ITEM, "text": f"{prefix} 0"}]
+        return [json.loads(line) async for line in api.stream_batch_results(items, 2, "")]
+
+    async def run():
+        return await asyncio.gather(collect("a"), collect("b"))
+
+    for lines in asyncio.run(run()):
+        assert len(lines) == 5 and all(line["ok"] for line in lines)
+        assert next(line for line in lines if line["index"] == 4)["duplicateOf"] == 0
+    assert peak[0] == 2  # two batches of concurrency 2 share the process-wide limit
+
+
+def test_process_rejects_non_string_fields(client):
+    response = client.post("/api/process", json={**ITEM, "text": "x", "brand": ["a"]}, headers={"x-mcp-secret": "s"})
+    assert response.status_code == 400 and "brand" in response.json()["detail"]
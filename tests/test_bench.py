@@ -0,0 +1,27 @@
+import pytest
+
+from bench.fake_openai import LatencyModel
+from bench.run import percentile, compare
+
+
+def test_percentile_nearest_rank():
+    values = [i / 100 for i in range(1, 101)]
+    assert percentile(values, 50) == 0.5
+    assert percentile(values, 99) == 0.99
+    assert percentile([], 95) == 0.0
+
+
+def test_latency_model_specs():
+    assert LatencyModel("constant:0.2").sample() == 0.2
+    assert 0.1 <= LatencyModel("uniform:0.1,0.3").sample() <= 0.3
+    assert LatencyModel("lognormal:1,0.5").sample() > 0
+    with pytest.raises(ValueError):
+        LatencyModel("gamma:1")
+
+
+def test_compare_flags_latency_rps_and_errors():
+    base = {"results": {"tokens@8": {"p95_ms": 10.0, "rps": 100.0, "errors": 0}}}
+    same = {"results": {"tokens@8": {"p95_ms": 11.0, "rps": 95.0, "errors": 0}}}
+    worse = {"results": {"tokens@8": {"p95_ms": 20.0, "rps": 50.0, "errors": 2}}}
+    assert compare(base, same, tolerance=0.25) == []
+    assert len(compare(base, worse, tolerance=0.25)) == 3
@@ -0,0 +1,67 @@
+import os
+import json
+
+from app.utils.brand_scan import TermAutomaton, BrandScanner, BrandTermRegistry, DEFAULT_TERMS
+
+
+def test_automaton_finds_overlapping_terms_on_word_boundaries():
+    automaton = TermAutomaton([("AI", "required"), ("ethical AI", "required"), ("AI risk", "required")])
+    text = "Ethical AI risk, not fAIr or AIs."
+    found = sorted((automaton.terms[i][0], s, e) for i, s, e in automaton.scan(text))
+    assert found == [("AI", 8, 10), ("AI risk", 8, 15), ("ethical AI", 0, 10)]
+
+
+def test_scanner_counts_spans_and_score():
+    scanner = BrandScanner(required=["governance", "risk", "board"], banned=["guaranteed"], min_required=2)
+    result = scanner.scan("Governance cuts risk. More governance.")
+    assert result["compliant"] is True
+    assert result["score"] == 1.0
+    assert result["required"] == {"governance": 2, "risk": 1}
+    assert result["missingRequired"] == ["board"]
+    assert result["matches"][0] == {"term": "governance", "kind": "required", "start": 0, "end": 10}
+
+    banned = scanner.scan("Guaranteed governance and risk wins")
+    assert banned["compliant"] is False and banned["score"] == 0.0
+    assert banned["banned"] == {"guaranteed": 1}
+
+    partial = scanner.scan("Only risk here")
+    assert partial["compliant"] is False and partial["score"] == 0.5
+
+
+def test_registry_reloads_changed_file(tmp_path):
+    path = tmp_path / "terms.json"
+    path.write_text(json.dumps({"Acme": {"required": ["rockets"], "banned": ["anvil"]}}))
+    registry = BrandTermRegistry(str(path), check_interval=0)
+
+    assert registry.get("Acme").scan("rockets")["compliant"] is True
+    # Brands without an entry fall back to the default dictionary
+    assert registry.get("Other").scan("AI governance")["compliant"] is True
+    assert len(registry.get("Other").automaton.terms) == len(DEFAULT_TERMS["required"])
+
+    path.write_text(json.dumps({"Acme": {"required": ["anvil"]}}))
+    os.utime(path, (1, 1))
+    assert registry.get("Acme").scan("anvil")["compliant"] is True
+
+    # A broken file keeps the previous dictionaries
+    path.write_text("{not json")
+    os.utime(path, (2, 2))
+    assert registry.get("Acme").scan("anvil")["compliant"] is True
+
+
+def test_default_terms_keep_substring_matching():
+    registry = BrandTermRegistry("")
+    # The original `term in text` check counted plurals and inflections
+    assert registry.get("Ethical AI Insider").scan("We discuss risks for tech leaders")["compliant"] is True
+    assert registry.get("Ethical AI Insider").scan("Governing startup founders")["required"] == {"startup founder": 1}
+    assert registry.get("Ethical AI Insider").scan("Nothing on brand")["compliant"] is False
+
+
+def test_registry_caches_per_dictionary_entry_not_per_brand(tmp_path):
+    path = tmp_path / "terms.json"
+    path.write_text(json.dumps({"Acme": {"required": ["rockets"]}}))
+    registry = BrandTermRegistry(str(path), check_interval=0)
+    for i in range(50):
+        registry.get(f"client brand {i}")
+    registry.get("Acme")
+    assert len(registry._scanners) == 2
+    assert registry.get("a") is registry.get("b")
@@ -0,0 +1,49 @@
+from app.utils import cache as cache_module
+from app.utils.cache import ResponseCache, cache_key
+
+
+def test_cache_key_normalizes_platform_and_varies_by_model():
+    a = cache_key("idea", "Brand", "AI Risk", "LinkedIn", "", "gpt-4")
+    b = cache_key("idea", "Brand", "AI Risk", "linkedin", "", "gpt-4")
+    c = cache_key("idea", "Brand", "AI Risk", "LinkedIn", "", "gpt-4o")
+    assert a == b
+    assert a != c
+
+
+def test_lru_eviction_and_counters():
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", {"v": 1})
+    cache.set("b", {"v": 2})
+    assert cache.get("a") == {"v": 1}
+    cache.set("c", {"v": 3})  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    assert cache.get("c") == {"v": 3}
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1 and stats["evictions"] == 1
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    cache = ResponseCache(ttl=10)
+    cache.set("a", {"v": 1})
+    now[0] += 11
+    assert cache.get("a") is None
+
+
+def test_disk_hits_keep_their_expiry_in_memory(monkeypatch, tmp_path):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    ResponseCache(ttl=10, disk_dir=str(tmp_path)).set("a", {"v": 1})  # expires at 1010
+    fresh = ResponseCache(ttl=10, disk_dir=str(tmp_path))
+    now[0] = 1008
+    assert fresh.get("a") == {"v": 1}  # promoted from disk
+    now[0] = 1011
+    assert fresh.get("a") is None
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    ResponseCache(disk_dir=str(tmp_path)).set("a", {"v": 1})
+    fresh = ResponseCache(disk_dir=str(tmp_path))
+    assert fresh.get("a") == {"v": 1}
+    assert fresh.stats()["diskHits"] == 1
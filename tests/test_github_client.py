@@ -0,0 +1,77 @@
+import unittest
+from unittest.mock import MagicMock, patch
+
+from mcp_server import github as gh
+from mcp_server.github import GitHubClient, GitHubIntegration
+
+
+def _response(status, json_body=None, headers=None):
+    response = MagicMock()
+    response.status_code = status
+    response.ok = 200 <= status < 300
+    response.headers = headers or {}
+    response.json.return_value = json_body
+    return response
+
+
+class GitHubClientTestCase(unittest.TestCase):
+
+    def test_conditional_get_reuses_cached_body(self):
+        client = GitHubClient(lambda: 'tok')
+        client.session.request = MagicMock(side_effect=[
+            _response(200, [{'number': 1}], {'ETag': '"abc"'}),
+            _response(304),
+        ])
+        self.assertEqual(client.get_json('/repos/o/r/pulls'), [{'number': 1}])
+        self.assertEqual(client.get_json('/repos/o/r/pulls'), [{'number': 1}])
+        second_headers = client.session.request.call_args_list[1].kwargs['headers']
+        self.assertEqual(second_headers['If-None-Match'], '"abc"')
+
+    @patch('mcp_server.github.sleep')
+    def test_retries_after_rate_limit(self, mock_sleep):
+        client = GitHubClient(lambda: 'tok')
+        client.session.request = MagicMock(side_effect=[
+            _response(429, headers={'Retry-After': '2'}),
+            _response(200, []),
+        ])
+        self.assertEqual(client.get_json('/repos/o/r/pulls'), [])
+        mock_sleep.assert_called_once_with(2.0)
+
+    def test_rate_limit_wait_accepts_http_date(self):
+        from email.utils import formatdate
+        from time import time
+
+        response = _response(429, headers={'Retry-After': formatdate(time() + 30, usegmt=True)})
+        self.assertAlmostEqual(GitHubClient.rate_limit_wait(response), 30, delta=2)
+        past = _response(429, headers={'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+        self.assertEqual(GitHubClient.rate_limit_wait(past), 0.0)
+
+    def test_does_not_wait_past_limit(self):
+        client = GitHubClient(lambda: 'tok')
+        client.session.request = MagicMock(return_value=_response(403, headers={'Retry-After': '3600'}))
+        with self.assertRaises(Exception):
+            client.get_json('/repos/o/r/pulls')
+        self.assertEqual(client.session.request.call_count, 1)
+
+
+class GitHubIntegrationTestCase(unittest.TestCase):
+
+    @patch.dict('os.environ', {'GITHUB_APP_ID': '1', 'GITHUB_APP_PRIVATE_KEY': 'key',
+                               'GITHUB_APP_INSTALLATION_ID': '2'})
+    def test_installation_token_is_cached_until_near_expiry(self):
+        integration = GitHubIntegration()
+        integration.generate_jwt = MagicMock(return_value='jwt')
+        integration.client.session.post = MagicMock(
+            return_value=_response(201, {'token': 't1', 'expires_at': '2099-01-01T00:00:00Z'})
+        )
+        self.assertEqual(integration.get_installation_token(), 't1')
+        self.assertEqual(integration.get_installation_token(), 't1')
+        self.assertEqual(integration.client.session.post.call_count, 1)
+
+        integration._token_expires_at = gh.time() + gh.TOKEN_REFRESH_MARGIN - 1
+        integration.get_installation_token()
+        self.assertEqual(integration.client.session.post.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import os
+import threading
+
+import pytest
+from git import Repo
+
+from app.utils import github
+
+
+@pytest.fixture
+def shared_clone(tmp_path, monkeypatch):
+    for var, value in [("GIT_AUTHOR_NAME", "test"), ("GIT_AUTHOR_EMAIL", "test@example.com"),
+                       ("GIT_COMMITTER_NAME", "test"), ("GIT_COMMITTER_EMAIL", "test@example.com")]:
+        monkeypatch.setenv(var, value)
+    origin = Repo.init(tmp_path / "origin.git", bare=True)
+    seed = Repo.init(tmp_path / "seed")
+    (tmp_path / "seed" / "README.md").write_text("seed\n")
+    seed.index.add(["README.md"])
+    seed.index.commit("seed")
+    seed.create_remote("origin", origin.working_dir).push("HEAD:refs/heads/main")
+    monkeypatch.setattr(github, "REPO_URL", origin.working_dir)
+    monkeypatch.setattr(github, "CLONE_PATH", str(tmp_path / "mirror.git"))
+    monkeypatch.setattr(github, "WORKTREE_ROOT", str(tmp_path / "worktrees"))
+    monkeypatch.setattr(github, "_last_fetch", 0.0)
+    github.clone_or_pull_repo()
+    return origin
+
+
+def test_safe_branch_name():
+    assert github.safe_branch_name("Add New_Feature/v1.2") == "feature/add-new-feature-v1-2"
+    # Long summaries that share a prefix get distinct branches per enhancement id
+    long = "Improve the enhancement worker throughput"
+    assert github.safe_branch_name(long, 7) != github.safe_branch_name(long + " again", 8)
+    assert github.safe_branch_name(long, 7) == "feature/improve-the-enhancement-worker-t-7"
+
+
+def test_parallel_worktrees_commit_independently(shared_clone):
+    errors = []
+
+    def work(name):
+        try:
+            branch = f"feature/{name}"
+            path = github.add_worktree(branch)
+            try:
+                written = github.file_write(f"{name}.txt", name, repo_path=path)
+                github.commit_and_push([written], branch, f"add {name}", repo_path=path)
+            finally:
+                github.remove_worktree(path)
+        except Exception as e:  # surfaced below
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(f"w{i}",)) for i in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    heads = {h.name for h in shared_clone.heads}
+    assert {"feature/w0", "feature/w1", "feature/w2"} <= heads
+    assert not os.listdir(github.WORKTREE_ROOT)
+
+
+def test_mirror_is_bare_and_fetch_is_rate_limited(shared_clone, monkeypatch):
+    mirror = Repo(github.CLONE_PATH)
+    assert mirror.bare
+    fetches = []
+    real_fetch = github._fetch
+    monkeypatch.setattr(github, "_fetch", lambda repo: (fetches.append(1), real_fetch(repo)))
+    monkeypatch.setattr(github, "FETCH_INTERVAL", 3600)
+    github.clone_or_pull_repo()
+    assert fetches == []
+    github.clone_or_pull_repo(force=True)
+    assert fetches == [1]
+
+
+def test_existing_remote_branch_is_reused(shared_clone):
+    path = github.add_worktree("feature/reuse")
+    try:
+        written = github.file_write("a.txt", "a", repo_path=path)
+        github.commit_and_push([written], "feature/reuse", "add a", repo_path=path)
+    finally:
+        github.remove_worktree(path)
+    github.clone_or_pull_repo(force=True)
+
+    path = github.add_worktree("feature/reuse")
+    try:
+        # The new worktree starts from origin/feature/reuse, so the earlier commit is present
+        assert os.path.exists(os.path.join(path, "a.txt"))
+    finally:
+        github.remove_worktree(path)
+
+
+def test_commit_via_api_creates_branch_from_base(monkeypatch):
+    from unittest.mock import MagicMock
+    from github import GithubException
+
+    repo = MagicMock()
+    base_ref = MagicMock()
+    base_ref.object.sha = "base-sha"
+    repo.get_git_ref.side_effect = lambda ref: (
+        base_ref if ref == "heads/main" else (_ for _ in ()).throw(GithubException(404, "Not Found", None))
+    )
+    parent = repo.get_git_commit.return_value
+    parent.tree.sha = "old-tree"
+    repo.create_git_tree.return_value.sha = "new-tree"
+    repo.create_git_commit.return_value.sha = "new-sha"
+    monkeypatch.setattr(github, "get_github_repo", lambda: repo)
+    monkeypatch.setattr(github, "BASE_BRANCH", "main")
+    monkeypatch.setattr(github, "InputGitTreeElement", lambda **kwargs: kwargs)
+
+    sha = github.commit_via_api("feature/x", [("app/x.py", "print('x')\n")], "add x")
+
+    assert sha == "new-sha"
+    repo.get_git_commit.assert_called_once_with("base-sha")
+    elements = repo.create_git_tree.call_args.args[0]
+    assert elements == [{"path": "app/x.py", "mode": "100644", "type": "blob", "content": "print('x')\n"}]
+    repo.create_git_commit.assert_called_once_with("add x", repo.create_git_tree.return_value, [parent])
+    repo.create_git_ref.assert_called_once_with("refs/heads/feature/x", "new-sha")
+
+
+def test_read_files_from_mirror(shared_clone):
+    assert github.list_files() == ["README.md"]
+    assert github.read_file("README.md", "feature/new") == "seed\n"
+    assert github.read_file("missing.py") is None
+
+
+def test_sdk_names_resolve_lazily():
+    from github import GithubException
+
+    assert github.Repo is Repo and github.GithubException is GithubException
+    assert "Repo" not in vars(github)
+    with pytest.raises(AttributeError):
+        github.NotAnSdkName
@@ -0,0 +1,25 @@
+import unittest
+from email.utils import formatdate
+from time import time
+
+from mcp_server.http_utils import parse_retry_after
+
+
+class ParseRetryAfterTestCase(unittest.TestCase):
+
+    def test_delta_seconds(self):
+        self.assertEqual(parse_retry_after('3'), 3.0)
+        self.assertEqual(parse_retry_after('-5'), 0.0)
+
+    def test_http_date(self):
+        self.assertAlmostEqual(parse_retry_after(formatdate(time() + 30, usegmt=True)), 30, delta=2)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0.0)
+
+    def test_missing_or_unparseable(self):
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after(''))
+        self.assertIsNone(parse_retry_after('soon'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,268 @@
+import time
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.main import create_app
+from app.routes import api
+from app.utils.job_store import JobStore, JobExecutor
+
+REQUIRED = ("OPENAI_API_KEY", "OPENAI_ASSISTANT_ID", "MCP_SECRET", "BOT_GH_TOKEN", "BOT_GH_USER", "BOT_GH_REPO")
+BODY = {"text": "Launch post", "brand": "acme", "pillar": "growth", "platform": "linkedin"}
+
+
+def test_store_transitions_and_expiry(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"), ttl=60)
+    job = store.create({"fields": {}}, "https://example.com/hook")
+    assert job["status"] == "queued" and job["callbackUrl"] == "https://example.com/hook"
+
+    assert store.transition(job["id"], "queued", "running")
+    assert not store.transition(job["id"], "queued", "running")
+    assert store.transition(job["id"], "running", "done", result={"safe": "ok"}, cache="miss")
+    assert store.get(job["id"])["result"] == {"safe": "ok"}
+
+    store.ttl = -1
+    orphan = store.create({"fields": {}})
+    assert store.get(orphan["id"]) is None  # already past its ttl
+    assert store.expire(stale_after=3600)["purged"] == 1
+
+
+def test_stale_jobs_are_failed(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    job = store.create({"fields": {}}, "https://example.com/hook")
+    waiting = store.create({"fields": {}})
+    store.transition(job["id"], "queued", "running")
+    swept = store.expire(stale_after=-1)
+    assert swept["purged"] == 0 and [j["id"] for j in swept["failed"]] == [job["id"]]
+    assert swept["failed"][0]["callbackUrl"] == "https://example.com/hook"
+    failed = store.get(job["id"])
+    assert failed["status"] == "error" and failed["statusCode"] == 500
+    # A job still waiting for an executor slot is not orphaned, however long it waits
+    assert store.get(waiting["id"])["status"] == "queued"
+
+
+def test_executor_bounds_concurrency():
+    executor = JobExecutor(concurrency=2)
+    running, peak = [0], [0]
+
+    async def job():
+        running[0] += 1
+        peak[0] = max(peak[0], running[0])
+        await asyncio.sleep(0.01)
+        running[0] -= 1
+
+    async def main():
+        for _ in range(6):
+            executor.submit(job)
+        assert executor.pending == 6
+        await asyncio.gather(*executor._tasks)
+
+    asyncio.run(main())
+    assert peak[0] == 2 and executor.pending == 0
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    for var in REQUIRED:
+        monkeypatch.setenv(var, "x")
+    monkeypatch.setattr(api, "ENH_DB", str(tmp_path / "enh.db"))
+    monkeypatch.setattr(api, "JOB_DB", str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(api, "MCP_SECRET", "s")
+    monkeypatch.setattr(main, "PREWARM", False)
+    with TestClient(create_app()) as client:
+        yield client
+    assert api._job_store is None
+
+
+def _wait_for(client, job_id, status="done"):
+    for _ in range(200):
+        job = client.get(f"/api/process/jobs/{job_id}", headers={"x-mcp-secret": "s"}).json()
+        if job["status"] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job stayed {job['status']}")
+
+
+def test_job_returns_immediately_and_can_be_polled(client, monkeypatch):
+    release = threading.Event()
+
+    async def fake_process(fields, cache_mode, similar_mode, priority):
+        while not release.is_set():
+            await asyncio.sleep(0.005)
+        return {"safe": fields["text"]}, "miss"
+
+    monkeypatch.setattr(api, "process_with_cache", fake_process)
+    response = client.post("/api/process/jobs", json=BODY, headers={"x-mcp-secret": "s"})
+    assert response.status_code == 202
+    job = response.json()
+    assert response.headers["location"] == f"/api/process/jobs/{job['id']}"
+    assert _wait_for(client, job["id"], "running")["status"] == "running"
+
+    release.set()
+    done = _wait_for(client, job["id"])
+    assert done["result"] == {"safe": "launch post"} and done["cache"] == "miss"
+
+    assert client.get("/api/process/jobs/nope", headers={"x-mcp-secret": "s"}).status_code == 404
+    assert client.post("/api/process/jobs", json=BODY, headers={"x-mcp-secret": "bad"}).status_code == 401
+
+
+def test_job_waits_out_rate_limits_and_reports_errors(client, monkeypatch):
+    calls = []
+
+    async def fake_process(fields, cache_mode, similar_mode, priority):
+        calls.append(fields["text"])
+        if fields["text"] == "fail":
+            raise api.HTTPException(status_code=500, detail="OpenAI agent error: boom")
+        if len(calls) == 1:
+            raise api.rate_limited("OpenAI capacity exhausted", 0)
+        return {"safe": "ok"}, "miss"
+
+    monkeypatch.setattr(api, "process_with_cache", fake_process)
+    job = client.post("/api/process/jobs", json=BODY, headers={"x-mcp-secret": "s"}).json()
+    assert _wait_for(client, job["id"])["result"] == {"safe": "ok"}
+    assert len(calls) == 2
+
+    job = client.post("/api/process/jobs", json={**BODY, "text": "fail"}, headers={"x-mcp-secret": "s"}).json()
+    failed = _wait_for(client, job["id"], "error")
+    assert failed["statusCode"] == 500 and "boom" in failed["error"]
+
+
+def test_job_webhook_is_signed_and_retried(client, monkeypatch):
+    deliveries = []
+
+    async def fake_process(fields, cache_mode, similar_mode, priority):
+        return {"safe": "ok"}, "miss"
+
+    async def fake_post(url, body, headers):
+        deliveries.append((url, body, headers))
+        return 503 if len(deliveries) == 1 else 200
+
+    monkeypatch.setattr(api, "process_with_cache", fake_process)
+    monkeypatch.setattr(api, "post_webhook", fake_post)
+    monkeypatch.setattr(api, "JOB_CALLBACK_HOSTS", {"example.com"})
+    body = {**BODY, "callbackUrl": "https://example.com/hook"}
+    job = client.post("/api/process/jobs", json=body, headers={"x-mcp-secret": "s"}).json()
+    _wait_for(client, job["id"])
+    for _ in range(300):
+        if len(deliveries) == 2:
+            break
+        time.sleep(0.01)
+    url, payload, headers = deliveries[-1]
+    assert url == "https://example.com/hook" and len(deliveries) == 2
+    assert headers["X-MCP-Signature"] == api.sign_webhook(payload)
+
+    bad = {**BODY, "callbackUrl": "file:///etc/passwd"}
+    assert client.post("/api/process/jobs", json=bad, headers={"x-mcp-secret": "s"}).status_code == 400
+
+
+@pytest.mark.parametrize("url", [
+    "http://169.254.169.254/latest/meta-data/", "http://127.0.0.1:8080/hook", "http://localhost/hook",
+    "http://[::1]/hook", "http://10.0.0.5/hook", "http://[::ffff:169.254.169.254]/hook",
+])
+def test_callback_urls_to_internal_hosts_are_rejected(client, url):
+    body = {**BODY, "callbackUrl": url}
+    response = client.post("/api/process/jobs", json=body, headers={"x-mcp-secret": "s"})
+    assert response.status_code == 400 and "public" in response.json()["detail"]
+
+
+def test_callback_hosts_can_be_allow_listed(monkeypatch):
+    monkeypatch.setattr(api, "JOB_CALLBACK_HOSTS", {"hooks.internal"})
+    asyncio.run(api.check_callback_host("http://hooks.internal:9000/done"))
+    with pytest.raises(ValueError, match="MCP_JOB_CALLBACK_HOSTS"):
+        asyncio.run(api.check_callback_host("https://example.com/hook"))
+
+
+def test_sweep_spares_jobs_queued_behind_the_executor(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "JOB_DB", str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(api, "job_executor", JobExecutor(concurrency=1))
+    store = api.get_job_store()
+
+    async def main():
+        gate = asyncio.Event()
+
+        async def fake_process(fields, cache_mode, similar_mode, priority):
+            await gate.wait()
+            return {"safe": "ok"}, "miss"
+
+        monkeypatch.setattr(api, "process_with_cache", fake_process)
+        jobs = []
+        for _ in range(3):
+            request = {"fields": {}, "cacheMode": "", "similarMode": "off", "priority": 0, "submittedAt": time.time()}
+            job = store.create(request)
+            api.job_executor.submit(api.run_job, job["id"], request, None)
+            jobs.append(job["id"])
+        while store.get(jobs[0])["status"] != "running":
+            await asyncio.sleep(0.005)
+        # The queued jobs have waited longer than the sweep allows, but only for a slot
+        store._conn().execute("UPDATE jobs SET updated_at = updated_at - 3600 WHERE status = 'queued'")
+        assert store.expire(stale_after=60)["failed"] == []
+        gate.set()
+        await asyncio.gather(*api.job_executor._tasks)
+        return jobs
+
+    try:
+        for job_id in asyncio.run(main()):
+            assert store.get(job_id)["status"] == "done"
+    finally:
+        api.close_job_store()
+
+
+def test_sweep_sends_webhooks_for_orphaned_jobs(client, monkeypatch):
+    deliveries = []
+
+    async def fake_post(url, body, headers):
+        deliveries.append(url)
+        return 200
+
+    async def fake_process(fields, cache_mode, similar_mode, priority):
+        return {"safe": "ok"}, "miss"
+
+    monkeypatch.setattr(api, "post_webhook", fake_post)
+    monkeypatch.setattr(api, "process_with_cache", fake_process)
+    monkeypatch.setattr(api, "JOB_CALLBACK_HOSTS", {"example.com"})
+    store = api.get_job_store()
+    orphan = store.create({"fields": {}}, "https://example.com/orphan")
+    store.transition(orphan["id"], "queued", "running")
+    store._conn().execute("UPDATE jobs SET updated_at = updated_at - ? WHERE id = ?",
+                          (api.JOB_TIMEOUT + 3600, orphan["id"]))
+
+    client.post("/api/process/jobs", json=BODY, headers={"x-mcp-secret": "s"})
+    for _ in range(300):
+        if deliveries:
+            break
+        time.sleep(0.01)
+    assert deliveries == ["https://example.com/orphan"]
+    assert store.get(orphan["id"])["status"] == "error"
+
+
+def test_shutdown_fails_queued_and_running_jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(api, "JOB_DB", str(tmp_path / "jobs.db"))
+    monkeypatch.setattr(api, "job_executor", JobExecutor(concurrency=1))
+    store = api.get_job_store()
+
+    async def hang(fields, cache_mode, similar_mode, priority):
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(api, "process_with_cache", hang)
+
+    async def main():
+        jobs = []
+        for _ in range(3):
+            request = {"fields": {}, "cacheMode": "", "similarMode": "off", "priority": 0, "submittedAt": time.time()}
+            job = store.create(request)
+            api.job_executor.submit(api.run_job, job["id"], request, None)
+            jobs.append(job["id"])
+        while store.get(jobs[0])["status"] != "running":
+            await asyncio.sleep(0.005)
+        await api.shutdown_jobs()
+        return jobs
+
+    try:
+        for job_id in asyncio.run(main()):
+            job = store.get(job_id)
+            assert job["status"] == "error" and job["statusCode"] == 503
+    finally:
+        api.close_job_store()
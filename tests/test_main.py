@@ -0,0 +1,37 @@
+import sys
+import subprocess
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.utils import openai_client
+
+REQUIRED = ["OPENAI_API_KEY", "OPENAI_ASSISTANT_ID", "MCP_SECRET", "BOT_GH_TOKEN", "BOT_GH_USER", "BOT_GH_REPO"]
+
+
+def test_import_needs_no_credentials_and_skips_heavy_sdks():
+    code = "import sys, app.main; print(sorted(m for m in ('openai', 'git', 'github') if m in sys.modules))"
+    env = {"PATH": "", "PYTHONPATH": "."}
+    out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+def test_startup_refuses_missing_configuration(monkeypatch):
+    for var in REQUIRED:
+        monkeypatch.delenv(var, raising=False)
+    with pytest.raises(RuntimeError, match="Missing required environment variables"):
+        with TestClient(create_app()):
+            pass
+
+
+def test_lifespan_serves_and_closes_pools(monkeypatch, tmp_path):
+    for var in REQUIRED:
+        monkeypatch.setenv(var, "x")
+    from app.routes import api
+    monkeypatch.setattr(api, "ENH_DB", str(tmp_path / "enh.db"))
+    with TestClient(create_app()) as client:
+        assert client.get("/").json() == {"status": "ok"}
+        assert client.get("/api/").json() == {"status": "ok"}
+    assert openai_client._async_client is None
+    assert api._enhancement_store is None
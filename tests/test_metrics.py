@@ -0,0 +1,74 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.agents import compliance
+from app.utils import metrics
+from app.utils.metrics import Counter, Gauge, Histogram, Registry
+
+
+def test_render_counter_gauge_and_histogram():
+    registry = Registry()
+    counter = Counter("c_total", "A counter.", ("kind",), registry=registry)
+    gauge = Gauge("g", "A gauge.", ("status",), registry=registry, callback=lambda: {("new",): 3})
+    histogram = Histogram("h_seconds", "A histogram.", ("agent",), registry=registry, buckets=(0.1, 1))
+    counter.labels("a").inc()
+    counter.labels("a").inc(2)
+    histogram.labels("x").observe(0.05)
+    histogram.labels("x").observe(0.5)
+    histogram.labels("x").observe(5)
+
+    text = registry.render()
+    assert 'c_total{kind="a"} 3.0' in text
+    assert 'g{status="new"} 3' in text
+    assert 'h_seconds_bucket{agent="x",le="0.1"} 1' in text
+    assert 'h_seconds_bucket{agent="x",le="1.0"} 2' in text
+    assert 'h_seconds_bucket{agent="x",le="+Inf"} 3' in text
+    assert 'h_seconds_count{agent="x"} 3' in text
+    assert gauge.labels("new") is gauge.labels("new")
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    counter = Counter("e_total", "Escaping.", ("brand",), registry=registry)
+    counter.labels('say "hi"\n').inc()
+    assert 'e_total{brand="say \\"hi\\"\\n"} 1.0' in registry.render()
+
+
+def test_agent_call_records_tokens_and_latency():
+    usage = SimpleNamespace(prompt_tokens=11, completion_tokens=7)
+
+    async def create(**kwargs):
+        message = SimpleNamespace(content="ok")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    prompt = metrics.OPENAI_TOKENS.labels("prompt", "Ethical AI Insider", "linkedin", "gpt-4")
+    before = prompt.value
+    requests_before = metrics.OPENAI_REQUEST_DURATION.labels("gpt-4", "async").count
+
+    asyncio.run(compliance.rewrite_safe_async("p", client))
+
+    assert prompt.value - before == 11
+    assert metrics.OPENAI_TOKENS.labels("completion", "Ethical AI Insider", "linkedin", "gpt-4").value >= 7
+    assert metrics.OPENAI_REQUEST_DURATION.labels("gpt-4", "async").count == requests_before + 1
+
+
+def test_free_text_brands_and_platforms_share_one_series():
+    usage = SimpleNamespace(prompt_tokens=1, completion_tokens=1)
+
+    async def create(**kwargs):
+        message = SimpleNamespace(content="ok")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    other = metrics.OPENAI_TOKENS.labels("prompt", "other", "other", "gpt-4")
+    before = other.value
+    series = len(metrics.OPENAI_TOKENS._children)
+
+    async def run():
+        for i in range(20):
+            await compliance.rewrite_safe_async("p", client, brand=f"client brand {i}", platform=f"site {i}")
+
+    asyncio.run(run())
+    assert other.value - before == 20
+    assert len(metrics.OPENAI_TOKENS._children) <= series + 2
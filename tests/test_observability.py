@@ -1,6 +1,9 @@
 import unittest
-from unittest.mock import patch
-from mcp_server.observability import send_slack_notification, notify_test_failure, notify_deployment, notify_rollback
+from unittest.mock import MagicMock, patch
+from mcp_server.observability import (
+    SlackDispatcher, SlackDeliveryError, send_slack_notification,
+    notify_test_failure, notify_deployment, notify_rollback
+)
 
 class ObservabilityTestCase(unittest.TestCase):
     
@@ -15,20 +18,93 @@ class ObservabilityTestCase(unittest.TestCase):
         except Exception as e:
             self.fail(f"send_slack_notification raised an exception {e}")
     
-    @patch('mcp_server.observability.send_slack_notification')
-    def test_notify_test_failure(self, mock_send):
+    @patch('mcp_server.observability.requests.post')
+    @patch('mcp_server.observability.os.getenv')
+    def test_rate_limit_with_http_date_retry_after(self, mock_getenv, mock_post):
+        from email.utils import formatdate
+        import time
+
+        mock_getenv.return_value = 'http://example.com/webhook'
+        mock_post.return_value = MagicMock(
+            status_code=429, headers={'Retry-After': formatdate(time.time() + 30, usegmt=True)}, text='rate limited'
+        )
+        with self.assertRaises(SlackDeliveryError) as ctx:
+            send_slack_notification('Test message')
+        self.assertAlmostEqual(ctx.exception.retry_after, 30, delta=2)
+
+    @patch('mcp_server.observability.dispatcher.submit')
+    def test_notify_test_failure(self, mock_submit):
         notify_test_failure("Unit Test 1")
-        mock_send.assert_called_once_with(":x: Test Failed: Unit Test 1")
+        mock_submit.assert_called_once_with("test_failure", ":x: Test Failed: Unit Test 1")
     
-    @patch('mcp_server.observability.send_slack_notification')
-    def test_notify_deployment(self, mock_send):
+    @patch('mcp_server.observability.dispatcher.submit')
+    def test_notify_deployment(self, mock_submit):
         notify_deployment("Production")
-        mock_send.assert_called_once_with(":rocket: Deployment to Production succeeded.")
+        mock_submit.assert_called_once_with("deployment", ":rocket: Deployment to Production succeeded.")
     
-    @patch('mcp_server.observability.send_slack_notification')
-    def test_notify_rollback(self, mock_send):
+    @patch('mcp_server.observability.dispatcher.submit')
+    def test_notify_rollback(self, mock_submit):
         notify_rollback("Production")
-        mock_send.assert_called_once_with(":rewind: Rollback executed on Production.")
+        mock_submit.assert_called_once_with("rollback", ":rewind: Rollback executed on Production.")
+
+
+class SlackDispatcherTestCase(unittest.TestCase):
+
+    @patch('mcp_server.observability.send_slack_notification')
+    def test_coalesces_messages_of_same_kind(self, mock_send):
+        dispatcher = SlackDispatcher(window=0.2)
+        dispatcher.submit("test_failure", ":x: Test Failed: a")
+        dispatcher.submit("test_failure", ":x: Test Failed: a")
+        dispatcher.submit("test_failure", ":x: Test Failed: b")
+        dispatcher.submit("deployment", ":rocket: Deployment to prod succeeded.")
+        dispatcher.flush()
+
+        sent = [c.args[0] for c in mock_send.call_args_list]
+        self.assertEqual(sent, [
+            ":x: Test Failed: a (x2)\n:x: Test Failed: b",
+            ":rocket: Deployment to prod succeeded.",
+        ])
+
+    @patch('mcp_server.observability.time.sleep')
+    @patch('mcp_server.observability.os.getenv')
+    def test_retries_on_rate_limit(self, mock_getenv, mock_sleep):
+        mock_getenv.return_value = 'http://example.com/webhook'
+        dispatcher = SlackDispatcher(window=0)
+        limited = MagicMock(status_code=429, headers={'Retry-After': '3'}, text='rate limited')
+        ok = MagicMock(status_code=200)
+        dispatcher._session.post = MagicMock(side_effect=[limited, ok])
+        dispatcher.submit("rollback", "msg")
+        dispatcher.flush()
+
+        self.assertEqual(dispatcher._session.post.call_count, 2)
+        self.assertGreaterEqual(mock_sleep.call_args.args[0], 3)
+
+    def test_flush_timeout_keeps_a_single_worker(self):
+        import threading
+        import time
+
+        sent = []
+        release = threading.Event()
+
+        def slow_send(text, session=None):
+            release.wait(2)
+            sent.append(text)
+
+        with patch('mcp_server.observability.send_slack_notification', side_effect=slow_send):
+            dispatcher = SlackDispatcher(window=0)
+            dispatcher.submit("deployment", "first")
+            time.sleep(0.05)
+            dispatcher.flush(timeout=0.01)  # the worker is still delivering
+            worker = dispatcher._thread
+            self.assertIsNotNone(worker)
+            dispatcher.submit("deployment", "second")
+            self.assertIs(dispatcher._thread, worker)
+            release.set()
+            dispatcher.flush()
+            dispatcher.flush()
+
+        self.assertEqual(sent, ["first", "second"])
+        self.assertIsNone(dispatcher._thread)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+
+from app.routes import api
+from app.utils.patching import PatchError, apply_edits, apply_patch, resolve_files
+
+ORIGINAL = "".join(f"line {i}\n" for i in range(1, 41))
+
+
+def test_unified_diff_applies_exactly():
+    diff = """--- a/f.py
++++ b/f.py
+@@ -9,7 +9,7 @@
+ line 9
+ line 10
+ line 11
+-line 12
++line twelve
+ line 13
+ line 14
+ line 15
+"""
+    patched = apply_patch(ORIGINAL, diff)
+    assert "line twelve\n" in patched and "line 12\n" not in patched
+    assert len(patched.splitlines()) == 40 and patched.endswith("\n")
+
+
+def test_diff_with_wrong_line_numbers_and_drifted_context_still_applies():
+    drifted = ORIGINAL.replace("line 27\n", "line 27 # edited upstream\n")
+    diff = """@@ -3,5 +3,6 @@
+ line 25
+ line 26
+ line 27
+-line 28
++line 28a
++line 28b
+ line 29
+"""
+    patched = apply_patch(drifted, diff)
+    assert "line 27 # edited upstream\nline 28a\nline 28b\nline 29\n" in patched
+
+
+def test_search_replace_blocks_and_whitespace_tolerance():
+    source = "def f():\n    return 1\n\n\ndef g():\n    return 2\n"
+    blocks = """<<<<<<< SEARCH
+def g():
+  return 2
+=======
+def g():
+    return 3
+>>>>>>> REPLACE
+"""
+    assert apply_patch(source, blocks).endswith("def g():\n    return 3\n")
+    assert apply_edits(source, [{"search": "    return 1", "replace": "    return 10"}]).startswith(
+        "def f():\n    return 10\n"
+    )
+
+
+def test_patch_errors():
+    with pytest.raises(PatchError, match="does not apply"):
+        apply_patch(ORIGINAL, "@@ -1,1 +1,1 @@\n-something else entirely\n+x\n")
+    with pytest.raises(PatchError, match="2 places"):
+        apply_edits("a\nb\na\nb\n", [{"search": "a\nb", "replace": "c"}])
+    with pytest.raises(PatchError, match="does not exist"):
+        apply_patch(None, "@@ -1 +1 @@\n-a\n+b\n")
+    assert apply_patch(None, "--- /dev/null\n+++ b/new.py\n@@ -0,0 +1,2 @@\n+x = 1\n+y = 2\n") == "x = 1\ny = 2\n"
+
+
+def test_zero_context_insertions_go_after_the_old_start_line():
+    source = "a\nb\nc\nd\ne\n"
+    assert apply_patch(source, "@@ -2,0 +3 @@\n+X\n") == "a\nb\nX\nc\nd\ne\n"
+    assert apply_patch(source, "@@ -0,0 +1 @@\n+X\n") == "X\na\nb\nc\nd\ne\n"
+    # Later hunks account for the lines earlier ones added
+    both = "@@ -1,0 +2 @@\n+X\n@@ -4,0 +6 @@\n+Y\n"
+    assert apply_patch(source, both) == "a\nX\nb\nc\nd\nY\ne\n"
+
+
+def test_resolve_files_mixes_content_patches_and_edits():
+    files = {"a.py": "x = 1\n", "b.py": "y = 1\n"}
+    resolved = resolve_files([
+        {"path": "a.py", "patch": "@@ -1 +1 @@\n-x = 1\n+x = 2\n"},
+        {"path": "b.py", "edits": [{"search": "y = 1", "replace": "y = 3"}]},
+        {"path": "c.py", "content": "z = 1\n"},
+    ], files.get)
+    assert resolved == [
+        {"path": "a.py", "content": "x = 2\n"},
+        {"path": "b.py", "content": "y = 3\n"},
+        {"path": "c.py", "content": "z = 1\n"},
+    ]
+    with pytest.raises(PatchError, match="b.py"):
+        resolve_files([{"path": "b.py", "edits": [{"search": "nope", "replace": ""}]}], files.get)
+    for malformed in ("a.py", {"path": "a.py", "patch": 1}, {"path": "a.py", "content": 1}, {"content": "x"},
+                      {"path": "a.py"}):
+        with pytest.raises(PatchError):
+            resolve_files([malformed], files.get)
+    with pytest.raises(PatchError, match="must be a list"):
+        resolve_files(None, files.get)
+
+
+def test_code_context_skips_binary_and_oversized_files(monkeypatch):
+    files = {"logo.png": b"\x89PNG\r\n\x1a\n\xff", "app/big.py": b"x" * 100, "app/small.py": b"y = 1\n"}
+    reads = []
+
+    def read_file(path, branch, max_bytes=None):
+        reads.append(path)
+        data = files.get(path)
+        if data is not None and max_bytes is not None and len(data) > max_bytes:
+            raise ValueError(f"{path} is too large")
+        return data.decode("utf-8") if data is not None else None
+
+    monkeypatch.setattr(api, "CODE_CONTEXT_BYTES", 50)
+    monkeypatch.setattr(api, "repo_reader", lambda: (lambda branch: list(files), read_file))
+    enh = {"summary": "Update logo.png", "details": "Touch app/big.py and app/small.py"}
+    assert api.collect_code_context(enh, "feature/x") == {"app/small.py": "y = 1\n"}
+    assert sorted(reads) == ["app/big.py", "app/small.py", "logo.png"]
+
+    # Patching a file that cannot be read as text falls back like any other failed patch
+    with pytest.raises(PatchError, match="logo.png"):
+        api.materialize_patches({"files": [{"path": "logo.png", "patch": "@@ -1 +1 @@\n-a\n+b\n"}]}, "feature/x")
+
+
+def test_process_enhancement_falls_back_to_full_files(monkeypatch):
+    files = {"app/feature.py": "x = 1\n", "README.md": "readme\n"}
+    monkeypatch.setattr(api, "CODE_OUTPUT", "patch")
+    monkeypatch.setattr(api, "repo_reader", lambda: (lambda branch: list(files), lambda p, branch, max_bytes=None: files.get(p)))
+    prompts = []
+    published = []
+
+    async def fake_code(prompt, timeout=120):
+        prompts.append(prompt)
+        meta = {"commit_message": "c", "pr_title": "t", "pr_body": "b"}
+        if len(prompts) == 1:
+            return {**meta, "files": [{"path": "app/feature.py", "patch": "@@ -1 +1 @@\n-y = 1\n+y = 2\n"}]}
+        return {**meta, "files": [{"path": "app/feature.py", "content": "x = 2\n"}]}
+
+    monkeypatch.setattr(api, "call_openai_for_code", fake_code)
+    monkeypatch.setattr(api, "publish_enhancement", lambda branch, response, deadline: published.append(response) or "pr")
+
+    enh = {"summary": "Change feature.py", "details": "Set x to 2"}
+    assert asyncio.run(api.process_enhancement(enh, timeout=30)) == "pr"
+    assert "### app/feature.py\n```\nx = 1\n" in prompts[0] and '"patch"' in prompts[0]
+    assert '"content": <full file content to write>' in prompts[1]
+    assert published[0]["files"] == [{"path": "app/feature.py", "content": "x = 2\n"}]
@@ -0,0 +1,174 @@
+import json
+import threading
+
+from app.utils.queue_store import EnhancementStore
+
+
+def _store(tmp_path, **kwargs):
+    return EnhancementStore(str(tmp_path / "enh.db"), **kwargs)
+
+
+def test_enqueue_claim_and_transition(tmp_path):
+    store = _store(tmp_path)
+    first = store.enqueue({"summary": "one", "details": "d1"})
+    store.enqueue({"summary": "two", "details": "d2"})
+
+    claimed = store.claim_next()
+    assert claimed["id"] == first["id"] and claimed["status"] == "in-progress"
+    assert store.transition(claimed["id"], "in-progress", "pr-submitted", pr_url="http://pr/1")
+    # A second transition from the old status is rejected
+    assert not store.transition(claimed["id"], "in-progress", "error", error="late")
+
+    assert store.get(first["id"])["pr_url"] == "http://pr/1"
+    assert store.counts() == {"pr-submitted": 1, "new": 1}
+    assert [e["summary"] for e in store.list(status="new")] == ["two"]
+
+
+def test_concurrent_claims_never_overlap(tmp_path):
+    store = _store(tmp_path)
+    for i in range(50):
+        store.enqueue({"summary": f"s{i}", "details": "d"})
+    claimed = []
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            enh = store.claim_next()
+            if enh is None:
+                return
+            with lock:
+                claimed.append(enh["id"])
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(claimed) == sorted(set(claimed)) and len(claimed) == 50
+
+
+def test_requeue_stale(tmp_path):
+    store = _store(tmp_path)
+    store.enqueue({"summary": "s", "details": "d"})
+    store.claim_next()
+    assert store.requeue_stale(older_than=-1) == 1
+    assert store.counts() == {"new": 1}
+
+
+def test_imports_legacy_json(tmp_path):
+    legacy = tmp_path / "enhancements.json"
+    legacy.write_text(json.dumps([
+        {"summary": "old", "details": "d", "status": "pr-submitted", "pr_url": "http://pr/9"},
+        {"summary": "pending", "details": "d", "status": "new"},
+    ]))
+    store = _store(tmp_path, legacy_json_path=str(legacy))
+    assert store.counts() == {"pr-submitted": 1, "new": 1}
+    assert not legacy.exists()
+    assert store.list()[0]["pr_url"] == "http://pr/9"
+
+
+def test_page_filters_and_skips_errors(tmp_path):
+    store = _store(tmp_path)
+    for i in range(5):
+        enh = store.enqueue({"summary": f"s{i}", "details": "d"})
+        if i % 2:
+            store.transition(enh["id"], "new", "error", error="Traceback ...")
+
+    items, more = store.page(limit=2)
+    assert [e["summary"] for e in items] == ["s0", "s1"] and more
+    items, more = store.page(after=items[-1]["id"], limit=2, descending=True)
+    assert [e["summary"] for e in items] == ["s0"] and not more
+
+    errors, _ = store.page(status="error", with_error=False)
+    assert [e["summary"] for e in errors] == ["s1", "s3"] and all("error" not in e for e in errors)
+    assert [v[0] for v in store.page_versions(status="error")] == [e["id"] for e in errors]
+
+
+def test_enhancements_endpoint_paginates_and_revalidates(tmp_path, monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.routes import api
+
+    monkeypatch.setattr(api, "ENH_DB", str(tmp_path / "enh.db"))
+    monkeypatch.setattr(api, "_enhancement_store", None)
+    monkeypatch.setattr(api, "MCP_SECRET", "s")
+    store = api.get_enhancement_store()
+    for i in range(3):
+        store.enqueue({"summary": f"s{i}", "details": "d"})
+    app = FastAPI()
+    app.include_router(api.router, prefix="/api")
+    client = TestClient(app)
+    headers = {"x-mcp-secret": "s"}
+
+    first = client.get("/api/enhancements?limit=2&fields=summary", headers=headers)
+    assert first.json() == [{"id": 1, "summary": "s0"}, {"id": 2, "summary": "s1"}]
+    cursor = first.headers["x-next-cursor"]
+    assert 'rel="next"' in first.headers["link"]
+    rest = client.get(f"/api/enhancements?limit=2&fields=summary&cursor={cursor}", headers=headers)
+    assert rest.json() == [{"id": 3, "summary": "s2"}] and "x-next-cursor" not in rest.headers
+
+    etag = first.headers["etag"]
+    again = client.get("/api/enhancements?limit=2&fields=summary", headers={**headers, "if-none-match": etag})
+    assert again.status_code == 304 and again.headers["etag"] == etag
+    store.transition(1, "new", "error", error="boom")
+    changed = client.get("/api/enhancements?limit=2&fields=summary", headers={**headers, "if-none-match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+
+    assert client.get("/api/enhancements?cursor=!!", headers=headers).status_code == 400
+
+    # Without limit or cursor the full list is returned, as before pagination
+    monkeypatch.setattr(api, "ENH_PAGE_SIZE", 2)
+    everything = client.get("/api/enhancements?fields=summary", headers=headers)
+    assert [e["summary"] for e in everything.json()] == ["s0", "s1", "s2"]
+    assert "x-next-cursor" not in everything.headers
+    unchanged = client.get("/api/enhancements?fields=summary", headers={**headers, "if-none-match": everything.headers["etag"]})
+    assert unchanged.status_code == 304
+    assert client.get("/api/enhancements?cursor=" + cursor, headers=headers).json()[0]["id"] == 3
+    api.close_enhancement_store()
+
+
+def test_worker_marks_timeout_only_after_publishing_stops(tmp_path, monkeypatch):
+    import time
+    import asyncio
+    from app.routes import api
+
+    store = _store(tmp_path)
+    enh = store.enqueue({"summary": "slow", "details": "d"})
+    steps = []
+
+    async def fake_generate(enh, branch, deadline):
+        return {}
+
+    def slow_publish(branch, response, deadline):
+        time.sleep(0.05)  # e.g. a push that outlives the budget
+        steps.append("pushed")
+        api.check_deadline(deadline, "opening the PR")
+        steps.append("pr")
+
+    monkeypatch.setattr(api, "ENH_TIMEOUT", 0.01)
+    monkeypatch.setattr(api, "generate_enhancement", fake_generate)
+    monkeypatch.setattr(api, "publish_enhancement", slow_publish)
+    asyncio.run(api.enhancement_worker(store, 0))
+
+    assert steps == ["pushed"]
+    failed = store.get(enh["id"])
+    assert failed["status"] == "error" and "before opening the PR" in failed["error"]
+
+
+def test_close_closes_every_threads_connection(tmp_path):
+    import sqlite3
+    import pytest
+
+    store = _store(tmp_path)
+    store.enqueue({"summary": "s", "details": "d"})
+    conns = []
+    thread = threading.Thread(target=lambda: conns.append(store._conn()))
+    thread.start()
+    thread.join()
+
+    store.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        conns[0].execute("SELECT 1")
+    # The store reconnects on next use
+    assert store.counts() == {"new": 1}
+    store.close()
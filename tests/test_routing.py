@@ -0,0 +1,157 @@
+import time
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.agents import compliance, routing
+from app.agents.routing import CircuitBreaker, CircuitOpenError, ModelRouter, UpstreamTimeout
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def _router(**kwargs):
+    options = {"fallback": "", "budget": 1.0, "primary_share": 0.5, "hedge": True}
+    options.update(kwargs)
+    return ModelRouter(**options)
+
+
+def test_hedge_after_p95_and_first_answer_wins(monkeypatch):
+    monkeypatch.setattr(routing, "HEDGE_MIN_DELAY", 0.0)
+    router = _router()
+    for _ in range(50):
+        router.tracker("gpt-4").record(0.02)
+    calls = []
+
+    async def attempt(model):
+        calls.append(model)
+        # The first request hangs; the hedge answers quickly
+        await asyncio.sleep(5 if len(calls) == 1 else 0.01)
+        return f"answer {len(calls)}"
+
+    started = time.perf_counter()
+    assert asyncio.run(router.call("gpt-4", attempt)) == "answer 2"
+    assert time.perf_counter() - started < 0.5
+    assert calls == ["gpt-4", "gpt-4"]
+
+
+def test_fallback_when_primary_times_out_or_fails():
+    router = _router(fallback="gpt-4o-mini", hedge=False, budget=0.2)
+
+    async def slow_primary(model):
+        if model == "gpt-4":
+            await asyncio.sleep(5)
+        return model
+
+    started = time.perf_counter()
+    assert asyncio.run(router.call("gpt-4", slow_primary)) == "gpt-4o-mini"
+    assert time.perf_counter() - started < 0.3
+
+    async def failing_primary(model):
+        if model == "gpt-4":
+            raise StatusError(500)
+        return model
+
+    assert asyncio.run(router.call("gpt-4", failing_primary)) == "gpt-4o-mini"
+
+    async def always_slow(model):
+        await asyncio.sleep(5)
+
+    with pytest.raises(UpstreamTimeout):
+        asyncio.run(router.call("gpt-4", always_slow))
+
+
+def test_client_errors_are_not_retried_on_fallback():
+    router = _router(fallback="gpt-4o-mini")
+    calls = []
+
+    async def bad_request(model):
+        calls.append(model)
+        raise StatusError(400)
+
+    with pytest.raises(StatusError):
+        asyncio.run(router.call("gpt-4", bad_request))
+    assert calls == ["gpt-4"] and router.breaker("gpt-4").consecutive == 0
+
+
+def test_circuit_opens_fails_fast_and_probes():
+    breaker = CircuitBreaker(failures=2, reset_after=0.05)
+    router = _router()
+    router.breakers["gpt-4"] = breaker
+    calls = []
+
+    async def down(model):
+        calls.append(model)
+        raise StatusError(503)
+
+    for _ in range(2):
+        with pytest.raises(StatusError):
+            asyncio.run(router.call("gpt-4", down))
+    assert breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(router.call("gpt-4", down))
+    assert len(calls) == 2
+
+    time.sleep(0.06)
+
+    async def up(model):
+        return "ok"
+
+    assert asyncio.run(router.call("gpt-4", up)) == "ok"
+    assert not breaker.is_open
+
+
+def test_agents_call_through_the_router(monkeypatch):
+    router = _router(fallback="gpt-4o-mini", hedge=False)
+    monkeypatch.setattr(routing, "_router", router)
+    router.breaker("gpt-4").opened_at = time.monotonic()  # primary is down
+    models = []
+
+    async def create(**kwargs):
+        models.append(kwargs["model"])
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="safe"))])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    assert asyncio.run(compliance.rewrite_safe_async("p", client)) == "safe"
+    assert models == ["gpt-4o-mini"]
+
+
+def test_only_upstream_errors_trip_the_breaker_or_fall_back():
+    import httpx
+
+    assert routing.is_upstream_failure(StatusError(503)) and routing.is_upstream_failure(StatusError(429))
+    assert routing.is_upstream_failure(asyncio.TimeoutError())
+    assert routing.is_upstream_failure(httpx.ConnectError("refused"))
+    assert not routing.is_upstream_failure(StatusError(404))
+
+    router = _router(fallback="gpt-4o-mini")
+    calls = []
+
+    async def buggy(model):
+        calls.append(model)
+        return {}["choices"]
+
+    with pytest.raises(KeyError):
+        asyncio.run(router.call("gpt-4", buggy))
+    assert calls == ["gpt-4"] and router.breaker("gpt-4").consecutive == 0
+
+
+def test_hedge_records_only_the_winners_latency(monkeypatch):
+    monkeypatch.setattr(routing, "HEDGE_MIN_DELAY", 0.0)
+    router = _router()
+    for _ in range(50):
+        router.tracker("gpt-4").record(0.02)
+    calls = []
+
+    async def attempt(model):
+        calls.append(model)
+        await asyncio.sleep(5 if len(calls) == 1 else 0.01)
+        return "ok"
+
+    asyncio.run(router.call("gpt-4", attempt))
+    samples = router.tracker("gpt-4").samples
+    assert len(samples) == 51 and samples[-1] < 0.2
@@ -0,0 +1,52 @@
+from app.utils.similarity import SimilarityIndex, simhash, hamming
+
+IDEA = "Why every startup founder needs an AI governance checklist before their Series A, and what to put on it"
+
+
+def test_simhash_ignores_punctuation_and_case():
+    assert simhash(IDEA) == simhash(IDEA.upper().replace(",", "!") + "?")
+    assert simhash("") == 0
+
+
+def test_simhash_reworded_is_close_and_unrelated_is_far():
+    reworded = IDEA.replace("needs", "should have")
+    unrelated = "Quarterly review of vendor contracts for data retention clauses in healthcare"
+    assert hamming(simhash(IDEA), simhash(reworded)) <= 8
+    assert hamming(simhash(IDEA), simhash(unrelated)) > 16
+
+
+def test_index_lookup_scoped_and_within_distance():
+    index = SimilarityIndex(max_entries=10, max_distance=3)
+    fp = simhash(IDEA)
+    index.add("k1", ("Brand", "LinkedIn"), fp, "original")
+    near = fp ^ 0b101  # two bits away
+    assert index.lookup(("Brand", "LinkedIn"), near) == (2, "k1", "original")
+    assert index.lookup(("Brand", "Medium"), near) is None
+    assert index.lookup(("Brand", "LinkedIn"), fp ^ 0b1111) is None
+    assert index.lookup(("Brand", "LinkedIn"), fp, exclude="k1") is None
+
+
+def test_index_evicts_oldest_and_expires():
+    index = SimilarityIndex(max_entries=2, max_distance=3)
+    fingerprints = {"a": 0, "b": (1 << 64) - 1, "c": 0xFFFF0000FFFF0000}
+    for key, fp in fingerprints.items():
+        index.add(key, "s", fp, key)
+    assert index.lookup("s", 0) is None
+    assert index.lookup("s", fingerprints["c"] ^ 1)[1] == "c"
+    assert not any("a" in keys for keys in index._buckets.values())
+
+    expiring = SimilarityIndex(ttl=-1)
+    expiring.add("x", "s", 1, "x")
+    assert expiring.lookup("s", 1) is None
+    assert expiring.stats()["entries"] == 0
+
+
+def test_lookup_compares_only_band_candidates_on_a_full_index():
+    index = SimilarityIndex(max_entries=20000, max_distance=3)
+    for i in range(20000):
+        index.add(i, "s", simhash(f"idea number {i} about compliance"), i)
+    assert index.lookup("s", simhash(IDEA)) is None
+    assert index.stats()["compared"] < 100
+    # Even a query inside the crowded cluster only touches its band buckets, not the whole index
+    assert index.lookup("s", simhash("idea number 5 about compliance"))[0] == 0
+    assert index.stats()["compared"] < 20000 // 10
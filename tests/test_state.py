@@ -0,0 +1,85 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.utils import state
+from app.utils.state import MemoryStateBackend, SQLiteStateBackend, StateDict, StateSet
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStateBackend()
+    return SQLiteStateBackend(str(tmp_path / "state.db"))
+
+
+def test_backend_roundtrip(backend):
+    backend.set("ns", "a", {"status": "ok"})
+    backend.set_many("ns", {"b": [1, 2], "a": {"status": "done"}})
+    assert backend.get("ns", "a") == {"status": "done"}
+    assert backend.get("other", "a", "missing") == "missing"
+    assert backend.items("ns") == {"a": {"status": "done"}, "b": [1, 2]}
+    assert backend.delete("ns", "b") is True
+    assert backend.delete("ns", "b") is False
+
+
+def test_state_views(backend):
+    statuses = StateDict("statuses", backend)
+    statuses["code"] = {"status": "passed"}
+    statuses["code"]["status"] = "mutated locally"
+    assert statuses["code"] == {"status": "passed"}
+    assert dict(statuses) == {"code": {"status": "passed"}}
+    with pytest.raises(KeyError):
+        del statuses["docs"]
+
+    approved = StateSet("approved", backend)
+    approved.add("enh1")
+    approved.add("enh1")
+    assert "enh1" in approved and "enh2" not in approved
+    assert len(approved) == 1
+    approved.discard("enh1")
+    assert set(approved) == set()
+
+
+def test_sqlite_state_is_shared_between_processes(tmp_path):
+    # Two backends on one file stand in for two worker processes
+    path = str(tmp_path / "state.db")
+    worker_a, worker_b = SQLiteStateBackend(path), SQLiteStateBackend(path)
+    StateSet("approved", worker_a).add("enh7")
+    assert "enh7" in StateSet("approved", worker_b)
+
+
+def test_apps_use_shared_backend():
+    from app.main import app as main_app
+    from mcp_server.enhancement_approval import app as approval_app, approved_enhancements
+
+    state.set_state_backend(MemoryStateBackend())
+    try:
+        client = TestClient(main_app)
+        assert client.get("/api/enhancement-log").json()["code"]["status"] == "pending"
+        client.post("/api/enhancement", json={"summary": "s", "details": "d"})
+        assert client.get("/api/enhancement-log").json()["secops"]["status"] == "failed"
+
+        TestClient(approval_app).post(
+            "/api/approve-enhancement", json={"enhancement_id": "enh1", "approver_email": "a@example.com"}
+        )
+        assert "enh1" in approved_enhancements
+    finally:
+        state.set_state_backend(None)
+
+
+def test_close_state_backend_closes_connections(tmp_path):
+    import sqlite3
+
+    backend = SQLiteStateBackend(str(tmp_path / "state.db"))
+    StateSet("approved", backend).add("enh7")
+    conn = backend._conn()
+    state.set_state_backend(backend)
+    try:
+        state.close_state_backend()
+        with pytest.raises(sqlite3.ProgrammingError):
+            conn.execute("SELECT 1")
+        # The backend reconnects on next use
+        assert "enh7" in StateSet("approved", backend)
+    finally:
+        state.set_state_backend(None)
+        backend.close()
@@ -0,0 +1,44 @@
+import base64
+
+import pytest
+
+from app.utils import tokens
+from app.utils.tokens import EstimatingCounter, count_tokens, count_tokens_batch, encoding_for_model
+
+
+def test_encoding_for_model():
+    assert encoding_for_model("gpt-4") == "cl100k_base"
+    assert encoding_for_model("gpt-4o-mini") == "o200k_base"
+    assert encoding_for_model("unknown-model") == "cl100k_base"
+
+
+def test_estimator_counts_common_text():
+    counter = EstimatingCounter("cl100k_base")
+    assert counter.count("") == 0
+    assert counter.count("hello world") == 2
+    assert counter.count("The quick brown fox jumps over the lazy dog.") == 10
+    # digits are grouped in runs of at most three
+    assert counter.count("1234567") == 3
+
+
+def test_batch_matches_single_counts():
+    texts = ["This is a test", "", "Ethical AI governance for founders"]
+    assert count_tokens_batch(texts, "gpt-4") == [count_tokens(t, "gpt-4") for t in texts]
+
+
+def test_local_vocabulary_gives_exact_counts(tmp_path, monkeypatch):
+    pytest.importorskip("tiktoken")
+    # Byte-level vocabulary with no merges: one token per UTF-8 byte
+    lines = [f"{base64.b64encode(bytes([i])).decode()} {i}" for i in range(256)]
+    (tmp_path / "cl100k_base.tiktoken").write_text("\n".join(lines) + "\n")
+    monkeypatch.setattr(tokens, "TOKENIZER_DIR", str(tmp_path))
+    tokens._counter_for_encoding.cache_clear()
+    tokens.get_counter.cache_clear()
+    try:
+        counter = tokens.get_counter("gpt-4")
+        assert counter.exact
+        assert counter.count("hello world") == 11
+        assert counter.count_batch(["ab", "abc"]) == [2, 3]
+    finally:
+        tokens._counter_for_encoding.cache_clear()
+        tokens.get_counter.cache_clear()